@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+写入并发的自适应控制（AIMD，与 TCP 拥塞控制同一思路）
+ - 同时在途的请求数不超过 limit；每个请求结束时根据结果调整 limit：
+   * 延迟正常（不超过观测到的最低延迟 × latency_factor）且未过载：加性增加，每完成约 limit 个请求 +increase；
+     上次减少之前发出的请求不计入
+   * 过载（429 / 5xx / 网络错误）：乘性减少 limit × decrease；同一拥塞事件中已经在途的其他请求不再重复减少。
+     请求线程收到 429 时可以立即调用 signal()（不必等重试结束），也可以由 overloaded 回调在请求结束后判断
+   * 延迟变高但未过载：保持不变
+ - limit 变化记入 trajectory（减少时通过 log 回调输出），summary() 给出拐点序列，便于观察收敛到的最大可持续并发
+ - 一个控制器可跨多个写入阶段复用，后一阶段从前一阶段学到的并发开始
+
+用法:
+  ctl = AIMDController(initial=3, maximum=16, log=print)
+  results = ctl.map(create_page, items, overloaded=lambda result: result.status_code in (429, 500, 502, 503))
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AIMDController:
+    def __init__(self, initial=2, minimum=1, maximum=16, increase=1.0, decrease=0.7, latency_factor=2.0, log=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.log = log
+        self.inflight = 0
+        self.best_latency = None
+        self.t0 = time.monotonic()
+        self.cut_at = self.t0
+        self.cond = threading.Condition()
+        self.local = threading.local()  # 本线程在途请求的开始时间与是否已报告过载
+        self.trajectory = [(0.0, int(self.limit), "start")]
+        self.completed = self.overloads = 0
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    def _acquire(self):
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+        self.local.started = time.monotonic()
+        self.local.signaled = False
+        return self.local.started
+
+    def _record(self, before, now, reason):
+        after = int(self.limit)
+        if after != before:
+            self.trajectory.append((round(now - self.t0, 3), after, reason))
+            if self.log and after < before:
+                self.log(f"⚙ 写入并发 {before} → {after}（{reason}）")
+
+    def signal(self):
+        """当前线程的在途请求遇到过载：立即减少 limit（每个请求最多一次，同一拥塞事件只减一次）"""
+        started = getattr(self.local, "started", None)
+        if started is None or self.local.signaled:
+            return
+        self.local.signaled = True
+        now = time.monotonic()
+        with self.cond:
+            self.overloads += 1
+            if started >= self.cut_at:
+                before = int(self.limit)
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.cut_at = now
+                self._record(before, now, "过载")
+
+    def _release(self, started, overloaded):
+        """overloaded 为 None 表示结果不反映服务端状态（如请求未实际发出），不调整 limit"""
+        if overloaded:
+            self.signal()
+        signaled, self.local.started = self.local.signaled, None
+        now = time.monotonic()
+        latency = now - started
+        with self.cond:
+            self.inflight -= 1
+            self.completed += 1
+            if overloaded is not None and not signaled and started >= self.cut_at:  # 上次减少之前发出的请求不再作为增加依据
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+                if latency <= self.best_latency * self.latency_factor:
+                    before = int(self.limit)
+                    self.limit = min(self.maximum, self.limit + self.increase / max(1, before))
+                    self._record(before, now, "延迟正常")
+            self.cond.notify_all()
+
+    def call(self, fn, *args, overloaded=None):
+        """在并发上限内执行一次 fn(*args)；overloaded(result) 为真或抛出异常时视为过载，为 None 时不计入"""
+        started = self._acquire()
+        bad = True
+        try:
+            result = fn(*args)
+            bad = overloaded(result) if overloaded else False
+            return result
+        finally:
+            self._release(started, bad)
+
+    def map(self, fn, items, overloaded=None):
+        """并发执行 fn(item)，按输入顺序返回结果；同时在途的数量随 limit 自适应"""
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.maximum, len(items))) as ex:
+            return list(ex.map(lambda item: self.call(fn, item, overloaded=overloaded), items))
+
+    def summary(self, since=0):
+        """trajectory[since:] 的拐点序列，如 “3→9→4→8→4（峰值 9，当前 4，过载 2 次）”"""
+        points = [n for _, n, _ in self.trajectory[since:]] or [self.current]
+        turns = [p for i, p in enumerate(points)
+                 if i in (0, len(points) - 1) or (p - points[i - 1]) * (points[i + 1] - p) < 0]
+        if len(turns) > 24:
+            turns = turns[:12] + ["…"] + turns[-11:]
+        cuts = sum(1 for _, _, reason in self.trajectory[since:] if reason == "过载")
+        return f"{'→'.join(map(str, turns))}（峰值 {max(points)}，当前 {self.current}，过载 {cuts} 次）"
@@ -0,0 +1,111 @@
+"""DeepSeek webhook 批量解码：逐项解析 text 字段，单项出错不影响其他项
+
+大批量（text 总字节数 >= DEEPSEEK_PARALLEL_MIN_BYTES）时用进程池并行解码；
+进程池不可用（如无 /dev/shm 的 serverless 环境）时自动退回串行。
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import jsoncodec  # 项目根目录的 jsoncodec.py，由 deepseek-processor.py 加入 sys.path
+
+PARALLEL_MIN_BYTES = int(os.environ.get("DEEPSEEK_PARALLEL_MIN_BYTES", 4 * 1024 * 1024))
+WINDOW = int(os.environ.get("DEEPSEEK_DECODE_WINDOW", 64))
+WORKERS = int(os.environ.get("DEEPSEEK_DECODE_WORKERS", 0)) or (os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_broken = False
+
+
+def decode_item(item):
+    """解析单个数据项的 text 字段，返回新闻列表"""
+    if not isinstance(item, dict):
+        raise ValueError(f"数据项应为对象，实际为 {type(item).__name__}")
+    news = jsoncodec.loads(item.get("text", "[]"))
+    return news if isinstance(news, list) else [news]
+
+
+def _decode_chunk(chunk):
+    """进程池任务：chunk 为 [(index, item), ...]，返回 [(index, news, error), ...]"""
+    out = []
+    for index, item in chunk:
+        try:
+            out.append((index, decode_item(item), None))
+        except Exception as e:
+            out.append((index, None, f"{type(e).__name__}: {e}"))
+    return out
+
+
+def _get_pool():
+    global _pool, _pool_broken
+    if _pool_broken or WORKERS < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = ProcessPoolExecutor(max_workers=WORKERS)
+            except (OSError, NotImplementedError, ImportError):
+                _pool_broken = True
+                return None
+        return _pool
+
+
+def _text_bytes(items):
+    # 只统计字符串正文；text 为 null / 非字符串的数据项由 decode 逐项报错，不能在这里抛出
+    return sum(len(t) for t in (it.get("text") for it in items if isinstance(it, dict)) if isinstance(t, (str, bytes)))
+
+
+def decode_batch(items, parallel_min_bytes=None):
+    """
+    返回 (news_list, errors)：news_list 按数据项顺序合并，
+    errors 为 [{"index": i, "error": "..."}]
+    """
+    global _pool_broken
+    threshold = PARALLEL_MIN_BYTES if parallel_min_bytes is None else parallel_min_bytes
+    indexed = list(enumerate(items))
+    pool = _get_pool() if len(items) > 1 and _text_bytes(items) >= threshold else None
+    decoded = None
+    if pool is not None:
+        size = max(1, -(-len(indexed) // (WORKERS * 4)))
+        chunks = [indexed[i:i + size] for i in range(0, len(indexed), size)]
+        try:
+            decoded = [r for part in pool.map(_decode_chunk, chunks) for r in part]
+        except Exception:
+            _pool_broken = True
+            decoded = None
+    if decoded is None:
+        decoded = _decode_chunk(indexed)
+
+    results, errors = [], []
+    for index, news, error in decoded:
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            results.extend(news)
+    return results, errors
+
+
+def decode_iter(items, window=None):
+    """
+    流式版本：items 可以是生成器，按窗口（默认 DEEPSEEK_DECODE_WINDOW 项）分批交给 decode_batch，
+    不需要一次持有全部数据项。返回 (news_list, errors, item_count)
+    """
+    window = window or WINDOW
+    results, errors, batch, offset = [], [], [], 0
+
+    def flush():
+        news, errs = decode_batch(batch)
+        results.extend(news)
+        errors.extend({"index": e["index"] + offset, "error": e["error"]} for e in errs)
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= window:
+            flush()
+            offset += len(batch)
+            batch = []
+    if batch:
+        flush()
+        offset += len(batch)
+    return results, errors, offset
@@ -0,0 +1,196 @@
+"""webhook 请求体的流式读取与增量 JSON 解析
+
+- iter_body: 按块读取请求体，支持 Content-Length 与 Transfer-Encoding: chunked，
+  超过 max_bytes 时抛出 BodyTooLarge（Content-Length 超限时在读取前就拒绝）
+- iter_json_array: 从字节块流中逐个产出顶层 JSON 数组的元素，
+  只在内存中保留尚未解析完的那一段，不需要先拼出完整请求体
+"""
+import os
+import json
+import codecs
+import itertools
+
+MAX_BODY_BYTES = int(os.environ.get("DEEPSEEK_MAX_BODY_BYTES", 32 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WS = " \t\n\r"
+_DELIMS = _WS + ",]}"
+
+
+class BodyTooLarge(Exception):
+    def __init__(self, limit):
+        super().__init__(f"请求体超过 {limit} 字节上限")
+        self.limit = limit
+
+
+class BadChunkedBody(ValueError):
+    pass
+
+
+def has_body(headers):
+    if "chunked" in (headers.get("Transfer-Encoding") or "").lower():
+        return True
+    return int(headers.get("Content-Length") or 0) > 0
+
+
+def _iter_content_length(rfile, length, chunk_size):
+    remaining = length
+    while remaining > 0:
+        data = rfile.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def _iter_chunked(rfile, max_bytes, chunk_size):
+    total = 0
+    while True:
+        line = rfile.readline(1024)
+        if not line:
+            raise BadChunkedBody("chunked 请求体提前结束")
+        try:
+            size = int(line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise BadChunkedBody(f"无效的 chunk 长度：{line[:32]!r}")
+        if size == 0:
+            # 跳过 trailer，直到空行
+            while True:
+                trailer = rfile.readline(1024)
+                if trailer in (b"\r\n", b"\n", b""):
+                    return
+        total += size
+        if total > max_bytes:
+            raise BodyTooLarge(max_bytes)
+        while size > 0:
+            data = rfile.read(min(chunk_size, size))
+            if not data:
+                raise BadChunkedBody("chunked 请求体提前结束")
+            size -= len(data)
+            yield data
+        rfile.readline(8)  # chunk 末尾的 CRLF
+
+
+def iter_body(rfile, headers, max_bytes=None, chunk_size=CHUNK_SIZE):
+    """返回请求体字节块的迭代器；Content-Length 超限时立即抛出 BodyTooLarge"""
+    limit = MAX_BODY_BYTES if max_bytes is None else max_bytes
+    if "chunked" in (headers.get("Transfer-Encoding") or "").lower():
+        return _iter_chunked(rfile, limit, chunk_size)
+    length = int(headers.get("Content-Length") or 0)
+    if length > limit:
+        raise BodyTooLarge(limit)
+    return _iter_content_length(rfile, length, chunk_size)
+
+
+def read_prefix(chunks, limit):
+    """
+    读取最多 limit 字节：请求体不超过 limit 时返回 (完整 bytes, [bytes])；
+    否则返回 (None, 包含已读部分与剩余部分的迭代器)，仍可继续流式解析
+    """
+    parts, total = [], 0
+    chunks = iter(chunks)
+    for data in chunks:
+        parts.append(data)
+        total += len(data)
+        if total > limit:
+            return None, itertools.chain(parts, chunks)
+    body = b"".join(parts)
+    return body, [body]
+
+
+class JsonStream:
+    """把字节块流解码为文本，并提供按需补充的缓冲区"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.head = b""
+
+    def fill(self, want=1):
+        """至少读入 want 字节（或读到结尾）后一次性拼接；没有更多数据时返回 False"""
+        if self.eof:
+            return False
+        parts, got = [], 0
+        while got < want:
+            try:
+                data = next(self.chunks)
+            except StopIteration:
+                self.eof = True
+                break
+            if not self.head:
+                self.head = data[:1024]
+            parts.append(data)
+            got += len(data)
+        self.bytes_read += got
+        text = self.text_decoder.decode(b"".join(parts), final=self.eof)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return got > 0
+
+    def skip_ws(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def peek(self):
+        self.skip_ws()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def decode_value(self):
+        """从当前位置解析一个完整的 JSON 值；数据不足时继续读取，
+        失败后等缓冲区至少翻倍再重试，避免大元素被反复从头解析"""
+        self.skip_ws()
+        retry_at = 0
+        while True:
+            if len(self.buf) - self.pos >= retry_at or self.eof:
+                try:
+                    value, end = _decoder.raw_decode(self.buf, self.pos)
+                except json.JSONDecodeError:
+                    if self.eof:
+                        raise
+                    retry_at = max(2 * (len(self.buf) - self.pos), CHUNK_SIZE)
+                else:
+                    # 数字可能被块边界截断（如 "1." + "5"、"12" + "3"）：数字后面必须紧跟分隔符才算完整
+                    complete = end < len(self.buf) and (
+                        isinstance(value, bool) or not isinstance(value, (int, float))
+                        or self.buf[end] in _DELIMS)
+                    if complete or self.eof:
+                        self.pos = end
+                        return value
+                    retry_at = 0
+            self.fill(max(retry_at - (len(self.buf) - self.pos), 1))
+
+    def rest(self):
+        """读取剩余全部内容（用于非数组顶层值）"""
+        while self.fill():
+            pass
+        return self.buf[self.pos:]
+
+
+def iter_json_array(stream):
+    """逐个产出顶层数组元素；stream 为 JsonStream，调用方需先确认 peek() == '['"""
+    if stream.peek() != "[":
+        raise json.JSONDecodeError("Expecting '['", stream.buf, stream.pos)
+    stream.pos += 1
+    if stream.peek() == "]":
+        stream.pos += 1
+        return
+    while True:
+        yield stream.decode_value()
+        ch = stream.peek()
+        if ch == ",":
+            stream.pos += 1
+            continue
+        if ch == "]":
+            stream.pos += 1
+            if stream.peek():
+                raise json.JSONDecodeError("Extra data", stream.buf, stream.pos)
+            return
+        raise json.JSONDecodeError("Expecting ',' delimiter", stream.buf, stream.pos)
@@ -0,0 +1,128 @@
+"""webhook 幂等重放缓存：上游重试投递同一负载时直接返回已处理的响应
+
+- 键：请求头 Idempotency-Key，或请求体的 sha256（请求体不超过 DEEPSEEK_CACHE_MAX_BODY 时）
+- 内存 LRU，按条数（DEEPSEEK_CACHE_SIZE）与总字节数（DEEPSEEK_CACHE_MAX_BYTES）限界
+- 可选持久化：设置 DEEPSEEK_CACHE_PATH 后写入 sqlite，进程重启 / prefork 各 worker 之间共享；
+  连接按进程在首次使用时打开（sqlite 连接不能跨 fork 使用），fork 前的连接在子进程中不再使用
+- 命中率等指标由 stats() 提供（GET /metrics）
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get("DEEPSEEK_CACHE_SIZE", 256))
+CACHE_MAX_BYTES = int(os.environ.get("DEEPSEEK_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_MAX_BODY = int(os.environ.get("DEEPSEEK_CACHE_MAX_BODY", 4 * 1024 * 1024))
+CACHE_PATH = os.environ.get("DEEPSEEK_CACHE_PATH", "")
+
+
+def body_key(data):
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def idempotency_key(headers):
+    value = headers.get("Idempotency-Key") or headers.get("X-Idempotency-Key")
+    return "idem:" + value.strip() if value else None
+
+
+class Entry:
+    __slots__ = ("body", "etag", "item_errors")
+
+    def __init__(self, body, etag, item_errors):
+        self.body = body
+        self.etag = etag
+        self.item_errors = item_errors
+
+
+class ReplayCache:
+    def __init__(self, size=CACHE_SIZE, max_bytes=CACHE_MAX_BYTES, path=CACHE_PATH):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self.path = path
+        self._db = None
+        self._db_pid = None
+        self._inherited = []  # fork 前打开的连接：子进程中既不使用也不关闭
+
+    @property
+    def db(self):
+        """本进程的 sqlite 连接（调用方持有 self.lock）；未设置 path 时为 None"""
+        if not self.path:
+            return None
+        if self._db_pid != os.getpid():
+            if self._db is not None:
+                self._inherited.append(self._db)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS replay (key TEXT PRIMARY KEY, etag TEXT, "
+                             "body BLOB, item_errors TEXT, ts REAL)")
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            db = self.db
+            if db is not None:
+                row = db.execute("SELECT etag, body, item_errors FROM replay WHERE key = ?", (key,)).fetchone()
+                if row:
+                    entry = Entry(bytes(row[1]), row[0], json.loads(row[2] or "[]"))
+                    self._remember(key, entry)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, body, item_errors=None):
+        entry = Entry(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"', item_errors or [])
+        with self.lock:
+            self.stores += 1
+            self._remember(key, entry)
+            db = self.db
+            if db is not None:
+                db.execute("INSERT OR REPLACE INTO replay VALUES (?, ?, ?, ?, ?)",
+                           (key, entry.etag, body, json.dumps(entry.item_errors), time.time()))
+                # 持久层保留最近 size * 4 条
+                if self.stores % 64 == 0:
+                    db.execute("DELETE FROM replay WHERE key NOT IN "
+                               "(SELECT key FROM replay ORDER BY ts DESC LIMIT ?)", (self.size * 4,))
+                db.commit()
+        return entry
+
+    def _remember(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old.body)
+        if len(entry.body) > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.bytes += len(entry.body)
+        while len(self.entries) > self.size or self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted.body)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "evictions": self.evictions,
+                "persistent": bool(self.path),
+            }
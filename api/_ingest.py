@@ -0,0 +1,301 @@
+"""webhook 异步接收队列：POST /ingest 校验请求体后立即返回 202，由后台线程批量处理
+
+- 每个接受的请求体先落盘到 DEEPSEEK_INGEST_SPILL_DIR（一个文件一个任务，写临时文件后 rename），
+  处理完成才删除；进程崩溃 / 重启后未完成的任务会重新入队
+- 处理失败的任务保留文件，DEEPSEEK_INGEST_RETRY_S 秒后（每次翻倍）逐个重试，共 DEEPSEEK_INGEST_ATTEMPTS 次；
+  仍失败的改名为 .dead（死信，不再处理，可人工检查后去掉后缀放回）。尝试次数记在文件名中，重启后继续计数
+- 内存队列最多保留 DEEPSEEK_INGEST_QUEUE 个请求体，超出的只留在磁盘上（spilled），
+  内存队列腾出空间后再读回
+- 待处理任务数超过 DEEPSEEK_INGEST_MAX_PENDING 或待处理字节数超过 DEEPSEEK_INGEST_MAX_BYTES 时拒绝（429）
+- DEEPSEEK_INGEST_WORKERS 个线程，每次最多取 DEEPSEEK_INGEST_BATCH 个任务合并处理
+- stats() 提供队列深度、处理延迟等指标（GET /metrics）
+- 后台线程只适用于常驻进程（serve_webhook.py）；Vercel 等 serverless 环境请继续使用同步的 /webhook
+"""
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+QUEUE_SIZE = int(os.environ.get("DEEPSEEK_INGEST_QUEUE", 256))
+MAX_PENDING = int(os.environ.get("DEEPSEEK_INGEST_MAX_PENDING", 10000))
+MAX_BYTES = int(os.environ.get("DEEPSEEK_INGEST_MAX_BYTES", 512 * 1024 * 1024))
+BATCH = int(os.environ.get("DEEPSEEK_INGEST_BATCH", 16))
+WORKERS = int(os.environ.get("DEEPSEEK_INGEST_WORKERS", 2))
+ATTEMPTS = max(1, int(os.environ.get("DEEPSEEK_INGEST_ATTEMPTS", 3)))
+RETRY_S = float(os.environ.get("DEEPSEEK_INGEST_RETRY_S", 5))
+SPILL_DIR = os.environ.get("DEEPSEEK_INGEST_SPILL_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ingest"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+_ATTEMPT_RE = re.compile(r"\.a(\d+)\.job$")
+
+
+class Job:
+    __slots__ = ("id", "path", "body", "size", "accepted_at", "resident", "attempts")
+
+    def __init__(self, jid, path, body, size, accepted_at, attempts=0):
+        self.id = jid
+        self.path = path
+        self.body = body        # None 表示只在磁盘上（spilled）
+        self.size = size
+        self.accepted_at = accepted_at
+        self.resident = body is not None  # 是否占用内存队列的位置
+        self.attempts = attempts          # 已失败的次数
+
+    def __lt__(self, other):  # 重试堆中到期时间相同时的次序
+        return self.id < other.id
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestQueue:
+    def __init__(self, process, spill_dir=SPILL_DIR, queue_size=QUEUE_SIZE, max_pending=MAX_PENDING,
+                 max_bytes=MAX_BYTES, batch=BATCH, workers=WORKERS, attempts=ATTEMPTS, retry_s=RETRY_S, log=None):
+        """process(bodies) 处理一批请求体（bytes 列表）；抛出异常时这批任务稍后逐个重试，
+        共失败 attempts 次后改名为 .dead"""
+        self.process = process
+        self.spill_dir = spill_dir
+        self.queue_size = queue_size
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self.workers = workers
+        self.attempts = attempts
+        self.retry_s = retry_s
+        self.log = log
+        self.pending = deque()      # 按接受顺序的 Job
+        self.retrying = []          # (到期时间, Job) 小顶堆，到期后放回 pending 队首
+        self.in_memory = 0
+        self.pending_bytes = 0
+        self.cond = threading.Condition()
+        self.seq = itertools.count(1)
+        self.threads = []
+        self.started = False
+        self.accepted = self.rejected = self.processed = self.failed = self.recovered = 0
+        self.retried = self.batches = 0
+        self.last_lag = 0.0
+        self.lag_total = 0.0
+
+    # ---- 生命周期 ----
+    def start(self):
+        """创建落盘目录、恢复上次未完成的任务并启动后台线程（幂等）"""
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._recover()
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"ingest-{n}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _recover(self):
+        """认领已退出进程留下的任务文件（rename 为本进程名下，多个 worker 进程不会重复认领）"""
+        pid = os.getpid()
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith(".job"):
+                continue
+            try:
+                stamp, owner, _ = name.split("-", 2)
+                if int(owner) == pid or _pid_alive(int(owner)):
+                    continue
+            except ValueError:
+                continue
+            m = _ATTEMPT_RE.search(name)
+            attempts = int(m.group(1)) if m else 0
+            suffix = f".a{attempts}.job" if attempts else ".job"
+            path = os.path.join(self.spill_dir, f"{stamp}-{pid}-r{next(self.seq)}{suffix}")
+            try:
+                os.rename(os.path.join(self.spill_dir, name), path)
+            except FileNotFoundError:
+                continue  # 被其他进程抢先认领
+            size = os.path.getsize(path)
+            self.pending.append(Job(os.path.basename(path)[:-len(suffix)], path, None, size, time.time(), attempts))
+            self.pending_bytes += size
+            self.recovered += 1
+
+    # ---- 入队 ----
+    def submit(self, body):
+        """落盘并入队，返回 (job_id, depth)；队列已满时抛出 QueueFull"""
+        with self.cond:
+            if len(self.pending) + len(self.retrying) >= self.max_pending or self.pending_bytes + len(body) > self.max_bytes:
+                self.rejected += 1
+                raise QueueFull(f"待处理任务 {len(self.pending)} 个 / {self.pending_bytes} 字节，已达上限")
+            jid = f"{time.time_ns():020d}-{os.getpid()}-{next(self.seq)}"
+        path = os.path.join(self.spill_dir, jid + ".job")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        with self.cond:
+            keep = self.in_memory < self.queue_size
+            self.pending.append(Job(jid, path, body if keep else None, len(body), time.time()))
+            self.in_memory += keep
+            self.pending_bytes += len(body)
+            self.accepted += 1
+            self.cond.notify()
+            return jid, len(self.pending)
+
+    # ---- 后台处理 ----
+    def _take(self):
+        with self.cond:
+            while True:
+                now = time.time()
+                while self.retrying and self.retrying[0][0] <= now:
+                    self.pending.appendleft(heapq.heappop(self.retrying)[1])
+                if self.pending:
+                    break
+                self.cond.wait(self.retrying[0][0] - now if self.retrying else None)
+            if self.pending[0].attempts:
+                jobs = [self.pending.popleft()]  # 重试的任务单独处理，坏数据不会连累同批的其他任务
+            else:
+                n = min(self.batch, len(self.pending))
+                jobs = [self.pending.popleft() for _ in range(n) if not self.pending[0].attempts]
+            for job in jobs:
+                if job.resident:
+                    self.in_memory -= 1
+                    job.resident = False
+            # 内存队列腾出的位置留给后面被 spill 的任务（在锁外读盘）
+            refill = [j for j in itertools.islice(self.pending, self.queue_size) if not j.resident]
+            refill = refill[:max(0, self.queue_size - self.in_memory)]
+            for job in refill:
+                job.resident = True
+            self.in_memory += len(refill)
+        unread = []
+        for job in refill:
+            try:
+                with open(job.path, "rb") as f:
+                    job.body = f.read()
+            except OSError:
+                unread.append(job)  # 已被其他线程处理完，或文件不可读（由 _worker 读取时处理）
+        if unread:
+            with self.cond:
+                for job in unread:
+                    if job.resident and job.body is None:  # 仍在队列中：让出内存队列的位置
+                        job.resident = False
+                        self.in_memory -= 1
+        return jobs
+
+    def _worker(self):
+        while True:
+            jobs = self._take()
+            ready, bodies, dead = [], [], []
+            for job in jobs:
+                if job.body is None:
+                    try:
+                        with open(job.path, "rb") as f:
+                            job.body = f.read()
+                    except OSError as e:
+                        # 落盘文件丢失 / 不可读：重试也不会成功，直接记为失败（文件还在时移入死信）
+                        if self.log:
+                            self.log.error("异步任务文件读取失败", job=job.id, error=str(e))
+                        dead.append(job)
+                        continue
+                ready.append(job)
+                bodies.append(job.body)
+            ok = True
+            try:
+                if bodies:
+                    self.process(bodies)
+            except Exception as e:
+                ok = False
+                if self.log:
+                    self.log.error("异步任务处理失败", jobs=len(ready), error=str(e))
+            done = time.time()
+            retry, processed = [], []
+            for job in ready:
+                if ok:
+                    try:
+                        os.remove(job.path)
+                    except FileNotFoundError:
+                        pass
+                    processed.append(job)
+                elif job.attempts + 1 < self.attempts:
+                    retry.append(self._requeue(job))
+                else:
+                    dead.append(job)
+            for job in dead:
+                self._dead_letter(job)
+            finished = processed + dead
+            with self.cond:
+                self.batches += 1
+                self.pending_bytes -= sum(j.size for j in finished)
+                self.processed += len(processed)
+                self.failed += len(dead)
+                self.retried += len(retry)
+                for job in retry:
+                    heapq.heappush(self.retrying, (done + self.retry_s * 2 ** (job.attempts - 1), job))
+                if finished:
+                    self.last_lag = done - finished[0].accepted_at
+                    self.lag_total += sum(done - j.accepted_at for j in finished)
+                self.cond.notify_all()
+
+    def _requeue(self, job):
+        """失败次数记进文件名（重启后继续计数），任务改为只在磁盘上等待重试"""
+        job.attempts += 1
+        path = os.path.join(self.spill_dir, f"{job.id}.a{job.attempts}.job")
+        try:
+            os.rename(job.path, path)
+            job.path = path
+        except OSError:
+            pass
+        job.body, job.resident = None, False
+        return job
+
+    def _dead_letter(self, job):
+        dead = job.path[:-len(".job")] + ".dead"
+        try:
+            os.rename(job.path, dead)
+        except OSError:
+            return
+        if self.log:
+            self.log.error("异步任务多次处理失败，已移入死信", job=job.id, attempts=job.attempts + 1, path=dead)
+
+    def drain(self, timeout=None):
+        """等待当前所有待处理任务完成（测试 / 优雅退出用），超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.pending or self.retrying or self.processed + self.failed < self.accepted + self.recovered:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self.cond:
+            finished = self.processed + self.failed
+            oldest = self.pending[0].accepted_at if self.pending else None
+            return {
+                "depth": len(self.pending) + len(self.retrying),
+                "in_memory": self.in_memory,
+                "spilled": len(self.pending) - self.in_memory,
+                "pending_bytes": self.pending_bytes,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "recovered": self.recovered,
+                "processed": self.processed,
+                "failed": self.failed,
+                "retrying": len(self.retrying),
+                "retried": self.retried,
+                "batches": self.batches,
+                "oldest_pending_s": round(time.time() - oldest, 3) if oldest else 0.0,
+                "last_lag_s": round(self.last_lag, 3),
+                "avg_lag_s": round(self.lag_total / finished, 3) if finished else 0.0,
+            }
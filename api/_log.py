@@ -0,0 +1,86 @@
+"""deepseek-processor 的结构化分级日志（JSON 行输出到 stderr）
+
+- 级别由环境变量 DEEPSEEK_LOG_LEVEL 控制（DEBUG/INFO/WARN/ERROR，默认 INFO）
+- DEEPSEEK_LOG_SAMPLE（0~1，默认 1）对每个请求抽样，未抽中的请求只记录 WARN 及以上
+- DEEPSEEK_LOG_PREVIEW（字节数，默认 256）限制负载预览长度
+- 字段值可以是无参函数，只有在该条日志真正输出时才会求值，
+  因此 json.dumps(..., indent=2) 之类的开销只在 DEBUG 级别发生
+"""
+import os
+import sys
+import json
+import random
+import threading
+import time
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR"}
+_BY_NAME = {"DEBUG": DEBUG, "INFO": INFO, "WARN": WARN, "WARNING": WARN, "ERROR": ERROR}
+
+
+def preview(value, limit):
+    """把字符串/bytes 截断到 limit 字节，附上被截掉的长度"""
+    if isinstance(value, (bytes, bytearray)):
+        raw = bytes(value)
+    else:
+        raw = str(value).encode("utf-8")
+    if len(raw) <= limit:
+        return raw.decode("utf-8", errors="replace")
+    return raw[:limit].decode("utf-8", errors="ignore") + f"...(+{len(raw) - limit} bytes)"
+
+
+class Logger:
+    def __init__(self, name, level=None, sample=None, preview_bytes=None, stream=None):
+        self.name = name
+        self.level = _BY_NAME.get(str(level or os.environ.get("DEEPSEEK_LOG_LEVEL", "INFO")).upper(), INFO)
+        self.sample = float(sample if sample is not None else os.environ.get("DEEPSEEK_LOG_SAMPLE", 1.0))
+        self.preview_bytes = int(preview_bytes or os.environ.get("DEEPSEEK_LOG_PREVIEW", 256))
+        self.stream = stream or sys.stderr
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ---- per-request sampling ----
+    def begin_request(self):
+        """每个请求开始时调用，决定本请求的 DEBUG/INFO 日志是否输出"""
+        self._local.sampled = self.sample >= 1 or random.random() < self.sample
+
+    def enabled(self, level):
+        if level < self.level:
+            return False
+        if level < WARN and not getattr(self._local, "sampled", True):
+            return False
+        return True
+
+    @property
+    def debug_enabled(self):
+        return self.enabled(DEBUG)
+
+    def preview(self, value):
+        return preview(value, self.preview_bytes)
+
+    # ---- emit ----
+    def log(self, level, msg, **fields):
+        if not self.enabled(level):
+            return
+        record = {"ts": round(time.time(), 3), "level": LEVEL_NAMES[level], "logger": self.name, "msg": msg}
+        for k, v in fields.items():
+            record[k] = v() if callable(v) else v
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    def debug(self, msg, **fields):
+        self.log(DEBUG, msg, **fields)
+
+    def info(self, msg, **fields):
+        self.log(INFO, msg, **fields)
+
+    def warn(self, msg, **fields):
+        self.log(WARN, msg, **fields)
+
+    def error(self, msg, **fields):
+        self.log(ERROR, msg, **fields)
+
+
+def get_logger(name="deepseek-processor"):
+    return Logger(name)
@@ -0,0 +1,331 @@
+"""webhook 新闻批量同步到 Notion 数据库
+
+- 只用标准库（http.client，每个线程一条 keep-alive 连接），Vercel 上不需要额外依赖
+- 按规范化 URL 去重：首次同步时分页读取数据库中已有页面的 URL（filter_properties 只取 URL 列），
+  建立 URL -> page_id 索引并缓存 DEEPSEEK_NOTION_INDEX_TTL 秒，新建的页面直接加入索引
+- 写入：DEEPSEEK_NOTION_CONCURRENCY 个线程共享一个令牌桶（DEEPSEEK_NOTION_RATE 次/秒），
+  429 按 Retry-After 暂停所有线程，5xx / 网络错误指数退避重试
+- 令牌桶默认放在 quota.py 的共享配额文件里，与同机使用同一 token 的 main.py / 其他 worker 进程
+  共用一个速率上限；DEEPSEEK_NOTION_SHARED_QUOTA=0 或配额目录不可写时退回进程内令牌桶
+- 批处理：submit() 只把新闻放进缓冲区，满 DEEPSEEK_NOTION_BATCH 条或 DEEPSEEK_NOTION_FLUSH_S 秒后由后台线程统一同步；
+  整批同步失败（读取 schema / 索引出错等）时新闻放回缓冲区队首，按 FLUSH_S 翻倍退避（最长 SYNC_BACKOFF_MAX 秒）后重试；
+  单条页面创建在客户端重试后仍为 429 / 5xx / 网络错误时同样放回缓冲区（requeued），只有其他 4xx 才丢弃并逐条记录
+- 列按类型匹配（与 main.py 的 match_task_columns 一样容错）：title / url / select / multi_select / date / rich_text
+"""
+import os
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+from concurrent.futures import ThreadPoolExecutor
+
+import jsoncodec
+from _store import normalize_url
+
+try:
+    from quota import SharedQuota
+except ImportError:
+    SharedQuota = None
+
+NOTION_TOKEN = os.environ.get("NOTION_TOKEN", "")
+NEWS_DB_ID = os.environ.get("DEEPSEEK_NOTION_DB_ID", "")
+API_BASE = os.environ.get("NOTION_API_BASE", "https://api.notion.com/v1").rstrip("/")
+RATE = float(os.environ.get("DEEPSEEK_NOTION_RATE", 3))
+CONCURRENCY = int(os.environ.get("DEEPSEEK_NOTION_CONCURRENCY", 3))
+BATCH = int(os.environ.get("DEEPSEEK_NOTION_BATCH", 50))
+FLUSH_SECONDS = float(os.environ.get("DEEPSEEK_NOTION_FLUSH_S", 5))
+INDEX_TTL = float(os.environ.get("DEEPSEEK_NOTION_INDEX_TTL", 600))
+SHARED_QUOTA = os.environ.get("DEEPSEEK_NOTION_SHARED_QUOTA", "1") != "0"
+MAX_RETRIES = 5
+SYNC_BACKOFF_MAX = 300.0
+TEXT_LIMIT = 2000  # Notion 单个 rich_text 片段的长度上限
+
+
+class NotionError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status} {message}")
+        self.status = status
+
+
+def retryable(status):
+    """429 / 5xx / 网络错误（status 0）稍后重试可能成功；其他 4xx 是请求本身的问题"""
+    return status in (0, 429) or status >= 500
+
+
+class RateLimiter:
+    """令牌桶：rate 次/秒，允许 burst 次突发；pause() 让所有调用方一起等待"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, priority=None):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+
+class NotionClient:
+    def __init__(self, token=NOTION_TOKEN, base=API_BASE, rate=RATE, priority="write"):
+        """priority：共享配额中的优先级（quota.PRIORITIES），历史补录用 diagnostic 让出给 main.py 的夜间写入"""
+        parts = urlsplit(base)
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Notion-Version": "2022-06-28",
+            "Content-Type": "application/json",
+        }
+        self.limiter = None
+        if SHARED_QUOTA and SharedQuota is not None:
+            try:
+                self.limiter = SharedQuota(token, rate, burst=max(1, int(rate)))
+            except OSError:
+                pass
+        if self.limiter is None:
+            self.limiter = RateLimiter(rate)
+        self.priority = priority
+        self.local = threading.local()
+        self.requests = self.retries = 0
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, timeout=30)
+        return conn
+
+    def request(self, method, path, body=None):
+        """返回解析后的 JSON；429 / 5xx / 网络错误重试，最终失败抛出 NotionError"""
+        data = jsoncodec.dumps_bytes(body) if body is not None else None
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire(self.priority)
+            self.requests += 1
+            try:
+                conn = self._conn()
+                conn.request(method, self.prefix + path, body=data, headers=self.headers)
+                resp = conn.getresponse()
+                status, raw = resp.status, resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.local.conn = None
+                status, raw = 0, str(e).encode()
+            if status == 200:
+                return jsoncodec.loads(raw)
+            if attempt < MAX_RETRIES and retryable(status):
+                self.retries += 1
+                if status == 429:
+                    self.limiter.pause(float(resp.getheader("Retry-After") or 1))
+                else:
+                    time.sleep(min(0.5 * 2 ** attempt, 8))
+                continue
+            raise NotionError(status, raw[:300].decode("utf-8", errors="replace"))
+
+
+def match_news_columns(dbinfo):
+    """每种类型取第一列：title / url / select(来源) / multi_select(标签) / date(发布时间) / rich_text(摘要)"""
+    cols = {}
+    for name, meta in dbinfo.get("properties", {}).items():
+        cols.setdefault(meta.get("type"), (name, meta.get("id")))
+    return cols
+
+
+def build_news_props(cols, item):
+    def text(value):
+        return [{"text": {"content": str(value)[:TEXT_LIMIT]}}]
+
+    props = {cols["title"][0]: {"title": text(item.get("title") or item.get("url") or "")}}
+    if "url" in cols:
+        props[cols["url"][0]] = {"url": item.get("url") or item.get("link")}
+    if "select" in cols and item.get("source"):
+        props[cols["select"][0]] = {"select": {"name": str(item["source"])[:100].replace(",", " ")}}
+    if "multi_select" in cols and isinstance(item.get("tags"), list):
+        props[cols["multi_select"][0]] = {"multi_select": [{"name": str(t)[:100].replace(",", " ")}
+                                                            for t in item["tags"] if t]}
+    if "date" in cols and item.get("published_at"):
+        props[cols["date"][0]] = {"date": {"start": str(item["published_at"])}}
+    if "rich_text" in cols and item.get("summary"):
+        props[cols["rich_text"][0]] = {"rich_text": text(item["summary"])}
+    return props
+
+
+class NewsSync:
+    def __init__(self, client, database_id, concurrency=CONCURRENCY, batch=BATCH,
+                 flush_seconds=FLUSH_SECONDS, index_ttl=INDEX_TTL, log=None):
+        self.client = client
+        self.database_id = database_id
+        self.concurrency = concurrency
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self.index_ttl = index_ttl
+        self.log = log
+        self.cols = None
+        self.index = {}          # 规范化 URL -> page_id
+        self.index_loaded = 0.0
+        self.buffer = []
+        self.cond = threading.Condition()
+        self.sync_lock = threading.Lock()
+        self.thread = None
+        self.totals = {"created": 0, "duplicate": 0, "no_url": 0, "failed": 0, "requeued": 0,
+                       "seconds": 0.0, "sync_errors": 0}
+
+    # ---- 缓冲与后台刷新 ----
+    def submit(self, items):
+        with self.cond:
+            self.buffer.extend(items)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._flusher, name="notion-sync", daemon=True)
+                self.thread.start()
+            if len(self.buffer) >= self.batch:
+                self.cond.notify()
+
+    def _flusher(self):
+        failures = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.buffer) >= self.batch, timeout=self.flush_seconds)
+                items, self.buffer = self.buffer, []
+            if not items:
+                continue
+            try:
+                counts = self._sync_or_requeue(items)
+                error = f"{counts['requeued']} 条页面创建暂时失败" if counts["requeued"] else None
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                failures = 0
+                continue
+            failures += 1
+            delay = min(max(self.flush_seconds, 1.0) * 2 ** (failures - 1), SYNC_BACKOFF_MAX)
+            if self.log:
+                self.log.error("Notion 同步失败，稍后重试", items=len(items), retry_in_s=delay, error=error)
+            time.sleep(delay)  # 退避期间新提交的新闻只进缓冲区
+
+    def _sync_or_requeue(self, items):
+        """同步失败时把这批新闻放回缓冲区队首（保持顺序），再抛出异常"""
+        try:
+            return self.sync(items)
+        except Exception:
+            with self.cond:
+                self.buffer[:0] = items
+                self.totals["sync_errors"] += 1
+            raise
+
+    def flush(self):
+        """同步缓冲区中的全部新闻（不等后台线程）；失败时新闻留在缓冲区"""
+        with self.cond:
+            items, self.buffer = self.buffer, []
+        return self._sync_or_requeue(items) if items else None
+
+    # ---- 索引 ----
+    def load_index(self, force=False):
+        if self.cols is None:
+            self.cols = match_news_columns(self.client.request("GET", f"/databases/{self.database_id}"))
+            if "title" not in self.cols or "url" not in self.cols:
+                raise NotionError(400, "新闻数据库需要 title 与 url 类型的列")
+        if not force and self.index_loaded and time.monotonic() - self.index_loaded < self.index_ttl:
+            return
+        url_name, url_id = self.cols["url"]
+        path = f"/databases/{self.database_id}/query?filter_properties={quote(url_id or url_name)}"
+        body, index = {"page_size": 100}, {}
+        while True:
+            data = self.client.request("POST", path, body)
+            for page in data.get("results", []):
+                key = normalize_url((page.get("properties", {}).get(url_name) or {}).get("url") or "")
+                if key:
+                    index[key] = page["id"]
+            if not data.get("has_more") or not data.get("next_cursor"):
+                break
+            body["start_cursor"] = data["next_cursor"]
+        self.index = index
+        self.index_loaded = time.monotonic()
+
+    # ---- 同步 ----
+    def sync(self, items):
+        """去重后并发创建页面，返回本批统计（含 items_per_s）；暂时失败的新闻放回缓冲区队首（requeued）"""
+        with self.sync_lock:
+            t0 = time.monotonic()
+            self.load_index()
+            counts = {"created": 0, "duplicate": 0, "no_url": 0, "failed": 0, "requeued": 0}
+            todo, seen = [], set()
+            for item in items:
+                key = normalize_url((item.get("url") or item.get("link") or "") if isinstance(item, dict) else "")
+                if not key:
+                    counts["no_url"] += 1
+                elif key in self.index or key in seen:
+                    counts["duplicate"] += 1
+                else:
+                    seen.add(key)
+                    todo.append((key, item))
+
+            def create(entry):
+                key, item = entry
+                payload = {"parent": {"database_id": self.database_id},
+                           "properties": build_news_props(self.cols, item)}
+                try:
+                    return key, self.client.request("POST", "/pages", payload)["id"], None
+                except NotionError as e:
+                    return key, None, e
+
+            requeue = []
+            with ThreadPoolExecutor(max_workers=self.concurrency) as ex:
+                for (key, page_id, error), (_, item) in zip(ex.map(create, todo), todo):
+                    if page_id:
+                        self.index[key] = page_id
+                        counts["created"] += 1
+                    elif retryable(error.status):
+                        requeue.append(item)
+                    else:
+                        counts["failed"] += 1
+                        if self.log:
+                            self.log.warn("Notion 页面创建失败，已丢弃", url=key, error=str(error))
+            if requeue:
+                with self.cond:
+                    self.buffer[:0] = requeue
+                counts["requeued"] = len(requeue)
+            seconds = time.monotonic() - t0
+            for k, v in counts.items():
+                self.totals[k] += v
+            self.totals["seconds"] += seconds
+            counts["seconds"] = round(seconds, 3)
+            counts["items_per_s"] = round(counts["created"] / seconds, 2) if seconds else 0.0
+            if self.log:
+                self.log.info("Notion 同步完成", **counts)
+            return counts
+
+    def stats(self):
+        t = dict(self.totals)
+        t["items_per_s"] = round(t["created"] / t["seconds"], 2) if t["seconds"] else 0.0
+        t["seconds"] = round(t["seconds"], 3)
+        t.update(buffered=len(self.buffer), indexed=len(self.index),
+                 requests=self.client.requests, retries=self.client.retries)
+        if hasattr(self.client.limiter, "stats"):
+            t["quota"] = self.client.limiter.stats()
+        return t
+
+
+def open_sync(log=None):
+    """未设置 NOTION_TOKEN / DEEPSEEK_NOTION_DB_ID 时返回 None（不同步）"""
+    if not NOTION_TOKEN or not NEWS_DB_ID:
+        return None
+    return NewsSync(NotionClient(), NEWS_DB_ID, log=log)
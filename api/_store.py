@@ -0,0 +1,295 @@
+"""webhook 新闻的去重追加存储（JSONL）
+
+- 每条新闻一行 {"id", "key", "digest", "ts", "item"}，只追加不改写，单次 write 写入一批
+- 去重键：规范化 URL（去掉 scheme / www / 片段 / utm_* 等跟踪参数 / 末尾斜杠）的哈希，
+  没有 URL 时用规范化标题（NFKC + casefold，只保留字母数字）的哈希；内存中以 dict 索引，O(1) 判重
+- 同一键内容相同则跳过；内容变化时追加新版本，旧行成为废弃行
+- 废弃行超过 DEEPSEEK_NEWS_COMPACT_MIN 且超过存活行的 DEEPSEEK_NEWS_COMPACT_RATIO 倍时压缩（重写文件后 os.replace）
+- 多进程（prefork）通过 <path>.lock 上的 flock 串行写入；每次操作前读入其他进程追加的尾部，
+  文件被其他进程压缩替换（inode 变化）时重新加载
+- 文件按进程打开：fork 前打开的描述符在父子进程间共享同一个打开文件描述，flock 对它们不互斥，
+  所以每次操作先检查 os.getpid()，在新进程中重新打开锁文件与数据文件并重新加载
+- page() 按 id 倒序分页读取（GET /news），只按偏移读取需要的行
+"""
+import os
+import time
+import bisect
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+try:
+    import fcntl
+except ImportError:  # Windows：只有进程内的线程锁
+    fcntl = None
+
+import jsoncodec
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NEWS_PATH = os.environ.get("DEEPSEEK_NEWS_PATH", os.path.join(_ROOT, "data", "ai_news.jsonl"))
+LEGACY_PATH = os.path.join(_ROOT, "data", "ai_news.json")
+COMPACT_MIN = int(os.environ.get("DEEPSEEK_NEWS_COMPACT_MIN", 1000))
+COMPACT_RATIO = float(os.environ.get("DEEPSEEK_NEWS_COMPACT_RATIO", 0.5))
+PAGE_LIMIT = 100
+
+_TRACKING_PARAMS = {"ref", "spm", "from", "source", "fbclid", "gclid"}
+
+
+def normalize_url(url):
+    try:
+        parts = urlsplit(str(url).strip())
+    except ValueError:
+        return ""
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if not host:
+        return ""
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS)
+    path = parts.path.rstrip("/")
+    return host + path + ("?" + urlencode(query) if query else "")
+
+
+def normalize_title(title):
+    text = unicodedata.normalize("NFKC", str(title)).casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def news_key(item):
+    """返回去重键；既没有 URL 也没有标题的条目返回 None（不入库）"""
+    if not isinstance(item, dict):
+        return None
+    url = normalize_url(item.get("url") or item.get("link") or "")
+    if url:
+        return "u:" + hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+    title = normalize_title(item.get("title") or "")
+    if title:
+        return "t:" + hashlib.blake2b(title.encode("utf-8"), digest_size=16).hexdigest()
+    return None
+
+
+def _digest(item):
+    return hashlib.blake2b(jsoncodec.dumps_bytes(item), digest_size=8).hexdigest()
+
+
+class NewsStore:
+    def __init__(self, path, compact_min=COMPACT_MIN, compact_ratio=COMPACT_RATIO):
+        self.path = path
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.lock = threading.Lock()
+        self.pid = None
+        self.lock_fd = self.fd = None
+        self.compactions = 0
+        with self._locked():  # 在本进程打开并加载；目录不可写时抛出 OSError
+            pass
+
+    # ---- 文件与锁 ----
+    @contextmanager
+    def _locked(self):
+        with self.lock:
+            fresh = self.pid != os.getpid()
+            if fresh:
+                if self.lock_fd is not None:
+                    os.close(self.lock_fd)  # 只关闭本进程继承的副本，不影响父进程
+                self.lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+                self.pid = os.getpid()
+            if fcntl is not None:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+            try:
+                if fresh:
+                    if not os.path.exists(self.path):
+                        self._create()
+                    self._reload()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def _create(self):
+        """首次创建时导入旧的 data/ai_news.json（如果有内容）"""
+        lines, now = [], time.time()
+        try:
+            with open(LEGACY_PATH, "rb") as f:
+                legacy = jsoncodec.loads(f.read())
+        except (OSError, ValueError):
+            legacy = []
+        seen = set()
+        for item in legacy if isinstance(legacy, list) else []:
+            key = news_key(item)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            lines.append(self._line(len(lines) + 1, key, _digest(item), now, item))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(lines))
+        os.replace(tmp, self.path)
+
+    def _reload(self):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+        self.inode = os.fstat(self.fd).st_ino
+        self.index = {}     # key -> (id, digest)
+        self.offsets = {}   # 存活记录 id -> (offset, length)
+        self.order = []     # 按追加顺序的 id（含已废弃的，读取时跳过）
+        self.next_id = 1
+        self.dead = 0
+        self.pos = 0
+        self._catch_up()
+
+    def _sync(self):
+        """读入其他进程追加的记录；文件已被压缩替换时整体重新加载"""
+        try:
+            if os.stat(self.path).st_ino != self.inode:
+                self._reload()
+                return
+        except FileNotFoundError:
+            self._create()
+            self._reload()
+            return
+        self._catch_up()
+
+    def _catch_up(self):
+        size = os.fstat(self.fd).st_size
+        if size <= self.pos:
+            return
+        data = os.pread(self.fd, size - self.pos, self.pos)
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # 上次写入中途崩溃留下的半行：截掉，避免与后续追加拼在一起
+            os.ftruncate(self.fd, self.pos + end)
+        start = 0
+        while start < end:
+            stop = data.index(b"\n", start) + 1
+            try:
+                rec = jsoncodec.loads(data[start:stop])
+                self._apply(rec["id"], rec["key"], rec["digest"], self.pos + start, stop - start)
+            except (ValueError, KeyError, TypeError):
+                pass  # 损坏的行视为废弃行
+            start = stop
+        self.pos += end
+
+    def _apply(self, rid, key, digest, offset, length):
+        old = self.index.get(key)
+        if old is not None and self.offsets.pop(old[0], None) is not None:
+            self.dead += 1
+        self.index[key] = (rid, digest)
+        self.offsets[rid] = (offset, length)
+        self.order.append(rid)
+        self.next_id = max(self.next_id, rid + 1)
+
+    @staticmethod
+    def _line(rid, key, digest, ts, item):
+        return jsoncodec.dumps_bytes({"id": rid, "key": key, "digest": digest, "ts": ts, "item": item}) + b"\n"
+
+    # ---- 写入 ----
+    def add_many(self, items):
+        """批量入库，返回 {"added", "updated", "duplicate", "skipped"}"""
+        counts = {"added": 0, "updated": 0, "duplicate": 0, "skipped": 0}
+        prepared = []
+        for item in items:
+            key = news_key(item)
+            if key is None:
+                counts["skipped"] += 1
+            else:
+                prepared.append((key, _digest(item), item))
+        if not prepared:
+            return counts
+        with self._locked():
+            self._sync()
+            pending, batch, now = {}, [], time.time()
+            for key, digest, item in prepared:
+                current = pending.get(key) or self.index.get(key)
+                if current is not None and current[1] == digest:
+                    counts["duplicate"] += 1
+                    continue
+                counts["updated" if current is not None else "added"] += 1
+                rid = self.next_id + len(batch)
+                pending[key] = (rid, digest)
+                batch.append((rid, key, digest, self._line(rid, key, digest, now, item)))
+            if batch:
+                os.write(self.fd, b"".join(line for *_, line in batch))
+                offset = self.pos
+                for rid, key, digest, line in batch:
+                    self._apply(rid, key, digest, offset, len(line))
+                    offset += len(line)
+                self.pos = offset
+                if self.dead >= self.compact_min and self.dead > len(self.offsets) * self.compact_ratio:
+                    self._compact()
+        return counts
+
+    def compact(self):
+        with self._locked():
+            self._sync()
+            self._compact()
+
+    def _compact(self):
+        """只保留每个键的最新版本，按 id 顺序重写到新文件后原子替换"""
+        tmp = self.path + ".compact"
+        offsets, order, pos = {}, [], 0
+        with open(tmp, "wb") as out:
+            for rid in self.order:
+                loc = self.offsets.get(rid)
+                if loc is None:
+                    continue
+                out.write(os.pread(self.fd, loc[1], loc[0]))
+                offsets[rid] = (pos, loc[1])
+                order.append(rid)
+                pos += loc[1]
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+        self.inode = os.fstat(self.fd).st_ino
+        self.offsets, self.order, self.pos, self.dead = offsets, order, pos, 0
+        self.compactions += 1
+
+    # ---- 读取 ----
+    def page(self, cursor=None, limit=50):
+        """按 id 倒序返回一页：{"results": [...], "next_cursor": str | None, "has_more": bool}"""
+        limit = max(1, min(int(limit), PAGE_LIMIT))
+        with self._locked():
+            self._sync()
+            i = bisect.bisect_left(self.order, int(cursor)) if cursor else len(self.order)
+            locs = []
+            while i > 0 and len(locs) <= limit:
+                i -= 1
+                loc = self.offsets.get(self.order[i])
+                if loc is not None:
+                    locs.append(loc)
+            raw = [os.pread(self.fd, length, offset) for offset, length in locs[:limit]]
+        results = []
+        for line in raw:
+            rec = jsoncodec.loads(line)
+            results.append({"id": rec["id"], "ts": rec["ts"], "item": rec["item"]})
+        has_more = len(locs) > limit
+        return {
+            "results": results,
+            "next_cursor": str(results[-1]["id"]) if has_more else None,
+            "has_more": has_more,
+        }
+
+    def stats(self):
+        with self.lock:
+            return {
+                "live": len(self.offsets),
+                "dead": self.dead,
+                "bytes": self.pos,
+                "compactions": self.compactions,
+            }
+
+
+def open_store(path=NEWS_PATH):
+    """DEEPSEEK_NEWS_PATH 为空或目录不可写（如 Vercel 只读文件系统）时返回 None，webhook 不入库"""
+    if not path:
+        return None
+    try:
+        return NewsStore(path)
+    except OSError:
+        return None
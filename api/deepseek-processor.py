@@ -1,16 +1,87 @@
 from http.server import BaseHTTPRequestHandler
 import json
+import os
 import sys
+from collections.abc import Iterator
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jsoncodec
+from _log import get_logger
+from _batch import decode_batch, decode_iter
+from _body import BodyTooLarge, BadChunkedBody, JsonStream, has_body, iter_body, iter_json_array, read_prefix
+from _cache import CACHE_MAX_BODY, ReplayCache, body_key, idempotency_key
+from _store import NEWS_PATH, open_store
+from _ingest import IngestQueue, QueueFull
+from _notion import open_sync
+
+log = get_logger()
+# 响应默认紧凑输出；调试时可设 DEEPSEEK_PRETTY_JSON=1
+PRETTY_JSON = os.environ.get("DEEPSEEK_PRETTY_JSON", "") not in ("", "0", "false")
+replay_cache = ReplayCache()
+news_store = open_store()
+if news_store is None and NEWS_PATH:
+    log.warn("新闻存储不可用，webhook 不入库", path=NEWS_PATH)
+
+
+# 设置了 NOTION_TOKEN 与 DEEPSEEK_NOTION_DB_ID 时，新闻按批同步到 Notion
+news_sync = open_sync(log)
+
+
+def publish_news(news):
+    """新闻写入去重存储并交给 Notion 同步；出错只记日志，不影响 webhook 响应"""
+    if not news:
+        return
+    if news_store is not None:
+        try:
+            counts = news_store.add_many(news)
+            log.info("新闻入库", **counts)
+        except (OSError, ValueError) as e:
+            log.error("新闻入库失败", error=str(e))
+    if news_sync is not None:
+        news_sync.submit(news)
+
+
+def ingest_batch(bodies):
+    """异步队列的后台处理：合并一批请求体中的全部数据项后统一解码、入库"""
+    items = []
+    for body in bodies:
+        items.extend(jsoncodec.loads(body))
+    news, errors = decode_batch(items)
+    for err in errors:
+        log.warn("数据项解析失败，已跳过", **err)
+    log.info("异步批处理完成", requests=len(bodies), batch=len(items), items=len(news), failed=len(errors))
+    publish_news(news)
+
+
+# 后台线程在第一次 POST /ingest（或 serve_webhook.py 启动）时才创建
+ingest_queue = IngestQueue(ingest_batch, log=log)
 
 class handler(BaseHTTPRequestHandler):
-    
+
+    def log_message(self, format, *args):
+        """访问日志走结构化日志（DEBUG），不再每个请求写一行 stderr"""
+        log.debug("access", client=self.address_string(), line=lambda: format % args)
+
     def do_GET(self):
         """处理GET请求 - 修复501错误"""
-        print(f"=== 收到GET请求: {self.path} ===", file=sys.stderr)
-        
-        if self.path == '/health' or self.path == '/webhook':
+        log.begin_request()
+        log.info("收到GET请求", path=self.path)
+
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.send_success_response({
+                "replay_cache": replay_cache.stats(),
+                "news_store": news_store.stats() if news_store else None,
+                "ingest": ingest_queue.stats(),
+                "notion_sync": news_sync.stats() if news_sync else None,
+            })
+        elif url.path == '/news':
+            self.handle_news_page(parse_qs(url.query))
+        elif self.path == '/health' or self.path == '/webhook':
             response = {
-                "status": "healthy", 
+                "status": "healthy",
                 "service": "deepseek-processor",
                 "message": "服务正常运行中",
                 "usage": "请使用POST方法发送数据到/webhook"
@@ -18,104 +89,216 @@ class handler(BaseHTTPRequestHandler):
             self.send_success_response(response)
         else:
             self.send_error_response(404, {"error": "路径未找到"})
-    
+
     def do_POST(self):
         """处理POST请求"""
-        print(f"=== 收到POST请求: {self.path} ===", file=sys.stderr)
-        
+        log.begin_request()
+        log.info("收到POST请求", path=self.path)
+
         if self.path == '/webhook':
             self.handle_webhook()
+        elif self.path == '/ingest':
+            self.handle_ingest()
         else:
+            # 请求体未读取，keep-alive 连接不能复用
+            self.close_connection = True
             self.send_error_response(404, {"error": "路径未找到"})
-    
+
     def do_OPTIONS(self):
         """处理CORS预检请求"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
-    
+
     def handle_webhook(self):
         """处理webhook数据"""
         try:
-            # 读取请求数据
-            content_length = int(self.headers.get('Content-Length', 0))
-            print(f"Content-Length: {content_length}", file=sys.stderr)
-            
-            if content_length == 0:
+            # 读取请求数据（按块流式读取，Content-Length 超限直接 413）
+            if not has_body(self.headers):
                 self.send_success_response({"error": "请求体为空"})
                 return
-                
-            post_data = self.rfile.read(content_length)
-            raw_data = post_data.decode('utf-8')
-            print(f"原始请求数据: {raw_data}", file=sys.stderr)
-            
-            # 解析JSON数据
-            data = json.loads(raw_data)
-            print(f"解析后的数据: {json.dumps(data, indent=2, ensure_ascii=False)}", file=sys.stderr)
-            
+
+            chunks = iter_body(self.rfile, self.headers)
+
+            # 重放缓存：优先用 Idempotency-Key，其次用（不太大的）请求体哈希
+            key = idempotency_key(self.headers)
+            if key is None:
+                head, chunks = read_prefix(chunks, CACHE_MAX_BODY)
+                if head is not None:
+                    key = body_key(head)
+            if key is not None:
+                entry = replay_cache.get(key)
+                if entry is not None:
+                    for _ in chunks:  # 丢弃未读的请求体，保证 keep-alive 可复用
+                        pass
+                    log.info("重放缓存命中", key=key[:24])
+                    self.send_cached_response(entry, hit=True)
+                    return
+
+            stream = JsonStream(chunks)
+
+            # 顶层数组逐项解析，不在内存中拼出完整请求体
+            if stream.peek() == "[":
+                data = iter_json_array(stream)
+            else:
+                data = jsoncodec.loads(stream.rest())
+
             # 处理DeepSeek数据
             processed_data = self.process_deepseek_data(data)
-            print(f"处理后的数据: {json.dumps(processed_data, indent=2, ensure_ascii=False)}", file=sys.stderr)
-            
-            # 返回处理结果
-            self.send_success_response(processed_data)
-            
+            log.info("请求体", bytes=stream.bytes_read, preview=lambda: log.preview(stream.head))
+            log.debug("处理后的数据", data=lambda: jsoncodec.dumps(processed_data, pretty=True))
+            if isinstance(processed_data, list):
+                publish_news(processed_data)
+
+            # 返回处理结果（处理失败的 {"error": ...} 不缓存）
+            if key is not None and isinstance(processed_data, list):
+                body = jsoncodec.dumps_bytes(processed_data, pretty=PRETTY_JSON)
+                self.send_cached_response(replay_cache.put(key, body, self.item_errors), hit=False)
+            else:
+                self.send_success_response(processed_data)
+
+        except BodyTooLarge as e:
+            log.warn("请求体过大", limit=e.limit, content_length=self.headers.get('Content-Length'))
+            # 请求体没有读完，连接不能复用
+            self.close_connection = True
+            self.send_error_response(413, {"error": str(e)})
+        except BadChunkedBody as e:
+            log.warn("chunked 请求体格式错误", error=str(e))
+            self.close_connection = True
+            self.send_error_response(400, {"error": str(e)})
         except json.JSONDecodeError as e:
-            print(f"JSON解析错误: {e}", file=sys.stderr)
+            log.warn("JSON解析错误", error=str(e))
+            self.close_connection = True
             self.send_error_response(400, {"error": f"JSON解析错误: {str(e)}"})
         except Exception as e:
-            print(f"服务器错误: {e}", file=sys.stderr)
+            log.error("服务器错误", error=str(e))
             self.send_error_response(500, {"error": f"服务器错误: {str(e)}"})
-    
+
+    def handle_ingest(self):
+        """异步接收：校验请求体为 JSON 数组后落盘入队，立即返回 202；队列满时 429"""
+        try:
+            body = b"".join(iter_body(self.rfile, self.headers))
+            data = jsoncodec.loads(body) if body else None
+            if not isinstance(data, list):
+                self.send_error_response(400, {"error": "请求体应为 JSON 数组"})
+                return
+            ingest_queue.start()
+            job, depth = ingest_queue.submit(body)
+        except BodyTooLarge as e:
+            log.warn("请求体过大", limit=e.limit, content_length=self.headers.get('Content-Length'))
+            self.close_connection = True
+            self.send_error_response(413, {"error": str(e)})
+            return
+        except BadChunkedBody as e:
+            self.close_connection = True
+            self.send_error_response(400, {"error": str(e)})
+            return
+        except json.JSONDecodeError as e:
+            log.warn("JSON解析错误", error=str(e))
+            self.send_error_response(400, {"error": f"JSON解析错误: {str(e)}"})
+            return
+        except QueueFull as e:
+            log.warn("接收队列已满", error=str(e))
+            self.send_error_response(429, {"error": str(e)}, retry_after=1)
+            return
+        except OSError as e:
+            log.error("任务落盘失败", error=str(e))
+            self.send_error_response(503, {"error": f"任务落盘失败: {e}"})
+            return
+        log.info("已入队", job=job, depth=depth, bytes=len(body))
+        self.send_success_response({"status": "accepted", "job": job, "queue_depth": depth}, code=202)
+
+    def handle_news_page(self, query):
+        """GET /news?limit=50&cursor=<id>：按入库顺序倒序分页读取"""
+        if news_store is None:
+            self.send_error_response(503, {"error": "新闻存储未启用"})
+            return
+        try:
+            limit = int(query.get('limit', ['50'])[0])
+            cursor = query.get('cursor', [None])[0]
+            if cursor is not None:
+                int(cursor)
+        except ValueError:
+            self.send_error_response(400, {"error": "limit / cursor 必须是整数"})
+            return
+        self.send_success_response(news_store.page(cursor, limit))
+
     def process_deepseek_data(self, deepseek_data):
-        """处理DeepSeek传输过来的数据"""
+        """处理DeepSeek传输过来的数据：解析每个数据项的 text 并按顺序合并
+
+        deepseek_data 可以是列表，也可以是逐项产出数据项的迭代器（流式请求体）。
+        """
+        self.item_errors = []
         try:
-            print("开始处理DeepSeek数据...", file=sys.stderr)
-            
             if isinstance(deepseek_data, list) and len(deepseek_data) > 0:
-                first_item = deepseek_data[0]
-                print(f"第一个数据项: {json.dumps(first_item, ensure_ascii=False)}", file=sys.stderr)
-                
-                text_content = first_item.get("text", "[]")
-                print(f"text字段内容: {text_content}", file=sys.stderr)
-                
-                # 解析JSON字符串
-                news_data = json.loads(text_content)
-                print(f"解析text后的数据: {json.dumps(news_data, ensure_ascii=False)}", file=sys.stderr)
-                
-                # 确保是列表格式
-                if isinstance(news_data, list):
-                    result = news_data
-                else:
-                    result = [news_data]
-                    
-                print(f"最终返回数据条数: {len(result)}", file=sys.stderr)
-                return result
+                result, errors = decode_batch(deepseek_data)
+                batch = len(deepseek_data)
+            elif isinstance(deepseek_data, Iterator):
+                result, errors, batch = decode_iter(deepseek_data)
             else:
-                print("数据格式不符合预期", file=sys.stderr)
+                log.warn("数据格式不符合预期", type=type(deepseek_data).__name__)
                 return []
-                
+
+            for err in errors:
+                log.warn("数据项解析失败，已跳过", **err)
+            self.item_errors = errors
+            log.info("处理完成", batch=batch, items=len(result), failed=len(errors))
+            return result
+
+        except (json.JSONDecodeError, BodyTooLarge, BadChunkedBody):
+            # 外层请求体本身的错误交给 handle_webhook 返回 4xx
+            raise
         except Exception as e:
-            print(f"处理数据时出错: {e}", file=sys.stderr)
+            log.error("处理数据时出错", error=str(e))
             return {"error": f"处理数据时出错: {e}"}
-    
-    def send_success_response(self, data):
+
+    def send_success_response(self, data, code=200):
         """发送成功响应"""
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if getattr(self, 'item_errors', None):
+            # 部分数据项解析失败：响应体仍为成功项列表，失败项索引放在响应头
+            self.send_header('X-Item-Errors', ','.join(str(e["index"]) for e in self.item_errors))
+        body = jsoncodec.dumps_bytes(data, pretty=PRETTY_JSON)
+        # Content-Length 是 HTTP/1.1 keep-alive 的前提（见 serve_webhook.py）
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        log.debug("发送响应", body=lambda: log.preview(body))
+        self.wfile.write(body)
+
+    def send_cached_response(self, entry, hit):
+        """发送（可能来自重放缓存的）已编码响应，带 ETag；If-None-Match 匹配时返回 304"""
+        if self.headers.get('If-None-Match') == entry.etag:
+            self.send_response(304)
+            self.send_header('ETag', entry.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
         self.send_response(200)
         self.send_header('Content-type', 'application/json; charset=utf-8')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('ETag', entry.etag)
+        self.send_header('X-Cache', 'HIT' if hit else 'MISS')
+        if entry.item_errors:
+            self.send_header('X-Item-Errors', ','.join(str(e["index"]) for e in entry.item_errors))
+        self.send_header('Content-Length', str(len(entry.body)))
         self.end_headers()
-        response_json = json.dumps(data, ensure_ascii=False, indent=2)
-        print(f"发送响应: {response_json}", file=sys.stderr)
-        self.wfile.write(response_json.encode('utf-8'))
-    
-    def send_error_response(self, code, data):
+        self.wfile.write(entry.body)
+
+    def send_error_response(self, code, data, retry_after=None):
         """发送错误响应"""
         self.send_response(code)
         self.send_header('Content-type', 'application/json; charset=utf-8')
         self.send_header('Access-Control-Allow-Origin', '*')
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        body = jsoncodec.dumps_bytes(data, pretty=PRETTY_JSON)
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
         self.end_headers()
-        response_json = json.dumps(data, ensure_ascii=False, indent=2)
-        self.wfile.write(response_json.encode('utf-8'))
+        self.wfile.write(body)
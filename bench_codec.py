@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码微基准：标准库 json vs orjson（已安装时）
+负载:
+ - DeepSeek webhook：外层数组 + text 内嵌新闻列表（解码两层、紧凑/缩进编码响应）
+ - Notion 数据库查询响应：100 个任务页面（由 fake_notion 生成，结构与真实 API 一致）
+
+用法:
+  python bench_codec.py --news 200 --rounds 50
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from bench_webhook import make_payload
+from fake_notion import FakeNotion
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def notion_query_response(pages=100):
+    fake = FakeNotion(seed=1)
+    ids = fake.seed_dataset(tasks=pages, task_days=1, review_days=0)
+    status, body = fake._query(ids["task_db"], {"page_size": 100})
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+def timeit(fn, rounds):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - t0) / rounds
+
+
+def codecs():
+    out = {"json": (lambda b: json.loads(b if isinstance(b, str) else b.decode("utf-8")),
+                    lambda o: json.dumps(o, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                    lambda o: json.dumps(o, ensure_ascii=False, indent=2).encode("utf-8"))}
+    if orjson is not None:
+        out["orjson"] = (orjson.loads, orjson.dumps, lambda o: orjson.dumps(o, option=orjson.OPT_INDENT_2))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="JSON 编解码微基准")
+    ap.add_argument("--news", type=int, default=200, help="每个 text 中的新闻条数")
+    ap.add_argument("--items", type=int, default=4, help="webhook 批量数据项数")
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    webhook = make_payload(args.news, args.items)
+    news = [n for it in json.loads(webhook) for n in json.loads(it["text"])]
+    notion = notion_query_response()
+    if orjson is None:
+        print("⚠ 未安装 orjson，仅输出标准库结果")
+
+    cases = []
+    for name, (loads, dumps, dumps_pretty) in codecs().items():
+        cases.append((name, "webhook 解码（外层+text）", len(webhook),
+                      lambda loads=loads: [loads(it["text"]) for it in loads(webhook)]))
+        cases.append((name, "webhook 响应（紧凑）", len(webhook), lambda dumps=dumps: dumps(news)))
+        cases.append((name, "webhook 响应（indent=2）", len(webhook), lambda d=dumps_pretty: d(news)))
+        cases.append((name, "Notion 查询响应解码", len(notion), lambda loads=loads: loads(notion)))
+
+    base = {}
+    print(f"{'codec':<8} {'case':<24} {'ms':>9} {'MB/s':>9} {'vs json':>8}")
+    for name, case, size, fn in cases:
+        t = timeit(fn, args.rounds)
+        base.setdefault(case, t)
+        print(f"{name:<8} {case:<24} {t * 1000:9.3f} {size / t / 1e6:9.1f} {base[case] / t:7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+deepseek-processor webhook 压测（本地启动 serve_webhook.py，通过 HTTP 发送合成 DeepSeek 负载）
+覆盖模式: single（单线程 HTTP/1.0）/ thread（多线程 keep-alive）/ prefork（多进程 SO_REUSEPORT）
+输出: 吞吐（请求/秒）、延迟分位数、错误率、服务端 RSS（含 prefork 的所有 worker），JSON 格式便于跨版本对比
+
+服务端默认关闭重放缓存、新闻存储与 Notion 同步（DEEPSEEK_CACHE_SIZE=0、DEEPSEEK_NEWS_PATH=""），
+只测解析与响应路径；--with-cache / --with-store 可以打开。
+
+用法:
+  python bench_load.py                                        # 三种模式，默认负载
+  python bench_load.py --modes thread,prefork --news 200 --items 4 --clients 16 --duration 10
+  python bench_load.py --output load.json                     # 结果另存一份
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+import urllib.request
+
+from bench_webhook import make_news
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(BASE_DIR, "serve_webhook.py")
+
+
+def make_payloads(news, items, variants, seed=0):
+    """生成 variants 个不同的负载，避免同一请求体被服务端当作重放"""
+    rng = random.Random(seed)
+    return [json.dumps([{"text": json.dumps(make_news(news, rng), ensure_ascii=False)} for _ in range(items)],
+                       ensure_ascii=False).encode("utf-8") for _ in range(variants)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, workers, port, env_overrides):
+    env = dict(os.environ)
+    env.update(env_overrides)
+    cmd = [sys.executable, SERVER, "--host", "127.0.0.1", "--port", str(port), "--mode", mode,
+           "--workers", str(workers), "--grace", "5"]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"服务启动失败：{' '.join(cmd)}")
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("服务启动超时")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _proc_tree(pid):
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                stack.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def server_rss_kb(pid):
+    """服务进程树的 (当前 RSS, 峰值 RSS) 之和（KB）；非 Linux 返回 (None, None)"""
+    rss = hwm = 0
+    found = False
+    for p in _proc_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1])
+                        found = True
+                    elif line.startswith("VmHWM:"):
+                        hwm += int(line.split()[1])
+        except OSError:
+            pass
+    return (rss, hwm) if found else (None, None)
+
+
+def client_loop(port, payloads, stop_at, warmup_until, offset, out):
+    """一个客户端线程：一条 HTTP 连接（服务端关闭时 http.client 自动重连）"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors, sent, i = [], 0, 0, offset
+    headers = {"Content-Type": "application/json"}
+    while True:
+        start = time.perf_counter()
+        if start >= stop_at:
+            break
+        body = payloads[i % len(payloads)]
+        i += 1
+        try:
+            conn.request("POST", "/webhook", body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200 and not resp.getheader("X-Item-Errors")
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        end = time.perf_counter()
+        if start < warmup_until:
+            continue
+        sent += 1
+        if ok:
+            latencies.append(end - start)
+        else:
+            errors += 1
+    conn.close()
+    out.append((sent, errors, latencies))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def run_scenario(mode, args, payloads):
+    port = free_port()
+    env = {"DEEPSEEK_LOG_LEVEL": "WARN", "NOTION_TOKEN": ""}
+    if not args.with_cache:
+        env["DEEPSEEK_CACHE_SIZE"] = "0"
+    if not args.with_store:
+        env["DEEPSEEK_NEWS_PATH"] = ""
+    proc = start_server(mode, args.workers, port, env)
+    try:
+        now = time.perf_counter()
+        warmup_until = now + args.warmup
+        stop_at = warmup_until + args.duration
+        out, threads = [], []
+        for n in range(args.clients):
+            t = threading.Thread(target=client_loop,
+                                 args=(port, payloads, stop_at, warmup_until, n * 7, out), daemon=True)
+            t.start()
+            threads.append(t)
+        peak_rss = 0
+        while any(t.is_alive() for t in threads):
+            rss, _ = server_rss_kb(proc.pid)
+            peak_rss = max(peak_rss, rss or 0)
+            time.sleep(0.2)
+        rss, hwm = server_rss_kb(proc.pid)
+    finally:
+        stop_server(proc)
+
+    sent = sum(s for s, _, _ in out)
+    errors = sum(e for _, e, _ in out)
+    lat = sorted(x for _, _, ls in out for x in ls)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "mode": mode,
+        "workers": args.workers if mode == "prefork" else 1,
+        "clients": args.clients,
+        "news_per_item": args.news,
+        "items": args.items,
+        "payload_bytes": len(payloads[0]),
+        "duration_s": args.duration,
+        "requests": sent,
+        "errors": errors,
+        "error_rate": round(errors / sent, 4) if sent else None,
+        "throughput_rps": round((sent - errors) / args.duration, 2),
+        "latency_ms": {
+            "p50": ms(percentile(lat, 50)),
+            "p90": ms(percentile(lat, 90)),
+            "p99": ms(percentile(lat, 99)),
+            "max": ms(lat[-1] if lat else None),
+            "mean": ms(sum(lat) / len(lat) if lat else None),
+        },
+        "server_rss_mb": {
+            "sampled_peak": round(peak_rss / 1024, 1) if peak_rss else None,
+            "end": round(rss / 1024, 1) if rss else None,
+            "hwm_sum": round(hwm / 1024, 1) if hwm else None,
+        },
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="deepseek-processor webhook 压测")
+    ap.add_argument("--modes", default="single,thread,prefork")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="prefork worker 数")
+    ap.add_argument("--clients", type=int, default=8, help="并发客户端连接数")
+    ap.add_argument("--news", type=int, default=50, help="每个数据项 text 中的新闻条数")
+    ap.add_argument("--items", type=int, default=1, help="每个请求的数据项个数")
+    ap.add_argument("--variants", type=int, default=16, help="不同负载的个数")
+    ap.add_argument("--duration", type=float, default=5.0, help="每个模式的计时秒数")
+    ap.add_argument("--warmup", type=float, default=1.0, help="不计入结果的预热秒数")
+    ap.add_argument("--with-cache", action="store_true", help="保留服务端重放缓存")
+    ap.add_argument("--with-store", action="store_true", help="保留服务端新闻存储")
+    ap.add_argument("--output", help="结果 JSON 另存路径")
+    args = ap.parse_args(argv)
+
+    payloads = make_payloads(args.news, args.items, args.variants)
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        r = run_scenario(mode, args, payloads)
+        results.append(r)
+        lat = r["latency_ms"]
+        print(f"{mode:<8} {r['throughput_rps']:>9.1f} req/s  p50 {lat['p50']} ms  p99 {lat['p99']} ms  "
+              f"错误率 {r['error_rate']}  RSS {r['server_rss_mb']['sampled_peak']} MB", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if any(r["requests"] == 0 for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+夜间主流程性能基准（基于 fake_notion.py，本地运行，无需真实 token）
+覆盖阶段:
+ - run_now            完整流程（system_check + main_flow）
+ - rollover           rollover_unfinished_tasks
+ - periodic           collect_daily_reviews + create_periodic_review
+ - summarize          summarize_keywords（纯 CPU）
+数据规模: 任务 100 / 1k / 10k / 100k 条 × 复盘 1 / 365 天
+输出: 墙钟时间、请求数、峰值 RSS、请求/秒；与 bench_baseline.json 对比，回归时退出码为 1
+ - 每个阶段运行 --repeat 次，取最短墙钟时间与最小 RSS（噪声只会让单次变慢）；请求数取最大值且必须不多于基线
+ - 基线与本次都短于 --min-wall 秒的阶段不比较耗时（几十毫秒的阶段主要是调度噪声），只比较请求数与 RSS
+
+用法:
+  python bench_nightly.py                       # 全量跑并与基线对比
+  python bench_nightly.py --sizes 100,1000      # 只跑部分规模
+  python bench_nightly.py --update-baseline     # 重写基线
+每个阶段在独立子进程中运行 main.py，fake 服务在父进程中，RSS 只统计 main.py 一侧；
+每个阶段使用重新造数的 fake 与空状态文件，不受前一阶段写入（顺延、复盘页面）的影响。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+import urllib.request
+from datetime import datetime, timedelta
+
+from fake_notion import FakeNotion, start_server
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, "bench_baseline.json")
+RESULT_MARK = "BENCH_RESULT "
+STAGES = ("summarize", "periodic", "rollover", "run_now")
+# 固定在一个普通周三（非周日、非月末），保证每次运行的请求序列一致
+BENCH_TODAY = "2026-10-14"
+
+
+# ---------------- child: run one stage inside main.py ----------------
+def freeze_main_clock(main, today):
+    """把 main.py 的“今天”固定为 today（保留当前时刻的时分秒）"""
+    real = main.datetime
+    day = real.strptime(today, "%Y-%m-%d")
+
+    class FrozenDatetime(real):
+        @classmethod
+        def now(cls, tz=None):
+            t = real.now(tz)
+            return t.replace(year=day.year, month=day.month, day=day.day)
+
+    main.datetime = FrozenDatetime
+    main.now = FrozenDatetime.now(main.tz)
+    main.TODAY = today
+
+
+def run_child(stage, today, review_days):
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    real_stdout = sys.stdout
+    sys.stdout = devnull
+    try:
+        import main
+        freeze_main_clock(main, today)
+        end = today
+        start = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=review_days)).strftime("%Y-%m-%d")
+        items = None
+        if stage == "summarize":
+            items = main.collect_daily_reviews(main.CYCLE_REVIEW_DB_ID, start, end)
+            # 准备数据的查询不计入本阶段
+            _fetch_json(main.NOTION_API_BASE[:-len("/v1")] + "/__reset", "POST")
+        t0 = time.perf_counter()
+        if stage == "summarize":
+            for _ in range(20):
+                main.summarize_keywords(items)
+        elif stage == "periodic":
+            main.create_periodic_review(main.CYCLE_REVIEW_DB_ID, start, end, kind="每月")
+        elif stage == "rollover":
+            main.rollover_unfinished_tasks()
+        elif stage == "run_now":
+            main.run_now()
+        wall = time.perf_counter() - t0
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+    print(RESULT_MARK + json.dumps({"wall_s": wall, "peak_rss_kb": peak_rss_kb()}))
+
+
+def peak_rss_kb():
+    """本进程峰值 RSS（KB）；Linux 上 ru_maxrss 会继承 fork 前父进程的值，优先读 VmHWM"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ---------------- parent: seed fake server and drive children ----------------
+def _fetch_json(url, method="GET"):
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req) as r:
+        return json.loads(r.read())
+
+
+def run_stage(stage, tasks, review_days, latency_ms=0.0, rate_429=0.0):
+    """在新造数的 fake 上运行一个阶段，返回 (造数耗时, 结果)"""
+    fake = FakeNotion(latency_ms=latency_ms, rate_429=rate_429, seed=42)
+    t0 = time.perf_counter()
+    ids = fake.seed_dataset(tasks=tasks, task_days=30, review_days=review_days, today=BENCH_TODAY)
+    seed_s = time.perf_counter() - t0
+    server, base = start_server(fake)
+    root = base[:-len("/v1")]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = {
+                "NOTION_TOKEN": "fake-token",
+                "NOTION_API_BASE": base,
+                "TASK_DATABASE_ID": ids["task_db"],
+                "REVIEW_DAILY_DB_ID": ids["review_db"],
+                "REVIEW_CYCLE_DB_ID": ids["review_db"],
+                "STATE_PATH": os.path.join(tmp, "state.json"),
+                "STATS_EXPORT_DIR": os.path.join(tmp, "stats"),
+            }
+            cfg_path = os.path.join(tmp, "config.json")
+            with open(cfg_path, "w", encoding="utf-8") as f:
+                json.dump(cfg, f, ensure_ascii=False)
+            env = dict(os.environ, NOTION_REVIEW_CONFIG=cfg_path)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", stage,
+                 "--today", BENCH_TODAY, "--review-days", str(review_days)],
+                env=env, cwd=BASE_DIR, capture_output=True, text=True, encoding="utf-8")
+        line = next((l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARK)), None)
+        if proc.returncode != 0 or line is None:
+            raise RuntimeError(f"stage {stage} 失败:\n{proc.stdout}\n{proc.stderr}")
+        res = json.loads(line[len(RESULT_MARK):])
+        stats = _fetch_json(root + "/__stats")
+    finally:
+        server.shutdown()
+        server.server_close()
+    res["requests"] = stats.get("requests", 0)
+    res["throttled"] = stats.get("throttled", 0)
+    res["req_per_s"] = round(res["requests"] / res["wall_s"], 1) if res["wall_s"] > 0 else 0.0
+    res["wall_s"] = round(res["wall_s"], 4)
+    return seed_s, res
+
+
+def run_scenario(tasks, review_days, stages, latency_ms=0.0, rate_429=0.0, repeat=1):
+    """返回 (总造数耗时, {阶段: 结果})；每个阶段运行 repeat 次后合并"""
+    seed_s, results = 0.0, {}
+    for stage in stages:
+        runs = []
+        for _ in range(max(1, repeat)):
+            s, res = run_stage(stage, tasks, review_days, latency_ms, rate_429)
+            seed_s += s
+            runs.append(res)
+        best = min(runs, key=lambda r: r["wall_s"])
+        results[stage] = dict(best, requests=max(r["requests"] for r in runs),
+                              throttled=max(r["throttled"] for r in runs),
+                              peak_rss_kb=min(r["peak_rss_kb"] for r in runs), repeat=len(runs))
+    return seed_s, results
+
+
+def compare(current, baseline, wall_tol, rss_tol, min_wall=0.0):
+    """返回回归描述列表；请求数必须不多于基线，时间/RSS 允许 tol 比例的噪声，短于 min_wall 秒的阶段不比较时间"""
+    problems = []
+    for key, stages in current.items():
+        base_stages = baseline.get(key)
+        if not base_stages:
+            continue
+        for stage, cur in stages.items():
+            base = base_stages.get(stage)
+            if not base:
+                continue
+            if cur["requests"] > base["requests"]:
+                problems.append(f"{key}/{stage}: 请求数 {base['requests']} -> {cur['requests']}")
+            if max(cur["wall_s"], base["wall_s"]) < min_wall:
+                pass
+            elif cur["wall_s"] > base["wall_s"] * (1 + wall_tol) and cur["wall_s"] - base["wall_s"] > 0.05:
+                problems.append(f"{key}/{stage}: 耗时 {base['wall_s']}s -> {cur['wall_s']}s")
+            if cur["peak_rss_kb"] > base["peak_rss_kb"] * (1 + rss_tol):
+                problems.append(f"{key}/{stage}: 峰值 RSS {base['peak_rss_kb']}KB -> {cur['peak_rss_kb']}KB")
+    return problems
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="夜间主流程性能基准")
+    ap.add_argument("--sizes", default="100,1000,10000,100000", help="任务条数列表")
+    ap.add_argument("--review-days-list", default="1,365", help="每日复盘天数列表")
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="fake 服务单请求延迟")
+    ap.add_argument("--repeat", type=int, default=3, help="每个阶段的运行次数（取最短耗时）")
+    ap.add_argument("--wall-tol", type=float, default=0.5, help="耗时允许的相对回归")
+    ap.add_argument("--min-wall", type=float, default=0.2, help="基线与本次都短于此秒数时不比较耗时")
+    ap.add_argument("--rss-tol", type=float, default=0.25, help="峰值 RSS 允许的相对回归")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", action="store_true", help="只输出 JSON 结果")
+    # 子进程内部参数
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--today", default=BENCH_TODAY, help=argparse.SUPPRESS)
+    ap.add_argument("--review-days", type=int, default=1, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.today, args.review_days)
+        return 0
+
+    stages = [s for s in args.stages.split(",") if s]
+    current = {}
+    for tasks in [int(x) for x in args.sizes.split(",") if x]:
+        for review_days in [int(x) for x in args.review_days_list.split(",") if x]:
+            key = f"tasks={tasks},reviews={review_days}"
+            seed_s, results = run_scenario(tasks, review_days, stages, latency_ms=args.latency_ms, repeat=args.repeat)
+            current[key] = results
+            if not args.json:
+                print(f"== {key}（造数 {seed_s:.1f}s）")
+                for stage, r in results.items():
+                    print(f"   {stage:<10} {r['wall_s']:>9.4f}s  req={r['requests']:<5} "
+                          f"{r['req_per_s']:>8.1f} req/s  rss={r['peak_rss_kb'] / 1024:.1f}MB")
+
+    if args.json:
+        print(json.dumps(current, ensure_ascii=False, indent=2))
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(current)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"基线已写入 {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠ 未找到基线文件，使用 --update-baseline 生成", file=sys.stderr)
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    problems = compare(current, baseline, args.wall_tol, args.rss_tol, args.min_wall)
+    if problems:
+        print("❌ 性能回归:", file=sys.stderr)
+        for p in problems:
+            print("   " + p, file=sys.stderr)
+        return 1
+    print("✅ 未发现性能回归", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+宽任务库查询基准：对比 QUERY_PUSHDOWN 开 / 关时的传输字节数、请求数、响应解析耗时与墙钟时间
+ - 任务库带 --extra-columns 个有内容的 rich_text 列（默认 60），模拟真实使用中越加越宽的数据库
+ - 场景: rollover（只顺延昨天）、rollover_catchup（补跑 7 天）、system_check、daily_review
+ - 每个场景在新的 fake_notion 上运行，并检查两种模式创建的顺延任务数一致
+
+用法:
+  python bench_query.py --tasks 3000 --extra-columns 60
+  python bench_query.py --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from fake_notion import FakeNotion, start_server
+from bench_nightly import BENCH_TODAY, freeze_main_clock
+
+SCENARIOS = ("rollover", "rollover_catchup", "system_check", "daily_review")
+
+
+def load_main(tmp):
+    cfg_path = os.path.join(tmp, "config.json")
+    with open(cfg_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "NOTION_TOKEN": "fake-token",
+            "TASK_DATABASE_ID": "placeholder",
+            "STATE_PATH": os.path.join(tmp, "state.json"),
+            "STATS_EXPORT_DIR": "",
+            "NOTION_QUOTA_RATE": 0,  # 每个场景会把 NOTION_API_BASE 换成本地 fake，不需要共享配额
+        }, f)
+    os.environ["NOTION_REVIEW_CONFIG"] = cfg_path
+    import main
+    freeze_main_clock(main, BENCH_TODAY)
+    return main
+
+
+def run_one(main, scenario, pushdown, args):
+    fake = FakeNotion(seed=7)
+    ids = fake.seed_dataset(tasks=args.tasks, task_days=30, review_days=30, today=BENCH_TODAY,
+                            extra_columns=args.extra_columns)
+    server, base = start_server(fake)
+    main.NOTION_API_BASE = base
+    main.TASK_DB_ID = ids["task_db"]
+    main.DAILY_REVIEW_DB_ID = main.CYCLE_REVIEW_DB_ID = ids["review_db"]
+    main.QUERY_PUSHDOWN = pushdown
+    main.schema_cache.clear()  # 每个场景都从冷启动开始
+    if os.path.exists(main.STATE_PATH):
+        os.remove(main.STATE_PATH)
+    if scenario == "rollover":
+        yesterday = (datetime.strptime(BENCH_TODAY, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        main.save_state({"last_rollover_date": yesterday})
+    elif scenario == "rollover_catchup":
+        week_ago = (datetime.strptime(BENCH_TODAY, "%Y-%m-%d") - timedelta(days=7)).strftime("%Y-%m-%d")
+        main.save_state({"last_rollover_date": week_ago})
+
+    # 统计客户端花在响应 JSON 解析上的时间
+    decode = [0.0]
+    real_resp_json = main.resp_json
+
+    def timed_resp_json(r):
+        t = time.perf_counter()
+        try:
+            return real_resp_json(r)
+        finally:
+            decode[0] += time.perf_counter() - t
+
+    main.resp_json = timed_resp_json
+    pages_before = len(fake.db_pages[ids["task_db"]])
+    fake.stats.clear()
+    t0 = time.perf_counter()
+    try:
+        if scenario.startswith("rollover"):
+            main.rollover_unfinished_tasks()
+        elif scenario == "system_check":
+            main.system_check()
+        else:
+            main.create_daily_review_if_missing(main.DAILY_REVIEW_DB_ID)
+        wall = time.perf_counter() - t0
+    finally:
+        main.resp_json = real_resp_json
+        server.shutdown()
+        server.server_close()
+    return {
+        "requests": fake.stats["requests"],
+        "bytes": fake.stats["bytes_out"],
+        "decode_ms": round(decode[0] * 1000, 2),
+        "wall_ms": round(wall * 1000, 2),
+        "created": len(fake.db_pages[ids["task_db"]]) - pages_before,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="宽任务库查询下推基准")
+    ap.add_argument("--tasks", type=int, default=3000)
+    ap.add_argument("--extra-columns", type=int, default=60)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--json", action="store_true", help="只输出 JSON 结果")
+    args = ap.parse_args(argv)
+
+    results, mismatched = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        real_stdout, sys.stdout = sys.stdout, open(os.devnull, "w", encoding="utf-8")
+        try:
+            main = load_main(tmp)
+            for scenario in [s for s in args.scenarios.split(",") if s]:
+                off = run_one(main, scenario, False, args)
+                on = run_one(main, scenario, True, args)
+                results[scenario] = {"pushdown_off": off, "pushdown_on": on}
+                if off["created"] != on["created"]:
+                    mismatched.append(scenario)
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"任务 {args.tasks} 条 × {6 + args.extra_columns} 列")
+        print(f"{'场景':<18}{'请求':>10}{'传输 KB':>18}{'解析 ms':>18}{'耗时 ms':>18}")
+        for scenario, r in results.items():
+            off, on = r["pushdown_off"], r["pushdown_on"]
+            print(f"{scenario:<18}{off['requests']:>5} -> {on['requests']:<4}"
+                  f"{off['bytes'] / 1024:>8.1f} -> {on['bytes'] / 1024:<8.1f}"
+                  f"{off['decode_ms']:>8.1f} -> {on['decode_ms']:<8.1f}"
+                  f"{off['wall_ms']:>8.1f} -> {on['wall_ms']:<8.1f}")
+    if mismatched:
+        print(f"下推前后顺延结果不一致：{mismatched}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
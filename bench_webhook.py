@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+deepseek-processor 单请求 CPU 基准（进程内直接驱动 handler，不经过网络）
+对比不同日志级别下每个请求的 CPU 时间：
+ - DEBUG：与旧版相同，逐步 pretty-print 原始/解析后/处理后/响应数据
+ - INFO ：只记录请求元信息与截断预览（默认）
+ - INFO + 抽样 10%
+
+用法:
+  python bench_webhook.py --news 200 --requests 200
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from serve_webhook import load_processor
+
+
+def make_news(n, rng):
+    return [{
+        "title": f"AI 新闻 {i}：模型发布与评测 {rng.randint(0, 10 ** 6)}",
+        "url": f"https://news.example.com/{i}/{rng.randint(0, 10 ** 9)}",
+        "summary": "这是一段新闻摘要，" * rng.randint(3, 12),
+        "source": rng.choice(["DeepSeek", "OpenAI", "Anthropic", "Google", "Meta"]),
+        "published_at": f"2026-10-{rng.randint(1, 28):02d}T08:00:00Z",
+        "tags": rng.sample(["LLM", "开源", "芯片", "融资", "多模态", "Agent"], 3),
+    } for i in range(n)]
+
+
+def make_payload(news_per_item=50, items=1, seed=0):
+    """DeepSeek webhook 负载：[{"text": "<JSON 字符串形式的新闻列表>"}, ...]"""
+    rng = random.Random(seed)
+    return json.dumps([{"text": json.dumps(make_news(news_per_item, rng), ensure_ascii=False)}
+                       for _ in range(items)], ensure_ascii=False).encode("utf-8")
+
+
+def call_handler(mod, body, path="/webhook", method="POST", headers=None):
+    """不经过 socket 调用 handler，返回 (status_line, response_bytes)"""
+    h = mod.handler.__new__(mod.handler)
+    h.rfile = io.BytesIO(body)
+    h.wfile = io.BytesIO()
+    hdrs = {"Content-Length": str(len(body))}
+    hdrs.update(headers or {})
+    h.headers = hdrs
+    h.path = path
+    h.command = method
+    h.request_version = "HTTP/1.1"
+    h.requestline = f"{method} {path} HTTP/1.1"
+    h.client_address = ("127.0.0.1", 0)
+    h.close_connection = True
+    getattr(h, "do_" + method)()
+    out = h.wfile.getvalue()
+    return out.split(b"\r\n", 1)[0].decode(), out
+
+
+def bench(mod, body, requests, level, sample):
+    mod.log.level = {"DEBUG": 10, "INFO": 20}[level]
+    mod.log.sample = sample
+    t0 = time.process_time()
+    for _ in range(requests):
+        call_handler(mod, body)
+    return (time.process_time() - t0) / requests
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="deepseek-processor 日志开销基准")
+    ap.add_argument("--news", type=int, default=200, help="每个 text 中的新闻条数")
+    ap.add_argument("--requests", type=int, default=200)
+    args = ap.parse_args(argv)
+
+    os.environ["DEEPSEEK_NEWS_PATH"] = ""  # 不写新闻存储（重复负载全部是重复项，也会污染 data/）
+    mod = load_processor()
+    mod.replay_cache.size = 0  # 同一负载重复发送，关闭重放缓存才能测到完整处理路径
+    body = make_payload(args.news)
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    mod.log.stream = devnull
+    real_stderr, sys.stderr = sys.stderr, devnull  # 屏蔽 BaseHTTPRequestHandler 的访问日志
+    try:
+        results = {
+            "DEBUG": bench(mod, body, args.requests, "DEBUG", 1.0),
+            "INFO": bench(mod, body, args.requests, "INFO", 1.0),
+            "INFO sample=0.1": bench(mod, body, args.requests, "INFO", 0.1),
+        }
+    finally:
+        sys.stderr = real_stderr
+        devnull.close()
+    base = results["DEBUG"]
+    print(f"负载 {len(body) / 1024:.1f} KB，{args.requests} 次请求")
+    for name, cpu in results.items():
+        print(f"  {name:<16} {cpu * 1000:8.3f} ms CPU/请求  节省 {(1 - cpu / base) * 100:5.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+按上游服务划分的熔断器（Notion API、AI 总结接口各一个）
+ - closed：正常放行；连续失败 failure_threshold 次（5xx、重试后仍 429、超时 / 连接错误）后进入 open
+ - open：直接拒绝，不发请求；cooldown 秒后进入 half_open
+ - half_open：只放行一个探测请求，成功则恢复 closed，失败则重新 open 并再等 cooldown
+ - 4xx 等“服务可用但请求有误”的响应算成功，不会触发熔断
+
+调用方式:
+  if not br.allow():
+      ...  # 快速失败 / 降级
+  else:
+      ok = do_request()
+      br.success() if ok else br.failure()
+"""
+
+import time
+import threading
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, cooldown=30.0, log=None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.log = log
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != "closed":
+                self.state = "closed"
+                self.probing = False
+                if self.log:
+                    self.log(f"✅ {self.name} 探测成功，熔断恢复")
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                reason = "探测失败" if self.state == "half_open" else f"连续失败 {self.failures} 次"
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+                self.trips += 1
+                if self.log:
+                    self.log(f"⛔ {self.name} 熔断（{reason}），{self.cooldown:g} 秒内直接降级")
+
+    def reset_counts(self):
+        """清零 trips / rejected（每次主流程开始时调用），不改变当前状态"""
+        with self.lock:
+            self.trips = self.rejected = 0
+
+    @property
+    def is_open(self):
+        return self.state != "closed"
+
+    def stats(self):
+        with self.lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
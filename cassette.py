@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 录制 / 回放（cassette），用于可复现的性能回归对比
+ - record: 真实运行一次夜间流程，把每个 Notion / AI 请求与响应（含耗时）写入 gzip 压缩的 JSONL
+ - replay: 离线回放到 main.py，可按录制耗时 × 倍率 sleep（0 表示不等待）
+ - diff:   对比两次运行的请求数与顺序（例如证明某次修改去掉了重复的 get_database_info）
+          并发阶段（main.py 用 concurrent() 标记的 run_writes、周/月复盘）内的请求顺序不确定，按多重集合比较
+录制内容不包含任何请求头，因此 token / API key 不会落盘。
+record / replay 都在临时目录中运行（状态文件、延后队列、统计导出），不改动正式的 state.json 与 stats/；
+录制开始时的状态文件保存在 cassette 的 meta 中，回放时以它为初始状态，两次运行的起点一致。
+
+用法:
+  python cassette.py record nightly.cassette.gz            # 真实运行 run_now() 并录制
+  python cassette.py replay nightly.cassette.gz --timing 0 --trace new.trace.gz
+  python cassette.py diff nightly.cassette.gz new.trace.gz
+  python cassette.py stats nightly.cassette.gz
+也可在 config.json 中设置 "CASSETTE_MODE": "record" | "replay" 与 "CASSETTE_PATH"。
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import atexit
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from datetime import timedelta
+from collections import Counter, defaultdict, deque
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+FORMAT_VERSION = 1
+KEEP_RESPONSE_HEADERS = ("Content-Type", "Retry-After")
+
+_original_send = requests.Session.send
+_active = None
+_local = threading.local()
+
+
+class CassetteMiss(RuntimeError):
+    """回放时遇到录制中不存在的请求"""
+
+
+@contextlib.contextmanager
+def concurrent(stage):
+    """范围内（当前线程）的请求标记为并发阶段 stage，diff 时不比较阶段内的顺序"""
+    prev = getattr(_local, "stage", None)
+    _local.stage = stage
+    try:
+        yield
+    finally:
+        _local.stage = prev
+
+
+def canonical_body(body):
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(json.loads(body), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return body
+
+
+def route_of(method, url):
+    path = re.sub(r"^https?://[^/]+", "", url.split("?", 1)[0])
+    path = re.sub(r"/[0-9a-fA-F-]{32,36}", "/{id}", path)
+    return f"{method} {path}"
+
+
+def read_cassette(path):
+    """返回 (meta, interactions)"""
+    meta, items = {}, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                break  # 录制进程被中断时最后一行可能不完整
+            if obj.get("type") == "meta":
+                meta.update(obj)  # 录制开始后可能追加 meta 行（初始状态）
+            else:
+                items.append(obj)
+    return meta, items
+
+
+class _Writer:
+    def __init__(self, path, meta):
+        self.f = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.seq = 0
+        self._write(dict(meta, type="meta", version=FORMAT_VERSION))
+
+    def _write(self, obj):
+        self.f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def add(self, method, url, body, started, elapsed, status=None, headers=None, text=None, error=None):
+        stage = getattr(_local, "stage", None)
+        with self.lock:
+            self.seq += 1
+            self._write({
+                "seq": self.seq, "method": method, "url": url, "body": canonical_body(body),
+                "t": round(started - self.t0, 6), "elapsed": round(elapsed, 6),
+                "status": status, "headers": headers or {}, "response": text, "error": error, "stage": stage,
+            })
+
+    def note(self, meta):
+        """追加一行 meta（read_cassette 合并所有 meta 行）"""
+        with self.lock:
+            self._write(dict(meta, type="meta"))
+
+    def close(self):
+        with self.lock:
+            if not self.f.closed:
+                self.f.close()
+
+
+class Recorder:
+    def __init__(self, path, meta=None):
+        self.writer = _Writer(path, meta or {})
+
+    def send(self, session, request, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = _original_send(session, request, **kwargs)
+        except requests.RequestException as e:
+            self.writer.add(request.method, request.url, request.body, started,
+                            time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+            raise
+        headers = {k: resp.headers[k] for k in KEEP_RESPONSE_HEADERS if k in resp.headers}
+        self.writer.add(request.method, request.url, request.body, started,
+                        resp.elapsed.total_seconds(), resp.status_code, headers, resp.text)
+        return resp
+
+    def close(self):
+        self.writer.close()
+
+
+class Player:
+    """按 (method, url, body) 匹配录制的响应；相同请求按录制顺序依次消费"""
+
+    def __init__(self, path, timing=0.0, trace_path=None):
+        self.meta, items = read_cassette(path)
+        self.timing = float(timing or 0.0)
+        self.queues = defaultdict(deque)
+        for it in items:
+            self.queues[(it["method"], it["url"], it["body"])].append(it)
+        self.lock = threading.Lock()
+        self.trace = _Writer(trace_path, dict(self.meta, replay_of=os.path.basename(path))) if trace_path else None
+
+    def send(self, session, request, **kwargs):
+        key = (request.method, request.url, canonical_body(request.body))
+        with self.lock:
+            q = self.queues.get(key)
+            it = q.popleft() if q else None
+        if it is None:
+            raise CassetteMiss(f"cassette 中没有匹配的请求：{request.method} {request.url}")
+        started = time.perf_counter()
+        if self.timing > 0:
+            time.sleep(it["elapsed"] * self.timing)
+        if self.trace:
+            self.trace.add(request.method, request.url, request.body, started, it["elapsed"],
+                           it["status"], it["headers"], None, it["error"])
+        if it["error"]:
+            raise requests.ConnectionError(it["error"], request=request)
+        resp = requests.Response()
+        resp.status_code = it["status"]
+        resp._content = (it["response"] or "").encode("utf-8")
+        resp.headers = CaseInsensitiveDict(it["headers"])
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        resp.elapsed = timedelta(seconds=it["elapsed"])
+        return resp
+
+    def remaining(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def close(self):
+        if self.trace:
+            self.trace.close()
+
+
+def install(mode, path, timing=0.0, trace_path=None, meta=None):
+    """给 requests.Session.send 打补丁；main.py 在读取配置后调用"""
+    global _active
+    uninstall()
+    if mode == "record":
+        _active = Recorder(path, meta)
+    elif mode == "replay":
+        _active = Player(path, timing, trace_path)
+    else:
+        raise ValueError(f"未知的 CASSETTE_MODE：{mode}")
+
+    def send(session, request, **kwargs):
+        return _active.send(session, request, **kwargs)
+
+    requests.Session.send = send
+    atexit.register(uninstall)
+    return _active
+
+
+def uninstall():
+    global _active
+    requests.Session.send = _original_send
+    if _active is not None:
+        _active.close()
+        _active = None
+
+
+# ---------------- analysis ----------------
+def summarize(items):
+    routes = Counter(route_of(it["method"], it["url"]) for it in items)
+    return {
+        "requests": len(items),
+        "recorded_time_s": round(sum(it["elapsed"] for it in items), 3),
+        "by_route": dict(routes.most_common()),
+    }
+
+
+def _ordered(items):
+    """请求序列；同一并发阶段的连续请求排序后比较（多重集合），阶段之间的顺序保留"""
+    seq, run, stage = [], [], None
+    for it in items:
+        key = (it["method"], it["url"], it["body"])
+        if it.get("stage") and it["stage"] == stage:
+            run.append(key)
+            continue
+        seq.extend(sorted(run))
+        run, stage = [key], it.get("stage")
+    return seq + sorted(run)
+
+
+def diff(items_a, items_b):
+    """返回 (有差异, 文本报告)"""
+    ra = Counter(route_of(i["method"], i["url"]) for i in items_a)
+    rb = Counter(route_of(i["method"], i["url"]) for i in items_b)
+    lines = [f"请求总数：{len(items_a)} -> {len(items_b)}"]
+    for route in sorted(set(ra) | set(rb)):
+        if ra[route] != rb[route]:
+            lines.append(f"  {route}: {ra[route]} -> {rb[route]} ({rb[route] - ra[route]:+d})")
+    seq_a, seq_b = _ordered(items_a), _ordered(items_b)
+    first = next((n for n, (x, y) in enumerate(zip(seq_a, seq_b)) if x != y), None)
+    if first is None and len(seq_a) != len(seq_b):
+        first = min(len(seq_a), len(seq_b))
+    if first is not None:
+        a = seq_a[first][:2] if first < len(seq_a) else "-"
+        b = seq_b[first][:2] if first < len(seq_b) else "-"
+        lines.append(f"顺序首次分歧于第 {first + 1} 个请求：{a} vs {b}")
+    return first is not None, "\n".join(lines)
+
+
+# ---------------- CLI ----------------
+def _run_main(args, mode):
+    os.environ["NOTION_CASSETTE_MODE"] = mode
+    os.environ["NOTION_CASSETTE_PATH"] = os.path.abspath(args.cassette)
+    if mode == "replay":
+        os.environ["NOTION_CASSETTE_TIMING"] = str(args.timing)
+        if args.trace:
+            os.environ["NOTION_CASSETTE_TRACE"] = os.path.abspath(args.trace)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    import cassette  # 以脚本运行时 __main__ 与 main.py 导入的 cassette 不是同一个模块对象
+    active = cassette._active
+    if mode == "record":
+        initial = main.load_state()
+        active.writer.note({"initial_state": initial})
+    else:
+        initial = active.meta.get("initial_state") or {}
+        today = active.meta.get("today")
+        if today and today != main.TODAY:
+            from bench_nightly import freeze_main_clock
+            freeze_main_clock(main, today)
+    # 正式的延后队列留给正式运行重放，这里从空队列开始（录制时重放会把同一批写入发两次）
+    tmp = tempfile.mkdtemp(prefix="cassette-")
+    main.STATE_PATH = os.path.join(tmp, "state.json")
+    main.DEFERRED_PATH = os.path.join(tmp, "deferred_writes.jsonl")
+    main.STATS_EXPORT_DIR = os.path.join(tmp, "stats")
+    main.save_state(initial)
+    t0 = time.perf_counter()
+    try:
+        main.run_now()
+    finally:
+        wall = time.perf_counter() - t0
+        left = active.remaining() if mode == "replay" else 0
+        cassette.uninstall()
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"{mode} 完成：{wall:.3f}s" + (f"，未消费的录制请求 {left} 个" if left else ""), file=sys.stderr)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Notion / AI 请求录制与回放")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("record", help="真实运行 run_now() 并录制")
+    p.add_argument("cassette")
+    p = sub.add_parser("replay", help="离线回放 run_now()")
+    p.add_argument("cassette")
+    p.add_argument("--timing", type=float, default=0.0, help="按录制耗时的倍率等待，0 为不等待")
+    p.add_argument("--trace", default=None, help="把回放时实际发出的请求序列写入此文件")
+    p = sub.add_parser("diff", help="对比两个 cassette / trace 的请求数与顺序")
+    p.add_argument("a")
+    p.add_argument("b")
+    p = sub.add_parser("stats", help="输出请求统计")
+    p.add_argument("cassette")
+    args = ap.parse_args(argv)
+
+    if args.cmd in ("record", "replay"):
+        _run_main(args, args.cmd)
+        return 0
+    if args.cmd == "stats":
+        meta, items = read_cassette(args.cassette)
+        print(json.dumps(dict(summarize(items), meta=meta), ensure_ascii=False, indent=2))
+        return 0
+    changed, report = diff(read_cassette(args.a)[1], read_cassette(args.b)[1])
+    print(report)
+    return 1 if changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,756 @@
+# -*- coding: utf-8 -*-
+"""
+本地 Notion API 替身服务（用于测试与性能基准，无需真实 token）
+实现 main.py 用到的端点:
+ - GET   /v1/databases/{id}          读取数据库 schema
+ - PATCH /v1/databases/{id}          补齐字段
+ - POST  /v1/databases/{id}/query    查询（filter / sorts / start_cursor 分页 / ?filter_properties= 列投影）
+ - POST  /v1/pages                   创建页面
+ - GET   /v1/pages/{id}              读取页面（实时计数按事件读取变更的页面）
+ - PATCH /v1/pages/{id}              更新页面属性（含 archived）
+ - GET   /v1/blocks/{id}/children    读取子块（分页）
+ - PATCH /v1/blocks/{id}/children    追加子块（每次最多 100 个，支持 after）
+ - PATCH /v1/blocks/{id}             更新块内容；DELETE /v1/blocks/{id} 删除（归档）
+另外提供:
+ - 可配置延迟（--latency-ms / --jitter-ms）与 429 注入（--rate-429；--max-inflight 模拟服务端容量，
+   同时处理的请求超过该数时返回 429）
+ - 种子化合成数据集（--tasks / --task-days / --review-days / --seed）
+ - GET /__stats 查看请求计数与响应字节数（bytes_out），POST /__reset 清零计数
+ - --webhook-url：页面创建 / 更新 / 归档后向该地址发送 Notion 格式的 webhook 事件（后台线程，
+   --webhook-secret 时带 X-Notion-Signature），作为 main.py LIVE_MODE=webhook 的测试替身
+
+用法:
+  python fake_notion.py --port 8765 --tasks 1000 --review-days 365
+  然后在 config.json 中设置 "NOTION_API_BASE": "http://127.0.0.1:8765/v1"
+"""
+
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import hmac
+import queue
+import hashlib
+import argparse
+import threading
+import urllib.request
+from datetime import datetime, timedelta, date, timezone
+from urllib.parse import urlsplit, parse_qs
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DONE_NAMES = ("已完成", "完成", "Done", "done")
+STATUS_NAMES = ("未开始", "进行中", "已完成")
+KEYWORDS = ["拖延", "会议过多", "需求变更", "精力不足", "沟通", "环境问题", "依赖阻塞", "估时不准", "打断", "学习成本"]
+
+TASK_SCHEMA = {
+    "任务名称": {"title": {}},
+    "日期": {"date": {}},
+    "状态": {"select": {"options": [{"name": n} for n in STATUS_NAMES]}},
+    "资源": {"url": {}},
+    "时长": {"number": {}},
+    "提示": {"rich_text": {}},
+}
+
+REVIEW_SCHEMA = {
+    "📝 标题": {"title": {}},
+    "📅 日期": {"date": {}},
+    "✅ 完成任务数": {"number": {}},
+    "❌ 未完成任务数": {"number": {}},
+    "⚠ 难点": {"rich_text": {}},
+    "💡 解决方案": {"rich_text": {}},
+    "总结": {"rich_text": {}},
+    "类型": {"select": {"options": [{"name": "每日"}, {"name": "每周"}, {"name": "每月"}]}},
+}
+
+# webhook 新闻同步（api/_notion.py）使用的新闻库
+NEWS_SCHEMA = {
+    "标题": {"title": {}},
+    "链接": {"url": {}},
+    "来源": {"select": {"options": []}},
+    "标签": {"multi_select": {"options": []}},
+    "发布时间": {"date": {}},
+    "摘要": {"rich_text": {}},
+}
+
+READ_ONLY_TYPES = ("formula", "rollup", "created_time", "created_by", "last_edited_time",
+                   "last_edited_by", "unique_id")
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _error(status, code, message):
+    return status, {"object": "error", "status": status, "code": code, "message": message}
+
+
+# ---------------- property value normalization ----------------
+def _rich_text_out(items):
+    out = []
+    for it in items or []:
+        content = it.get("plain_text")
+        if content is None:
+            content = (it.get("text") or {}).get("content", "")
+        out.append({
+            "type": "text",
+            "text": {"content": content, "link": (it.get("text") or {}).get("link")},
+            "annotations": it.get("annotations") or {},
+            "plain_text": content,
+            "href": it.get("href"),
+        })
+    return out
+
+
+def normalize_value(ptype, value):
+    """把写入请求中的属性值转换成 Notion 返回格式"""
+    if ptype in ("title", "rich_text"):
+        return _rich_text_out(value)
+    if ptype == "date":
+        if not value:
+            return None
+        return {"start": value.get("start"), "end": value.get("end"), "time_zone": value.get("time_zone")}
+    if ptype in ("select", "status"):
+        return {"name": value["name"]} if value else None
+    if ptype == "multi_select":
+        return [{"name": v["name"]} for v in value or []]
+    if ptype in ("relation",):
+        return [{"id": v["id"]} for v in value or []]
+    if ptype == "people":
+        return [{"object": "user", "id": v["id"]} for v in value or []]
+    return value
+
+
+def _plain(items):
+    return "".join(x.get("plain_text", "") for x in items or [])
+
+
+# ---------------- filter / sort evaluation ----------------
+def _cmp_date(val, cond):
+    start = (val or {}).get("start") if isinstance(val, dict) else val
+    if "is_empty" in cond:
+        return not start
+    if "is_not_empty" in cond:
+        return bool(start)
+    if not start:
+        return False
+    s = start[:10]
+    for op, arg in cond.items():
+        a = str(arg)[:10]
+        if op == "equals" and s != a:
+            return False
+        if op == "before" and not s < a:
+            return False
+        if op == "after" and not s > a:
+            return False
+        if op == "on_or_before" and not s <= a:
+            return False
+        if op == "on_or_after" and not s >= a:
+            return False
+    return True
+
+
+def _cmp_select(val, cond):
+    name = (val or {}).get("name")
+    if "equals" in cond:
+        return name == cond["equals"]
+    if "does_not_equal" in cond:
+        return name != cond["does_not_equal"]
+    if "is_empty" in cond:
+        return name is None
+    if "is_not_empty" in cond:
+        return name is not None
+    return True
+
+
+def _cmp_number(val, cond):
+    if "is_empty" in cond:
+        return val is None
+    if "is_not_empty" in cond:
+        return val is not None
+    if val is None:
+        return False
+    ops = {"equals": lambda a: val == a, "does_not_equal": lambda a: val != a,
+           "greater_than": lambda a: val > a, "less_than": lambda a: val < a,
+           "greater_than_or_equal_to": lambda a: val >= a, "less_than_or_equal_to": lambda a: val <= a}
+    return all(ops[op](arg) for op, arg in cond.items() if op in ops)
+
+
+def _cmp_text(val, cond):
+    text = _plain(val) if isinstance(val, list) else (val or "")
+    if "equals" in cond:
+        return text == cond["equals"]
+    if "does_not_equal" in cond:
+        return text != cond["does_not_equal"]
+    if "contains" in cond:
+        return cond["contains"] in text
+    if "does_not_contain" in cond:
+        return cond["does_not_contain"] not in text
+    if "is_empty" in cond:
+        return not text
+    if "is_not_empty" in cond:
+        return bool(text)
+    return True
+
+
+def match_filter(page, flt):
+    if not flt:
+        return True
+    if "and" in flt:
+        return all(match_filter(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(match_filter(page, f) for f in flt["or"])
+    if "timestamp" in flt:
+        key = flt["timestamp"]
+        cond = flt.get(key, {})
+        ts = page.get(key, "")
+        for op, arg in cond.items():
+            if op == "after" and not ts > arg:
+                return False
+            if op == "on_or_after" and not ts >= arg:
+                return False
+            if op == "before" and not ts < arg:
+                return False
+            if op == "on_or_before" and not ts <= arg:
+                return False
+        return True
+    prop = page["properties"].get(flt.get("property"))
+    if prop is None:
+        return False
+    ptype = prop["type"]
+    val = prop.get(ptype)
+    for ftype, cond in flt.items():
+        if ftype == "property":
+            continue
+        if ftype == "date":
+            return _cmp_date(val, cond)
+        if ftype in ("select", "status"):
+            return _cmp_select(val, cond)
+        if ftype == "number":
+            return _cmp_number(val, cond)
+        if ftype in ("rich_text", "title", "url"):
+            return _cmp_text(val, cond)
+    return True
+
+
+def _sort_key(page, sort):
+    if "timestamp" in sort:
+        return page.get(sort["timestamp"], "")
+    prop = page["properties"].get(sort.get("property"), {})
+    val = prop.get(prop.get("type"))
+    if isinstance(val, dict):
+        val = val.get("start") or val.get("name") or ""
+    elif isinstance(val, list):
+        val = _plain(val)
+    return (val is None, val if val is not None else "")
+
+
+# ---------------- in-memory workspace ----------------
+class FakeNotion:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, rate_429=0.0, retry_after=1, seed=0, max_inflight=0):
+        self.latency_ms = latency_ms
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.databases = {}
+        self.pages = {}
+        self.blocks = {}
+        self.children = {}  # 父页面/块 id -> [子块 id, ...]
+        self.db_pages = {}  # dbid -> [page_id, ...]（按创建顺序）
+        self.db_version = Counter()  # dbid -> 写入次数，用于翻页时复用过滤结果
+        self._query_cache = {}
+        self.lock = threading.RLock()
+        self.stats = Counter()
+        self.webhooks = []  # [(url, secret)]
+        self._events = None
+
+    # ---- webhook 事件 ----
+    def subscribe(self, url, secret=None):
+        """之后每次页面变更都向 url 发送事件（按发生顺序，由一个后台线程逐个发送）"""
+        with self.lock:
+            self.webhooks.append((url, secret))
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._send_events, name="fake-webhook", daemon=True).start()
+
+    def _emit(self, kind, page):
+        if not self.webhooks:
+            return
+        dbid = page["parent"]["database_id"]
+        self._events.put({
+            "id": str(uuid.uuid4()), "timestamp": page["last_edited_time"], "type": kind,
+            "entity": {"id": page["id"], "type": "page"},
+            "data": {"parent": {"id": dbid, "type": "database"}},
+            "attempt_number": 1,
+        })
+
+    def _send_events(self):
+        while True:
+            event = self._events.get()
+            data = json.dumps(event, ensure_ascii=False).encode("utf-8")
+            for url, secret in list(self.webhooks):
+                headers = {"Content-Type": "application/json"}
+                if secret:
+                    headers["X-Notion-Signature"] = "sha256=" + hmac.new(secret.encode("utf-8"), data,
+                                                                         hashlib.sha256).hexdigest()
+                try:
+                    urllib.request.urlopen(urllib.request.Request(url, data, headers), timeout=5).read()
+                    sent = "webhooks_sent"
+                except OSError:
+                    sent = "webhook_errors"
+                with self.lock:
+                    self.stats[sent] += 1
+            self._events.task_done()
+
+    def drain_events(self):
+        """等待已产生的事件全部发出（测试用）"""
+        if self._events is not None:
+            self._events.join()
+
+    def new_id(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    # ---- seeding ----
+    def add_database(self, properties, title="", dbid=None):
+        dbid = dbid or self.new_id()
+        props = {}
+        for name, schema in properties.items():
+            ptype = next(iter(schema))
+            props[name] = {"id": self.new_id()[:4], "name": name, "type": ptype, ptype: schema[ptype]}
+        with self.lock:
+            self.databases[dbid] = {
+                "object": "database", "id": dbid,
+                "title": [{"type": "text", "text": {"content": title}, "plain_text": title}],
+                "properties": props,
+                "created_time": _now_iso(), "last_edited_time": _now_iso(),
+            }
+            self.db_pages.setdefault(dbid, [])
+        return dbid
+
+    def add_page(self, dbid, properties, created_time=None):
+        """properties 为写入格式（与 POST /v1/pages 相同），返回页面对象"""
+        status, body = self._create_page({"parent": {"database_id": dbid}, "properties": properties})
+        if status != 200:
+            raise ValueError(body["message"])
+        if created_time:
+            body["created_time"] = body["last_edited_time"] = created_time
+        return body
+
+    def seed_dataset(self, tasks=100, task_days=30, review_days=1, today=None, done_ratio=0.6, extra_columns=0):
+        """
+        生成任务库与复盘库合成数据，返回 {"task_db": id, "review_db": id}
+        extra_columns > 0 时任务库额外带这么多个有内容的 rich_text 列（模拟宽表）
+        """
+        today = today or date.today()
+        if isinstance(today, str):
+            today = datetime.strptime(today, "%Y-%m-%d").date()
+        extra = [f"备注 {n}" for n in range(extra_columns)]
+        task_db = self.add_database(dict(TASK_SCHEMA, **{name: {"rich_text": {}} for name in extra}), "任务")
+        review_db = self.add_database(REVIEW_SCHEMA, "复盘")
+        task_days = max(1, task_days)
+        for i in range(tasks):
+            d = (today - timedelta(days=i % task_days)).strftime("%Y-%m-%d")
+            status = "已完成" if self.rng.random() < done_ratio else self.rng.choice(STATUS_NAMES[:2])
+            props = {
+                "任务名称": {"title": [{"text": {"content": f"任务 {i}"}}]},
+                "日期": {"date": {"start": d}},
+                "状态": {"select": {"name": status}},
+                "资源": {"url": f"https://example.com/t/{i}"},
+                "时长": {"number": self.rng.randint(10, 180)},
+                "提示": {"rich_text": [{"text": {"content": f"提示 {i}"}}]},
+            }
+            for name in extra:
+                props[name] = {"rich_text": [{"text": {"content": f"{name}：任务 {i} 的补充说明与背景记录"}}]}
+            self.add_page(task_db, props, created_time=f"{d}T00:00:00.000Z")
+        for i in range(review_days):
+            d = (today - timedelta(days=i + 1)).strftime("%Y-%m-%d")
+            done = self.rng.randint(0, 10)
+            hard = "、".join(self.rng.sample(KEYWORDS, self.rng.randint(1, 3)))
+            self.add_page(review_db, {
+                "📝 标题": {"title": [{"text": {"content": f"每日复盘 {d}"}}]},
+                "📅 日期": {"date": {"start": d}},
+                "✅ 完成任务数": {"number": done},
+                "❌ 未完成任务数": {"number": self.rng.randint(0, 5)},
+                "⚠ 难点": {"rich_text": [{"text": {"content": hard}}]},
+                "类型": {"select": {"name": "每日"}},
+            }, created_time=f"{d}T23:55:00.000Z")
+        return {"task_db": task_db, "review_db": review_db}
+
+    # ---- request dispatch ----
+    def handle(self, method, path, body):
+        """返回 (status, body_dict, extra_headers)"""
+        route = self._route_name(method, path)
+        with self.lock:  # 线程化服务：计数也要在锁内，否则并发请求会丢失自增
+            self.stats["requests"] += 1
+            self.stats[route] += 1
+            self.inflight += 1
+            overloaded = self.max_inflight and self.inflight > self.max_inflight
+        try:
+            if self.latency_ms or self.jitter_ms:
+                time.sleep((self.latency_ms + self.rng.random() * self.jitter_ms) / 1000.0)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+        if overloaded or (self.rate_429 and self.rng.random() < self.rate_429):
+            with self.lock:
+                self.stats["throttled"] += 1
+            status, err = _error(429, "rate_limited", "You have been rate limited. Please try again in a few minutes.")
+            return status, err, {"Retry-After": str(self.retry_after)}
+        status, out = self._dispatch(method, path, body)
+        return status, out, {}
+
+    def _route_name(self, method, path):
+        path = path.split("?", 1)[0]
+        p = re.sub(r"/[0-9a-fA-F-]{32,36}", "/{id}", path)
+        return f"{method} {p}"
+
+    def _dispatch(self, method, path, body):
+        url = urlsplit(path)
+        path = url.path.rstrip("/")
+        m = re.fullmatch(r"/v1/databases/([^/]+)", path)
+        if m and method == "GET":
+            return self._get_database(m.group(1))
+        if m and method == "PATCH":
+            return self._patch_database(m.group(1), body)
+        m = re.fullmatch(r"/v1/databases/([^/]+)/query", path)
+        if m and method == "POST":
+            return self._query(m.group(1), body, parse_qs(url.query).get("filter_properties"))
+        if path == "/v1/pages" and method == "POST":
+            return self._create_page(body)
+        m = re.fullmatch(r"/v1/blocks/([^/]+)/children", path)
+        if m and method == "GET":
+            q = parse_qs(url.query)
+            return self._list_children(m.group(1), (q.get("start_cursor") or [None])[0],
+                                       int((q.get("page_size") or [100])[0]))
+        if m and method == "PATCH":
+            return self._append_children(m.group(1), body)
+        m = re.fullmatch(r"/v1/blocks/([^/]+)", path)
+        if m and method == "PATCH":
+            return self._update_block(m.group(1), body)
+        if m and method == "DELETE":
+            return self._update_block(m.group(1), {"archived": True})
+        m = re.fullmatch(r"/v1/pages/([^/]+)", path)
+        if m and method == "PATCH":
+            return self._patch_page(m.group(1), body)
+        if m and method == "GET":
+            page = self.pages.get(m.group(1))
+            return (200, page) if page else _error(404, "object_not_found", "Could not find page.")
+        return _error(404, "invalid_request_url", f"Invalid request URL: {method} {path}")
+
+    def _get_database(self, dbid):
+        db = self.databases.get(dbid)
+        if not db:
+            return _error(404, "object_not_found", f"Could not find database with ID: {dbid}.")
+        return 200, db
+
+    def _patch_database(self, dbid, body):
+        with self.lock:
+            db = self.databases.get(dbid)
+            if not db:
+                return _error(404, "object_not_found", f"Could not find database with ID: {dbid}.")
+            for name, schema in (body.get("properties") or {}).items():
+                if schema is None:
+                    db["properties"].pop(name, None)
+                    continue
+                ptype = next(iter(schema))
+                db["properties"][name] = {"id": self.new_id()[:4], "name": name, "type": ptype, ptype: schema[ptype]}
+            db["last_edited_time"] = _now_iso()
+            return 200, db
+
+    def _build_properties(self, schema, values, page_props=None):
+        props = page_props if page_props is not None else {}
+        for name, value in (values or {}).items():
+            meta = schema.get(name)
+            if meta is None:
+                return _error(400, "validation_error", f"{name} is not a property that exists.")
+            ptype = meta["type"]
+            if ptype in READ_ONLY_TYPES:
+                return _error(400, "validation_error", f"{name} is a read-only property.")
+            if ptype not in value:
+                return _error(400, "validation_error",
+                              f"{name} is expected to be {ptype}.")
+            props[name] = {"id": meta["id"], "type": ptype, ptype: normalize_value(ptype, value[ptype])}
+        return None, props
+
+    def _create_page(self, body):
+        dbid = (body.get("parent") or {}).get("database_id")
+        with self.lock:
+            db = self.databases.get(dbid)
+            if not db:
+                return _error(404, "object_not_found", f"Could not find database with ID: {dbid}.")
+            schema = db["properties"]
+            err, props = self._build_properties(schema, body.get("properties"))
+            if err:
+                return err, props
+            # 未写入的属性按 Notion 的行为返回空值
+            for name, meta in schema.items():
+                if name not in props:
+                    ptype = meta["type"]
+                    empty = [] if ptype in ("title", "rich_text", "multi_select", "relation", "people") else None
+                    props[name] = {"id": meta["id"], "type": ptype, ptype: empty}
+            ts = _now_iso()
+            page = {
+                "object": "page", "id": self.new_id(),
+                "created_time": ts, "last_edited_time": ts, "archived": False,
+                "parent": {"type": "database_id", "database_id": dbid},
+                "properties": props,
+            }
+            children = body.get("children") or []
+            if len(children) > 100:
+                return _error(400, "validation_error", "body.children.length should be ≤ 100.")
+            self.pages[page["id"]] = page
+            self.db_pages[dbid].append(page["id"])
+            self.db_version[dbid] += 1
+            self.children[page["id"]] = []
+            self._insert_blocks(page["id"], children, None)
+            self._emit("page.created", page)
+            return 200, page
+
+    def _patch_page(self, page_id, body):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if not page:
+                return _error(404, "object_not_found", f"Could not find page with ID: {page_id}.")
+            schema = self.databases[page["parent"]["database_id"]]["properties"]
+            props = dict(page["properties"])
+            err, props = self._build_properties(schema, body.get("properties"), props)
+            if err:
+                return err, props
+            page["properties"] = props
+            was_archived = page.get("archived")
+            if "archived" in body:
+                page["archived"] = bool(body["archived"])
+            page["last_edited_time"] = _now_iso()
+            self.db_version[page["parent"]["database_id"]] += 1
+            if page["archived"] != was_archived:
+                self._emit("page.deleted" if page["archived"] else "page.undeleted", page)
+            else:
+                self._emit("page.properties_updated", page)
+            return 200, page
+
+    # ---- blocks ----
+    def _make_block(self, parent_id, spec):
+        btype = spec.get("type") or next(k for k in spec if k not in ("object", "type"))
+        content = dict(spec.get(btype) or {})
+        if "rich_text" in content:
+            content["rich_text"] = _rich_text_out(content["rich_text"])
+        ts = _now_iso()
+        return {
+            "object": "block", "id": self.new_id(), "type": btype, btype: content,
+            "parent": {"type": "page_id", "page_id": parent_id},
+            "created_time": ts, "last_edited_time": ts, "has_children": False, "archived": False,
+        }
+
+    def _insert_blocks(self, parent_id, specs, after):
+        ids = self.children.setdefault(parent_id, [])
+        pos = ids.index(after) + 1 if after else len(ids)
+        created = [self._make_block(parent_id, spec) for spec in specs]
+        for b in created:
+            self.blocks[b["id"]] = b
+        ids[pos:pos] = [b["id"] for b in created]
+        return created
+
+    def _list_children(self, block_id, cursor, page_size):
+        with self.lock:
+            if block_id not in self.children and block_id not in self.blocks:
+                return _error(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+            rows = [self.blocks[i] for i in self.children.get(block_id, []) if not self.blocks[i]["archived"]]
+        page_size = min(page_size or 100, 100)
+        ids = [b["id"] for b in rows]
+        start = ids.index(cursor) if cursor in ids else 0
+        has_more = start + page_size < len(rows)
+        return 200, {"object": "list", "results": rows[start:start + page_size],
+                     "next_cursor": ids[start + page_size] if has_more else None,
+                     "has_more": has_more, "type": "block"}
+
+    def _append_children(self, block_id, body):
+        children = (body or {}).get("children") or []
+        if len(children) > 100:
+            return _error(400, "validation_error", "body.children.length should be ≤ 100.")
+        with self.lock:
+            if block_id not in self.children and block_id not in self.blocks:
+                return _error(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+            after = body.get("after")
+            if after and after not in self.children.get(block_id, []):
+                return _error(400, "validation_error", "after block is not a child of the parent.")
+            created = self._insert_blocks(block_id, children, after)
+        return 200, {"object": "list", "results": created, "next_cursor": None, "has_more": False, "type": "block"}
+
+    def _update_block(self, block_id, body):
+        with self.lock:
+            block = self.blocks.get(block_id)
+            if not block:
+                return _error(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+            btype = block["type"]
+            if btype in body:
+                content = dict(block[btype], **body[btype])
+                if "rich_text" in body[btype]:
+                    content["rich_text"] = _rich_text_out(body[btype]["rich_text"])
+                block[btype] = content
+            if "archived" in body:
+                block["archived"] = bool(body["archived"])
+            block["last_edited_time"] = _now_iso()
+            return 200, block
+
+    def _query(self, dbid, body, filter_properties=None):
+        body = body or {}
+        with self.lock:
+            if dbid not in self.databases:
+                return _error(404, "object_not_found", f"Could not find database with ID: {dbid}.")
+            flt = body.get("filter")
+            version = self.db_version[dbid]
+            key = (dbid, json.dumps([flt, body.get("sorts")], sort_keys=True, ensure_ascii=False))
+            cached = self._query_cache.get(key)
+            rows = [self.pages[pid] for pid in self.db_pages[dbid]] if not cached or cached[0] != version else None
+        if rows is None:
+            rows = cached[1]
+        else:
+            # 翻页请求复用首个请求的过滤结果，避免大数据集上每页都全表扫描
+            rows = [p for p in rows if not p.get("archived") and match_filter(p, flt)]
+            for sort in reversed(body.get("sorts") or []):
+                rows.sort(key=lambda p: _sort_key(p, sort), reverse=sort.get("direction") == "descending")
+            with self.lock:
+                if len(self._query_cache) > 64:
+                    self._query_cache.clear()
+                self._query_cache[key] = (version, rows)
+        page_size = min(int(body.get("page_size") or 100), 100)
+        start = 0
+        cursor = body.get("start_cursor")
+        if cursor:
+            ids = [p["id"] for p in rows]
+            if cursor not in ids:
+                return _error(400, "validation_error", "start_cursor is invalid.")
+            start = ids.index(cursor)
+        chunk = rows[start:start + page_size]
+        has_more = start + page_size < len(rows)
+        if filter_properties:
+            # 列投影：filter_properties 为属性 id（也接受列名），过滤在投影前按完整页面计算
+            wanted = set(filter_properties)
+            chunk = [dict(p, properties={name: v for name, v in p["properties"].items()
+                                         if name in wanted or v["id"] in wanted}) for p in chunk]
+        return 200, {
+            "object": "list",
+            "results": chunk,
+            "next_cursor": rows[start + page_size]["id"] if has_more else None,
+            "has_more": has_more,
+            "type": "page_or_database",
+        }
+
+
+# ---------------- HTTP server ----------------
+class FakeNotionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            sys.stderr.write("[fake_notion] " + (fmt % args) + "\n")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return None
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        if not self.path.startswith("/__"):
+            with self.server.fake.lock:
+                self.server.fake.stats["bytes_out"] += len(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve(self, method):
+        fake = self.server.fake
+        body = self._read_body() if method in ("POST", "PATCH") else {}
+        if self.path == "/__stats":
+            with fake.lock:
+                stats = dict(fake.stats)
+            return self._send(200, stats)
+        if self.path == "/__reset":
+            with fake.lock:
+                fake.stats.clear()
+            return self._send(200, {"ok": True})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(*_error(401, "unauthorized", "API token is invalid."))
+        if body is None:
+            return self._send(*_error(400, "invalid_json", "Error parsing JSON body."))
+        status, out, headers = fake.handle(method, self.path, body)
+        self._send(status, out, headers)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_PATCH(self):
+        self._serve("PATCH")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+
+def start_server(fake, host="127.0.0.1", port=0, verbose=False):
+    """后台线程启动服务，返回 (server, base_url)；调用 server.shutdown() 停止"""
+    server = ThreadingHTTPServer((host, port), FakeNotionHandler)
+    server.daemon_threads = True
+    server.fake = fake
+    server.verbose = verbose
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="本地 Notion API 替身服务")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--tasks", type=int, default=100, help="合成任务条数")
+    ap.add_argument("--task-days", type=int, default=30, help="任务分布的天数")
+    ap.add_argument("--review-days", type=int, default=30, help="合成每日复盘天数")
+    ap.add_argument("--today", default=None, help="YYYY-MM-DD，默认今天")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0, help="429 注入概率 0~1")
+    ap.add_argument("--max-inflight", type=int, default=0, help="同时处理的请求超过该数时返回 429（0 不限）")
+    ap.add_argument("--webhook-url", help="页面变更后发送 webhook 事件的地址，如 http://127.0.0.1:8787/notion/webhook")
+    ap.add_argument("--webhook-secret", help="事件签名密钥（对应 main.py 的 LIVE_WEBHOOK_SECRET）")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    fake = FakeNotion(args.latency_ms, args.jitter_ms, args.rate_429, seed=args.seed, max_inflight=args.max_inflight)
+    ids = fake.seed_dataset(args.tasks, args.task_days, args.review_days, today=args.today)
+    if args.webhook_url:
+        fake.subscribe(args.webhook_url, args.webhook_secret)  # 在种子数据之后订阅，只发送之后的变更
+    server, base = start_server(fake, args.host, args.port, args.verbose)
+    print(json.dumps({
+        "NOTION_TOKEN": "fake-token",
+        "NOTION_API_BASE": base,
+        "TASK_DATABASE_ID": ids["task_db"],
+        "REVIEW_DAILY_DB_ID": ids["review_db"],
+        "REVIEW_CYCLE_DB_ID": ids["review_db"],
+    }, ensure_ascii=False, indent=2))
+    print(f"fake Notion 已启动：{base}（Ctrl+C 退出）", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码抽象：安装了 orjson 时使用 orjson，否则退回标准库 json
+ - 环境变量 JSON_CODEC=json 可强制使用标准库（排查问题 / 对比基准）
+ - dumps 默认紧凑输出、保留非 ASCII 字符（等同 ensure_ascii=False）
+ - orjson 不支持的对象（非 str 键、超过 64 位的整数等）自动退回标准库
+main.py 的 Notion / AI 请求与 api/deepseek-processor.py 的响应共用此模块。
+"""
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.environ.get("JSON_CODEC", "").lower() == "json":
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError 也是它的子类
+
+
+def loads(data):
+    """data 可以是 str / bytes / bytearray"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def dumps_bytes(obj, pretty=False):
+    """编码为 UTF-8 bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            pass
+    return _std_dumps(obj, pretty).encode("utf-8")
+
+
+def dumps(obj, pretty=False):
+    """编码为 str"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+        except TypeError:
+            pass
+    return _std_dumps(obj, pretty)
+
+
+def _std_dumps(obj, pretty):
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
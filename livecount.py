@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+今日任务计数的增量维护（main.py 的 LIVE_MODE 使用）
+ - DayCounters：page_id -> 是否完成；每个变更事件 O(1) 更新 total / done，不重新扫描任务库
+   同一页面重复事件、改到其他日期、删除都按“先减旧贡献再加新贡献”处理，结果与全量重算一致
+ - Debouncer：变更后静默 quiet 秒（或距第一次未推送的变更满 max_wait 秒）再推送一次，合并期间的所有变更
+ - WebhookReceiver：本地 HTTP 端点接收 Notion webhook（POST /notion/webhook）
+   * 首次订阅时 Notion 发来 {"verification_token": ...}，原样交给 on_verify（需要填回 Notion 集成设置与 secret 配置）
+   * 设置 secret 后校验 X-Notion-Signature（sha256=HMAC-SHA256(secret, 请求体)），不符返回 401
+   * 只做解析与入队，立即返回 200；页面的读取在调用方的单个工作线程中按顺序完成
+ - fake_notion.py --webhook-url 可作为测试替身，在页面创建 / 更新 / 归档时发出同格式的事件
+
+用法:
+  counters = DayCounters("2026-10-19")
+  counters.seed({"page-a": True, "page-b": False})
+  counters.apply("page-b", "2026-10-19", True)     # -> True（done 1 -> 2）
+  push = Debouncer(lambda: print(counters.snapshot()), quiet=5, max_wait=30)
+  push.touch()
+"""
+
+import hmac
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_EVENTS = ("page.created", "page.properties_updated", "page.deleted", "page.undeleted", "page.moved")
+
+
+class DayCounters:
+    def __init__(self, day=None):
+        self.lock = threading.Lock()
+        self.day = day
+        self.seed({})
+
+    def seed(self, pages, day=None):
+        """pages: {page_id: 是否完成}，为该日期的全部任务（全量查询一次）"""
+        with self.lock:
+            if day is not None:
+                self.day = day
+            self.pages = {pid: bool(done) for pid, done in pages.items()}
+            self.total = len(self.pages)
+            self.done = sum(self.pages.values())
+            self.version = 0
+            self.applied = 0
+
+    def apply(self, page_id, day, done, removed=False):
+        """页面变更后的状态：日期 day、是否完成 done、是否已删除；计数有变化时返回 True"""
+        with self.lock:
+            self.applied += 1
+            old = self.pages.get(page_id)
+            new = None if removed or day != self.day else bool(done)
+            if old == new:
+                return False
+            if old is not None:
+                self.total -= 1
+                self.done -= old
+                del self.pages[page_id]
+            if new is not None:
+                self.pages[page_id] = new
+                self.total += 1
+                self.done += new
+            self.version += 1
+            return True
+
+    def snapshot(self):
+        with self.lock:
+            return {"day": self.day, "total": self.total, "done": self.done, "version": self.version}
+
+
+class Debouncer:
+    def __init__(self, fn, quiet=5.0, max_wait=30.0, name="debounce", log=None):
+        self.fn = fn
+        self.log = log
+        self.quiet = quiet
+        self.max_wait = max(quiet, max_wait)
+        self.cond = threading.Condition()
+        self.first = self.last = None  # 第一次 / 最近一次未推送变更的时刻
+        self.stopped = False
+        self.calls = self.touches = 0
+        self.thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self.thread.start()
+
+    def touch(self):
+        with self.cond:
+            now = time.monotonic()
+            self.first = self.first or now
+            self.last = now
+            self.touches += 1
+            self.cond.notify()
+
+    def _due(self):
+        if self.first is None:
+            return None
+        return min(self.last + self.quiet, self.first + self.max_wait)
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.stopped:
+                    due = self._due()
+                    if due is not None and time.monotonic() >= due:
+                        break
+                    self.cond.wait(None if due is None else due - time.monotonic())
+                if self.stopped:
+                    return
+                self.first = self.last = None
+            self._call()
+
+    def _call(self):
+        self.calls += 1
+        try:
+            self.fn()
+        except Exception as e:  # 推送失败不影响后续变更；下一次推送会带上最新计数
+            if self.log:
+                self.log(f"WARN: {self.thread.name} 推送失败：{e}")
+
+    def flush(self):
+        """有未推送的变更时立即推送"""
+        with self.cond:
+            pending, self.first, self.last = self.first is not None, None, None
+        if pending:
+            self._call()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+
+
+def sign(secret, body):
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class WebhookReceiver:
+    def __init__(self, on_event, host="127.0.0.1", port=8787, secret=None, on_verify=None, path="/notion/webhook"):
+        self.on_event = on_event
+        self.on_verify = on_verify
+        self.secret = secret
+        self.path = path
+        self.received = self.rejected = 0
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, status, body=b"{}"):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.split("?", 1)[0] != receiver.path:
+                    return self._reply(404)
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    event = None
+                if not isinstance(event, dict):
+                    return self._reply(400)
+                if "verification_token" in event:
+                    if receiver.on_verify:
+                        receiver.on_verify(event["verification_token"])
+                    return self._reply(200)
+                if receiver.secret and not hmac.compare_digest(
+                        self.headers.get("X-Notion-Signature", ""), sign(receiver.secret, raw)):
+                    receiver.rejected += 1
+                    return self._reply(401)
+                receiver.received += 1
+                receiver.on_event(event)
+                self._reply(200)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, name="notion-webhook", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -12,14 +12,31 @@ Notion 智能任务与复盘系统 v8 (Final)
 """
 
 import os
+import re
 import sys
+import csv
 import json
+import time
 import traceback
 import requests
+import queue
+import difflib
+import functools
+import threading
+import contextlib
 import subprocess
+from urllib.parse import quote
 from datetime import datetime, timedelta
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import pytz
+import jsoncodec
+import quota
+import aimd
+import breaker
+import singleflight
+import statebundle
+import livecount
 
 # ---------------- auto-install minimal package ----------------
 def ensure_pkg(pkg):
@@ -31,11 +48,24 @@ def ensure_pkg(pkg):
 
 ensure_pkg("schedule")
 import schedule
+
+# 可选：pyarrow（统计导出为 parquet；未安装时退回 csv）
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    STATS_SCHEMA = pa.schema([
+        ("date", pa.string()), ("review_type", pa.string()),
+        ("total", pa.int32()), ("done", pa.int32()), ("undone", pa.int32()),
+        ("keyword_total", pa.int32()), ("keywords", pa.string()),
+    ])
+except ImportError:
+    pa = pq = STATS_SCHEMA = None
 # ----------------------------------------------------------------
 
 # ---------------- load config.json ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
+# 可通过环境变量 NOTION_REVIEW_CONFIG 指向其他配置（本地 fake_notion 测试/基准使用）
+CONFIG_PATH = os.environ.get("NOTION_REVIEW_CONFIG") or os.path.join(BASE_DIR, "config.json")
 
 if not os.path.exists(CONFIG_PATH):
     raise FileNotFoundError("❌ 未找到 config.json，请参考 README 创建并填写 NOTION_TOKEN 与数据库 ID。")
@@ -49,6 +79,8 @@ DAILY_REVIEW_DB_ID = cfg.get("REVIEW_DAILY_DB_ID")  # 每日复盘数据库（
 CYCLE_REVIEW_DB_ID = cfg.get("REVIEW_CYCLE_DB_ID")  # 周/月复盘数据库（可与 DAILY 同库，也可分开）
 OPENAI_API_KEY = cfg.get("OPENAI_API_KEY")          # 可选，若启用 AI 总结
 OPENAI_MODEL = cfg.get("OPENAI_MODEL", "gpt-4o-mini")
+# Notion API 根地址，可改为本地 fake_notion.py 服务（如 http://127.0.0.1:8765/v1）
+NOTION_API_BASE = cfg.get("NOTION_API_BASE", "https://api.notion.com/v1").rstrip("/")
 
 if not NOTION_TOKEN or not TASK_DB_ID:
     raise SystemExit("请在 config.json 中设置 NOTION_TOKEN 与 TASK_DATABASE_ID 并重启脚本。")
@@ -63,30 +95,406 @@ tz = pytz.timezone(cfg.get("TZ", "Asia/Shanghai"))
 now = datetime.now(tz)
 TODAY = now.strftime("%Y-%m-%d")
 
+# ---------------- record / replay (cassette.py) ----------------
+# CASSETTE_MODE: "record" 录制真实请求；"replay" 离线回放（环境变量 NOTION_CASSETTE_* 优先）
+CASSETTE_MODE = os.environ.get("NOTION_CASSETTE_MODE") or cfg.get("CASSETTE_MODE")
+if CASSETTE_MODE:
+    import cassette
+    cassette.install(
+        CASSETTE_MODE,
+        os.environ.get("NOTION_CASSETTE_PATH") or cfg.get("CASSETTE_PATH", os.path.join(BASE_DIR, "nightly.cassette.gz")),
+        timing=float(os.environ.get("NOTION_CASSETTE_TIMING") or cfg.get("CASSETTE_TIMING", 0)),
+        trace_path=os.environ.get("NOTION_CASSETTE_TRACE") or cfg.get("CASSETTE_TRACE"),
+        meta={"today": TODAY, "tz": str(tz)},
+    )
+# 标记并发阶段，cassette.py diff 时不比较阶段内的请求顺序
+cassette_stage = cassette.concurrent if CASSETTE_MODE else contextlib.nullcontext
+
+DONE_STATUSES = ("已完成","完成","Done","done")
+# 顺延补跑：最多回溯天数与并发写入数（Notion 平均限速约 3 req/s）
+ROLLOVER_CATCHUP_MAX_DAYS = int(cfg.get("ROLLOVER_CATCHUP_MAX_DAYS", 30))
+ROLLOVER_CONCURRENCY = max(1, int(cfg.get("ROLLOVER_CONCURRENCY", 3)))
+# 写入并发自适应（aimd.py）：顺延、每日复盘、周/月复盘的页面写入从上次学到的并发（首次为 ROLLOVER_CONCURRENCY）开始，
+# 延迟正常时加性增加、遇到 429/5xx 减半，不超过 WRITE_CONCURRENCY_MAX；false 时固定为 ROLLOVER_CONCURRENCY
+ADAPTIVE_CONCURRENCY = bool(cfg.get("ADAPTIVE_CONCURRENCY", True))
+WRITE_CONCURRENCY_MAX = max(1, int(cfg.get("WRITE_CONCURRENCY_MAX", 16)))
+# 同一 token 的多个进程（定时任务、手动补跑、sync_news.py 等）共享请求配额（quota.py）：
+# 默认只在访问官方 API 时启用，3 次/秒；NOTION_QUOTA_RATE=0 关闭。429 时按 Retry-After 整体暂停后重试
+NOTION_QUOTA_RATE = float(cfg.get("NOTION_QUOTA_RATE",
+                                  3 if NOTION_API_BASE == "https://api.notion.com/v1" and CASSETTE_MODE != "replay" else 0))
+NOTION_QUOTA_BURST = int(cfg.get("NOTION_QUOTA_BURST", 3))
+NOTION_MAX_RETRIES = int(cfg.get("NOTION_MAX_RETRIES", 3))
+notion_quota = quota.SharedQuota(NOTION_TOKEN, NOTION_QUOTA_RATE, NOTION_QUOTA_BURST) if NOTION_QUOTA_RATE > 0 else None
+# 熔断与降级（breaker.py）：Notion 连续失败 BREAKER_FAILURES 次（5xx、重试后仍 429、超时）后熔断 BREAKER_COOLDOWN 秒，
+# 期间读取直接失败、写入进入延后队列 DEFERRED_PATH（下次运行开始时重放）；AI 接口失败一次即熔断，改用本地关键词汇总
+NOTION_TIMEOUT = float(cfg.get("NOTION_TIMEOUT", 20))
+AI_TIMEOUT = float(cfg.get("AI_TIMEOUT", 30))
+BREAKER_FAILURES = int(cfg.get("BREAKER_FAILURES", 3))
+BREAKER_COOLDOWN = float(cfg.get("BREAKER_COOLDOWN", 60))
+DEFERRED_PATH = cfg.get("DEFERRED_PATH") or os.path.join(BASE_DIR, "deferred_writes.jsonl")
+# 请求优先级（quota.py）：顺延与每日复盘为 critical，需在各自的时间窗口（分钟）内写完；自检为 diagnostic，
+# 其余写入 write、读取 read。只在启用共享配额时生效：预算紧张时高优先级先发，低优先级让出
+ROLLOVER_WINDOW_MIN = float(cfg.get("ROLLOVER_WINDOW_MIN", 15))
+DAILY_REVIEW_WINDOW_MIN = float(cfg.get("DAILY_REVIEW_WINDOW_MIN", 5))
+# 合并并发的相同读取（schema、query）与相同提示词的 AI 请求，只发一次、共享响应（singleflight.py）
+SINGLE_FLIGHT = bool(cfg.get("SINGLE_FLIGHT", True))
+# 实时计数（livecount.py）："webhook" 接收 Notion webhook 事件，"poll" 按 last_edited_time 轮询变更；
+# 为空时完成 / 未完成数只在夜间流程中全量统计。变更合并 LIVE_DEBOUNCE_SECONDS 秒（最长 LIVE_MAX_DELAY_SECONDS）后推送
+LIVE_MODE = cfg.get("LIVE_MODE", "")
+LIVE_WEBHOOK_HOST = cfg.get("LIVE_WEBHOOK_HOST", "127.0.0.1")
+LIVE_WEBHOOK_PORT = int(cfg.get("LIVE_WEBHOOK_PORT", 8787))
+LIVE_WEBHOOK_SECRET = os.environ.get("NOTION_WEBHOOK_SECRET") or cfg.get("LIVE_WEBHOOK_SECRET", "")
+LIVE_POLL_SECONDS = float(cfg.get("LIVE_POLL_SECONDS", 60))
+LIVE_DEBOUNCE_SECONDS = float(cfg.get("LIVE_DEBOUNCE_SECONDS", 10))
+LIVE_MAX_DELAY_SECONDS = float(cfg.get("LIVE_MAX_DELAY_SECONDS", 60))
+# 本地状态文件（记录上次成功顺延日期等）
+STATE_PATH = cfg.get("STATE_PATH") or os.path.join(BASE_DIR, "state.json")
+# 热启动状态包（statebundle.py）：开始时导入、结束时导出，供 GitHub Actions 等无状态环境跨次运行保留
+# 状态文件、schema 缓存与延后队列（环境变量 NOTION_STATE_BUNDLE 优先，空为关闭）
+STATE_BUNDLE = os.environ.get("NOTION_STATE_BUNDLE") or cfg.get("STATE_BUNDLE", "")
+# 数据库 schema 缓存有效期（小时，至少 10 分钟，即同一次运行内只读一次）；涉及某个数据库的请求返回 400 时该库的缓存失效
+SCHEMA_CACHE_HOURS = float(cfg.get("SCHEMA_CACHE_HOURS", 72))
+# 从状态包导入的 schema 每次运行先重新读取一次（列被改名 / 删除时不会沿用旧列名）；列类型未变时沿用缓存的列匹配结果。
+# false 时导入的 schema 在 SCHEMA_CACHE_HOURS 内直接使用
+SCHEMA_REVALIDATE = bool(cfg.get("SCHEMA_REVALIDATE", True))
+# 状态文件中幂等键（written）与每日计数汇总（rollups）的保留天数
+STATE_RETENTION_DAYS = int(cfg.get("STATE_RETENTION_DAYS", 62))
+# 每日复盘页面正文写入当日任务明细（已完成 / 未完成清单与链接）
+DAILY_REVIEW_BODY = bool(cfg.get("DAILY_REVIEW_BODY", True))
+# 查询下推：状态/类型条件放进 Notion filter，任务查询用 filter_properties 只取用到的列（false 时退回本地过滤）
+QUERY_PUSHDOWN = bool(cfg.get("QUERY_PUSHDOWN", True))
+# 统计导出目录（设为空字符串关闭）与格式：auto / parquet / csv
+STATS_EXPORT_DIR = cfg.get("STATS_EXPORT_DIR", os.path.join(BASE_DIR, "stats"))
+STATS_EXPORT_FORMAT = cfg.get("STATS_EXPORT_FORMAT", "auto")
+
 # ---------------- logging util ----------------
 def log(msg):
     print(f"[{datetime.now(tz).isoformat()}] {msg}")
 
+# ---------------- local state ----------------
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"WARN: 状态文件 {STATE_PATH} 读取失败，忽略：{e}")
+        return {}
+
+def save_state(state):
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, STATE_PATH)
+
+_state_lock = threading.Lock()
+
+def remember(section, key, value, date_str):
+    """在状态文件的 section（written / rollups）中记下 key，并清理 STATE_RETENTION_DAYS 天以前的条目"""
+    cutoff = (datetime.now(tz) - timedelta(days=STATE_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    with _state_lock:
+        state = load_state()
+        entries = {k: v for k, v in state.get(section, {}).items() if v.get("date", "") >= cutoff}
+        entries[key] = dict(value, date=date_str)
+        state[section] = entries
+        save_state(state)
+
 # ---------------- Notion helpers ----------------
-def notion_get(url):
-    r = requests.get(url, headers=HEADERS)
+def resp_json(r):
+    """用 jsoncodec（有 orjson 时更快）解析响应体，代替 r.json()；同一响应只解析一次（合并的请求共享解析结果）"""
+    if "_decoded" not in r.__dict__:
+        r._decoded = jsoncodec.loads(r.content)
+    return r._decoded
+
+_notion_local = threading.local()  # 本线程最近的请求是否遇到过 429/5xx（供写入并发控制判断过载）
+_write_ctl = None                  # 写入并发控制器（见 write_controller）
+notion_breaker = breaker.CircuitBreaker("Notion API", BREAKER_FAILURES, BREAKER_COOLDOWN, log=log)
+# AI 总结每次运行最多调用一两次，失败一次就熔断，避免再等一个超时
+ai_breaker = breaker.CircuitBreaker("AI 总结接口", 1, BREAKER_COOLDOWN, log=log)
+run_status = Counter()             # 本次运行的降级计数：read_failures / deferred / ai_fallback
+notion_flight = singleflight.SingleFlight()
+ai_flight = singleflight.SingleFlight()
+_deferred_lock = threading.Lock()
+
+def error_response(url, status, code, message):
+    """构造一个 Notion 风格的错误响应（熔断 / 网络错误 / 延后写入时代替真实响应，调用方按状态码处理）"""
+    r = requests.Response()
+    r.status_code = status
+    r.url = url
+    r._content = jsoncodec.dumps_bytes({"object": "error", "status": status, "code": code, "message": message})
     return r
 
-def notion_post(url, payload):
-    r = requests.post(url, headers=HEADERS, json=payload)
+def is_deferred(r):
+    return r.status_code == 202
+
+def defer_write(method, url, payload):
+    """熔断期间的写入追加到延后队列，返回 202"""
+    path = url[len(NOTION_API_BASE):] if url.startswith(NOTION_API_BASE) else url
+    entry = {"method": method, "path": path, "payload": payload, "queued_at": datetime.now(tz).isoformat()}
+    with _deferred_lock:
+        with open(DEFERRED_PATH, "ab") as f:
+            f.write(jsoncodec.dumps_bytes(entry) + b"\n")
+        run_status["deferred"] += 1
+    _notion_local.deferred = True
+    return error_response(url, 202, "deferred", "Notion 熔断中，写入已加入延后队列")
+
+def notion_request(method, url, payload=None):
+    """
+    所有 Notion 请求的出口：先向共享配额预订发送时刻；429 时让共享同一 token 的进程一起暂停再重试。
+    熔断时不发请求：读取返回 503，写入进入延后队列并返回 202；超时 / 连接错误也以 503 返回，不抛异常。
+    读取（GET 与 query）与在途的相同请求（方法 + URL + 请求体）合并，共享同一个响应
+    """
+    write = method != "GET" and not url.split("?", 1)[0].endswith("/query")
+    if write or not SINGLE_FLIGHT:
+        return send_notion_request(method, url, payload, write)
+    r, _ = notion_flight.do(singleflight.request_key(method, url, payload),
+                            lambda: send_notion_request(method, url, payload, write))
     return r
 
-def notion_patch(url, payload):
-    r = requests.patch(url, headers=HEADERS, json=payload)
+def send_notion_request(method, url, payload, write):
+    if not notion_breaker.allow():
+        if write:
+            return defer_write(method, url, payload)
+        run_status["read_failures"] += 1
+        return error_response(url, 503, "circuit_open", "Notion 熔断中，未发送请求")
+    data = jsoncodec.dumps_bytes(payload) if payload is not None else None
+    priority = getattr(_notion_local, "priority", None) or ("write" if write else "read")
+    for attempt in range(NOTION_MAX_RETRIES + 1):
+        if notion_quota:
+            notion_quota.acquire(priority, getattr(_notion_local, "deadline", None))
+        try:
+            r = requests.request(method, url, headers=HEADERS, data=data, timeout=NOTION_TIMEOUT)
+        except requests.RequestException as e:
+            r = error_response(url, 503, "network_error", str(e))
+        if r.status_code == 429 or r.status_code >= 500:
+            _notion_local.overloaded = True
+            if _write_ctl is not None:
+                _write_ctl.signal()  # 不等重试结束，立即降低写入并发
+        if r.status_code != 429 or attempt == NOTION_MAX_RETRIES:
+            break
+        retry_after = float(r.headers.get("Retry-After") or 1)
+        log(f"WARN: Notion 限流（429），{retry_after:g} 秒后重试")
+        if notion_quota:
+            notion_quota.pause(retry_after)
+        else:
+            time.sleep(retry_after)
+    if r.status_code == 429 or r.status_code >= 500:
+        notion_breaker.failure()
+        if not write:
+            run_status["read_failures"] += 1
+    else:
+        notion_breaker.success()
+    if r.status_code == 400 and schema_cache:
+        invalidate_schema(url, payload)
     return r
 
+def invalidate_schema(url, payload):
+    """请求返回 400：可能是该数据库缓存的 schema 已过时（列被删除 / 改名），只让这个库的缓存失效，之后重新读取"""
+    m = re.search(r"/databases/([0-9a-fA-F-]{32,36})", url)
+    parent = (payload or {}).get("parent") if isinstance(payload, dict) else None
+    dbid = m.group(1) if m else (parent or {}).get("database_id")
+    if dbid and schema_cache.pop(dbid, None):
+        log(f"WARN: 数据库 {dbid} 的请求返回 400，schema 缓存已失效")
+
+@contextlib.contextmanager
+def request_priority(priority, deadline=None):
+    """范围内（含 run_writes 的工作线程）的 Notion 请求使用该优先级；deadline 为墙钟时间戳"""
+    prev = (getattr(_notion_local, "priority", None), getattr(_notion_local, "deadline", None))
+    _notion_local.priority, _notion_local.deadline = priority, deadline
+    try:
+        yield
+    finally:
+        _notion_local.priority, _notion_local.deadline = prev
+
+def with_priority(priority, window_min=None):
+    """装饰器：函数内的 Notion 请求使用该优先级，截止时间为调用时刻 + window_min 分钟"""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            deadline = time.time() + window_min * 60 if window_min else None
+            with request_priority(priority, deadline):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def notion_get(url):
+    return notion_request("GET", url)
+
+def notion_post(url, payload):
+    return notion_request("POST", url, payload)
+
+def notion_patch(url, payload):
+    return notion_request("PATCH", url, payload)
+
+def notion_delete(url):
+    return notion_request("DELETE", url)
+
+def quota_report():
+    """本进程在共享配额上的排队情况（主流程结束时输出）"""
+    if not notion_quota:
+        return
+    st = notion_quota.stats()
+    log(f"配额：请求 {st['granted']} 次，排队共 {st['wait_total_s']} 秒（平均 {st['wait_avg_ms']} ms，"
+        f"p95 {st['wait_p95_ms']} ms，最长 {st['wait_max_ms']} ms），429 暂停 {st['penalties']} 次")
+    for p, v in st["by_priority"].items():
+        log(f"  {p}: {v['granted']} 次，平均等待 {v['wait_avg_ms']} ms，最长 {v['wait_max_ms']} ms"
+            + (f"，错过截止时间 {v['deadline_missed']} 次" if v["deadline_missed"] else ""))
+
+@with_priority("write")
+def flush_deferred():
+    """按加入顺序重放延后队列中的写入；Notion 仍不可用的重新进入队列，4xx（如目标已删除）的放弃"""
+    replay = DEFERRED_PATH + ".replaying"
+    with _deferred_lock:
+        if os.path.exists(DEFERRED_PATH) and not os.path.exists(replay):
+            os.replace(DEFERRED_PATH, replay)
+    if not os.path.exists(replay):
+        return
+    with open(replay, "rb") as f:
+        entries = [jsoncodec.loads(line) for line in f if line.strip()]
+    done = again = dropped = 0
+    for e in entries:
+        url = NOTION_API_BASE + e["path"] if e["path"].startswith("/") else e["path"]
+        r = notion_request(e["method"], url, e.get("payload"))
+        if r.status_code in (200, 201):
+            done += 1
+        elif is_deferred(r) or r.status_code == 429 or r.status_code >= 500:
+            if not is_deferred(r):
+                defer_write(e["method"], url, e.get("payload"))
+            again += 1
+        else:
+            dropped += 1
+            log(f"⚠ 放弃延后写入 {e['method']} {e['path']}：{r.status_code} {r.text[:200]}")
+    os.remove(replay)
+    log(f"⏩ 重放延后写入 {len(entries)} 条：成功 {done}，仍延后 {again}，放弃 {dropped}")
+
+def run_status_report():
+    """输出本次运行是否降级（熔断、读取失败、延后写入、AI 改用本地汇总），并记入状态文件"""
+    parts = []
+    if notion_breaker.trips or run_status["read_failures"]:
+        parts.append(f"Notion 熔断 {notion_breaker.trips} 次（当前 {notion_breaker.state}），读取失败 {run_status['read_failures']} 次")
+    if run_status["deferred"]:
+        parts.append(f"{run_status['deferred']} 条写入已延后到 {DEFERRED_PATH}，下次运行时重放")
+    if ai_breaker.trips or run_status["ai_fallback"]:
+        parts.append(f"AI 总结 {run_status['ai_fallback']} 次改用本地关键词汇总")
+    status = "degraded" if parts else "ok"
+    log(("⚠ 本次为降级运行：" + "；".join(parts)) if parts else "✅ 运行状态：正常")
+    collapsed = {"notion": notion_flight.collapsed, "ai": ai_flight.collapsed}
+    if SINGLE_FLIGHT:
+        log(f"🔗 合并并发重复请求：Notion {collapsed['notion']} 次，AI {collapsed['ai']} 次")
+    with _state_lock:
+        state = load_state()
+        state["last_run"] = dict(run_status, at=datetime.now(tz).isoformat(), status=status,
+                                 notion=notion_breaker.stats(), ai=ai_breaker.stats(), collapsed=collapsed)
+        save_state(state)
+    return status
+
+def import_state_bundle(path):
+    """开始时导入状态包：预热 schema 缓存；本地没有状态文件 / 延后队列时（全新环境）使用状态包中的副本"""
+    try:
+        header, sections = statebundle.read_bundle(path)
+    except statebundle.BundleError as e:
+        log(f"⚠ 未使用状态包 {path}：{e}，按冷启动运行")
+        return False
+    schemas = sections.get("schemas") or {}
+    schema_cache.update(schemas)
+    if sections.get("state") and not os.path.exists(STATE_PATH):
+        save_state(sections["state"])
+    deferred = sections.get("deferred") or []
+    if deferred and not os.path.exists(DEFERRED_PATH):
+        with open(DEFERRED_PATH, "wb") as f:
+            f.writelines(jsoncodec.dumps_bytes(e) + b"\n" for e in deferred)
+    log(f"♻ 已导入状态包（{header['saved_at']}）：schema {len(schemas)} 个，延后写入 {len(deferred)} 条")
+    return True
+
+def export_state_bundle(path):
+    """结束时导出状态文件、schema 缓存与延后队列"""
+    deferred = []
+    if os.path.exists(DEFERRED_PATH):
+        with open(DEFERRED_PATH, "rb") as f:
+            deferred = [jsoncodec.loads(line) for line in f if line.strip()]
+    try:
+        size = statebundle.write_bundle(path, {"state": load_state(), "schemas": schema_cache, "deferred": deferred})
+    except OSError as e:
+        log(f"⚠ 状态包导出失败：{e}")
+        return False
+    log(f"💾 已导出状态包 {path}（{size} 字节）")
+    return True
+
+# ---------------- adaptive write concurrency ----------------
+def notion_overloaded(_result=None):
+    """取出并清除本线程的过载标记；写入被延后（没有实际发出）时返回 None，不影响并发调整"""
+    flag = getattr(_notion_local, "overloaded", False)
+    deferred = getattr(_notion_local, "deferred", False)
+    _notion_local.overloaded = _notion_local.deferred = False
+    return None if deferred and not flag else flag
+
+def write_controller():
+    """本进程所有写入阶段共用一个 AIMD 控制器，后面的阶段沿用前面学到的并发"""
+    global _write_ctl
+    if _write_ctl is None:
+        if ADAPTIVE_CONCURRENCY:
+            initial = int(load_state().get("write_concurrency") or ROLLOVER_CONCURRENCY)
+            _write_ctl = aimd.AIMDController(initial, 1, WRITE_CONCURRENCY_MAX, log=log)
+        else:
+            _write_ctl = aimd.AIMDController(ROLLOVER_CONCURRENCY, ROLLOVER_CONCURRENCY, ROLLOVER_CONCURRENCY)
+    return _write_ctl
+
+def run_writes(fn, items, stage):
+    """并发执行写入 fn(item)（按输入顺序返回结果），结束后输出本阶段的并发轨迹"""
+    ctl = write_controller()
+    mark = len(ctl.trajectory) - 1
+    notion_overloaded()
+    scope = (getattr(_notion_local, "priority", None), getattr(_notion_local, "deadline", None))
+
+    def task(item):
+        with request_priority(*scope), cassette_stage(stage):  # 工作线程沿用调用方的优先级与截止时间
+            return fn(item)
+
+    results = ctl.map(task, items, overloaded=notion_overloaded)
+    if ADAPTIVE_CONCURRENCY and len(results) > 1:
+        log(f"⚙ {stage}写入 {len(results)} 次，并发轨迹：{ctl.summary(mark)}")
+    return results
+
+def write_once(fn, *args):
+    """单次写入也计入控制器（延迟与过载信号）"""
+    notion_overloaded()
+    return write_controller().call(fn, *args, overloaded=notion_overloaded)
+
+def remember_write_concurrency():
+    """把学到的并发写入状态文件，下次运行从这里开始"""
+    if _write_ctl is None or not ADAPTIVE_CONCURRENCY:
+        return
+    with _state_lock:
+        state = load_state()
+        if state.get("write_concurrency") != _write_ctl.current:
+            state["write_concurrency"] = _write_ctl.current
+            save_state(state)
+
 # ---------------- DB schema helpers ----------------
+# dbid -> {"fetched_at": 读取时间戳, "info": schema, "columns": match_task_columns 的结果}；可由状态包预热
+schema_cache = {}
+_schema_fetched = set()  # 本进程内从 Notion 读取过的数据库（SCHEMA_REVALIDATE 时只信任这些缓存）
+
+def column_types(info):
+    return {name: p.get("type") for name, p in (info or {}).get("properties", {}).items()}
+
 def get_database_info(dbid):
-    r = notion_get(f"https://api.notion.com/v1/databases/{dbid}")
+    entry = schema_cache.get(dbid)
+    if entry and time.time() - entry["fetched_at"] < max(SCHEMA_CACHE_HOURS * 3600, 600) \
+            and (dbid in _schema_fetched or not SCHEMA_REVALIDATE):
+        return entry["info"]
+    r = notion_get(f"{NOTION_API_BASE}/databases/{dbid}")
     if r.status_code != 200:
         log(f"ERROR: get_database_info {dbid} -> {r.status_code} {r.text}")
         return None
-    return r.json()
+    info = resp_json(r)
+    fresh = {"fetched_at": time.time(), "info": info}
+    if entry and entry.get("columns") and column_types(entry["info"]) == column_types(info):
+        fresh["columns"] = entry["columns"]  # 列名与类型未变，列匹配结果仍然有效
+    schema_cache[dbid] = fresh
+    _schema_fetched.add(dbid)
+    return info
 
 def ensure_props_on_db(dbid, required_props):
     """
@@ -102,7 +510,8 @@ def ensure_props_on_db(dbid, required_props):
         log(f"✅ 数据库 {dbid} 已包含所有必要字段。")
         return True
     payload = {"properties": to_add}
-    r = notion_patch(f"https://api.notion.com/v1/databases/{dbid}", payload)
+    r = notion_patch(f"{NOTION_API_BASE}/databases/{dbid}", payload)
+    schema_cache.pop(dbid, None)
     if r.status_code in (200,201):
         log(f"⚙️ 已自动补齐数据库 {dbid} 字段：{', '.join(to_add.keys())}")
         return True
@@ -112,6 +521,10 @@ def ensure_props_on_db(dbid, required_props):
 
 # ---------------- match task DB column names (容错匹配) ----------------
 def match_task_columns(dbinfo):
+    # 同一份缓存的 schema 只匹配一次
+    entry = next((e for e in list(schema_cache.values()) if e["info"] is dbinfo), None)
+    if entry and entry.get("columns"):
+        return dict(entry["columns"])
     props = dbinfo.get("properties", {})
     cols = {}
     for name, meta in props.items():
@@ -140,18 +553,154 @@ def match_task_columns(dbinfo):
         if meta.get("type") == "select" and "status" not in cols:
             cols["status"] = name
     log(f"Matched task DB columns: {cols}")
+    if entry is not None:
+        entry["columns"] = dict(cols)
     return cols
 
 # ---------------- query helpers ----------------
-def query_database_by_date(dbid, date_prop_name, date_str):
-    payload = {"filter": {"property": date_prop_name, "date": {"equals": date_str}}}
-    r = notion_post(f"https://api.notion.com/v1/databases/{dbid}/query", payload)
+def projection_qs(dbinfo, names):
+    """filter_properties 查询串：只返回 names 这些列（列名换成属性 id）；QUERY_PUSHDOWN 关闭时为空"""
+    if not QUERY_PUSHDOWN:
+        return ""
+    props = dbinfo.get("properties", {})
+    ids = [props[n].get("id") or n for n in names if n in props]
+    return ("?" + "&".join("filter_properties=" + quote(i, safe="") for i in ids)) if ids else ""
+
+def not_done_conditions(status_col):
+    # select 的 does_not_equal 也会匹配空状态，与 is_done() 的判断一致
+    return [{"property": status_col, "select": {"does_not_equal": s}} for s in DONE_STATUSES]
+
+def daily_type_filter():
+    # 类型为“每日”或未填写（与 collect_daily_reviews 的本地过滤一致）
+    return {"or": [{"property": "类型", "select": {"equals": "每日"}},
+                   {"property": "类型", "select": {"is_empty": True}}]}
+
+def query_database_by_date(dbid, date_prop_name, date_str, conditions=None, qs=""):
+    flt = {"property": date_prop_name, "date": {"equals": date_str}}
+    if conditions:
+        flt = {"and": [flt] + conditions}
+    payload = {"filter": flt}
+    r = notion_post(f"{NOTION_API_BASE}/databases/{dbid}/query{qs}", payload)
     if r.status_code != 200:
         log(f"ERROR query_database_by_date {dbid}: {r.status_code} {r.text}")
         return []
-    return r.json().get("results", [])
+    return resp_json(r).get("results", [])
+
+def query_database_iter(dbid, payload, qs=""):
+    """按 start_cursor 翻页，逐条产出查询结果（不把所有页面一次性放进内存）"""
+    body = dict(payload, page_size=100)
+    while True:
+        r = notion_post(f"{NOTION_API_BASE}/databases/{dbid}/query{qs}", body)
+        if r.status_code != 200:
+            log(f"ERROR query_database_iter {dbid}: {r.status_code} {r.text}")
+            return
+        data = resp_json(r)
+        yield from data.get("results", [])
+        if not data.get("has_more") or not data.get("next_cursor"):
+            return
+        body["start_cursor"] = data["next_cursor"]
 
 # ---------------- rollover (未完成任务顺延) ----------------
+def page_title(page, title_col):
+    rt = page.get("properties", {}).get(title_col, {}).get("title") or []
+    return "".join(x.get("plain_text", "") for x in rt)
+
+def page_date(page, date_col):
+    d = page.get("properties", {}).get(date_col, {}).get("date") or {}
+    return (d.get("start") or "")[:10]
+
+def is_done(page, status_col):
+    sel = page.get("properties", {}).get(status_col, {}).get("select")
+    return bool(sel) and sel.get("name") in DONE_STATUSES
+
+# 顺延复制计划：按数据库 schema 编译一次，逐列生成“读取格式 -> 写入格式”的复制函数
+READ_ONLY_TYPES = ("formula", "rollup", "created_time", "created_by", "last_edited_time",
+                   "last_edited_by", "unique_id", "verification", "button")
+
+def _copy_rich_text(items):
+    out = []
+    for it in items:
+        t = it.get("type", "text")
+        if t in it:
+            out.append({"type": t, t: it[t], "annotations": it.get("annotations") or {}})
+    return out
+
+def _copy_files(items):
+    # Notion 托管文件的链接会过期且不能写回，只复制外链文件
+    return [{"name": f.get("name", ""), "type": "external", "external": f["external"]}
+            for f in items if f.get("type") == "external"]
+
+_VALUE_COPIERS = {
+    "title": _copy_rich_text,
+    "rich_text": _copy_rich_text,
+    "number": lambda v: v,
+    "checkbox": lambda v: v,
+    "url": lambda v: v,
+    "email": lambda v: v,
+    "phone_number": lambda v: v,
+    "select": lambda v: {"name": v["name"]},
+    "status": lambda v: {"name": v["name"]},
+    "multi_select": lambda v: [{"name": o["name"]} for o in v],
+    "date": lambda v: {k: v[k] for k in ("start", "end", "time_zone") if v.get(k)},
+    "relation": lambda v: [{"id": o["id"]} for o in v],
+    "people": lambda v: [{"id": o["id"]} for o in v],
+    "files": _copy_files,
+}
+
+_COPY_PLANS = {}
+
+def compile_copy_plan(dbid, dbinfo, cols):
+    """
+    返回 (build(page, target_date) -> properties, 需要读取的列名)；
+    只读列（formula / rollup / 创建时间等）跳过，空值不写；标题照抄、日期改为 target_date、状态重置为“未开始”。
+    按 (dbid, 各列名与类型) 缓存，schema 不变时只编译一次
+    """
+    props = dbinfo.get("properties", {})
+    key = (dbid, tuple(sorted((n, m.get("type")) for n, m in props.items())), tuple(sorted(cols.items())))
+    plan = _COPY_PLANS.get(key)
+    if plan:
+        return plan
+    copiers = []
+    for name, meta in props.items():
+        ptype = meta.get("type")
+        if name in (cols.get("date"), cols.get("status")) or ptype in READ_ONLY_TYPES:
+            continue
+        fn = _VALUE_COPIERS.get(ptype)
+        if fn is not None:
+            copiers.append((name, ptype, fn))
+    date_col, status_col = cols["date"], cols.get("status")
+
+    def build(page, target_date):
+        src = page.get("properties", {})
+        out = {}
+        for name, ptype, fn in copiers:
+            value = (src.get(name) or {}).get(ptype)
+            if value is None or value == []:
+                continue
+            value = fn(value)
+            if value is not None and value != []:
+                out[name] = {ptype: value}
+        out[date_col] = {"date": {"start": target_date}}
+        if status_col:
+            out[status_col] = {"select": {"name": "未开始"}}
+        return out
+
+    read_cols = [name for name, _, _ in copiers] + [c for c in (date_col, status_col) if c]
+    _COPY_PLANS[key] = plan = (build, read_cols)
+    return plan
+
+def rollover_start_date(last_rollover, today):
+    """
+    补跑起点：上次成功顺延的日期（当天新建的任务也可能未完成），
+    无记录时只看昨天；最多回溯 ROLLOVER_CATCHUP_MAX_DAYS 天
+    """
+    d_today = datetime.strptime(today, "%Y-%m-%d")
+    earliest = (d_today - timedelta(days=ROLLOVER_CATCHUP_MAX_DAYS)).strftime("%Y-%m-%d")
+    if not last_rollover:
+        return (d_today - timedelta(days=1)).strftime("%Y-%m-%d")
+    return max(last_rollover, earliest)
+
+@with_priority("critical", ROLLOVER_WINDOW_MIN)
 def rollover_unfinished_tasks():
     # get task DB info and match columns
     dbinfo = get_database_info(TASK_DB_ID)
@@ -163,76 +712,231 @@ def rollover_unfinished_tasks():
         log("ERROR: 任务数据库必须包含 date/title/status 列")
         return
 
+    today = datetime.now(tz).strftime("%Y-%m-%d")
     yesterday = (datetime.now(tz) - timedelta(days=1)).strftime("%Y-%m-%d")
-    yesterday_tasks = query_database_by_date(TASK_DB_ID, cols["date"], yesterday)
-    log(f"检测到昨日任务 {len(yesterday_tasks)} 条，开始检测未完成并顺延...")
-    rolled = []
-    for p in yesterday_tasks:
-        props = p.get("properties", {})
-        status_sel = props.get(cols["status"], {}).get("select")
-        title = ""
-        title_field = props.get(cols["title"], {})
-        if title_field.get("title"):
-            title = title_field["title"][0].get("plain_text","")
-        if not status_sel or status_sel.get("name") not in ("已完成","完成","Done","done"):
-            # create a new page for today copying title and other useful props
-            new_props = {}
-            # copy title
-            new_props[cols["title"]] = {"title":[{"text":{"content": title}}]}
-            # set date -> today (use same date prop name)
-            new_props[cols["date"]] = {"date":{"start": datetime.now(tz).strftime("%Y-%m-%d")}}
-            # reset status to 未开始
-            if cols.get("status"):
-                new_props[cols["status"]] = {"select":{"name":"未开始"}}
-            # copy resource if exists
-            if cols.get("resource"):
-                url_val = props.get(cols["resource"], {}).get("url")
-                if url_val:
-                    new_props[cols["resource"]] = {"url": url_val}
-            # try to copy hint
-            if cols.get("hint"):
-                rt = props.get(cols["hint"], {}).get("rich_text", [])
-                if rt:
-                    new_props[cols["hint"]] = {"rich_text": rt}
-            # create
-            payload = {"parent":{"database_id": TASK_DB_ID}, "properties": new_props}
-            r = notion_post("https://api.notion.com/v1/pages", payload)
-            if r.status_code in (200,201):
-                rolled.append(title)
-            else:
-                log(f"⚠ 无法顺延任务 “{title}”：{r.status_code} {r.text}")
+    state = load_state()
+    reads_before = run_status["read_failures"]
+    since = rollover_start_date(state.get("last_rollover_date"), today)
+    if since >= today:
+        log(f"✅ 今日（{today}）已完成顺延，跳过。")
+        return
+    if since < yesterday:
+        log(f"⏪ 上次顺延日期为 {state.get('last_rollover_date')}，补跑 {since} ~ {yesterday}")
+
+    # 一次按日期范围流式查询；按日期升序，同名任务的顺延链只保留最新一条
+    # 下推时只传输未完成任务，且只取顺延需要的列
+    date_range = [
+        {"property": cols["date"], "date": {"on_or_after": since}},
+        {"property": cols["date"], "date": {"on_or_before": yesterday}},
+    ]
+    payload = {
+        "filter": {"and": date_range + (not_done_conditions(cols["status"]) if QUERY_PUSHDOWN else [])},
+        "sorts": [{"property": cols["date"], "direction": "ascending"}],
+    }
+    build_props, rollover_cols = compile_copy_plan(TASK_DB_ID, dbinfo, cols)
+    latest, scanned = {}, 0
+    for p in query_database_iter(TASK_DB_ID, payload, projection_qs(dbinfo, rollover_cols)):
+        scanned += 1
+        latest[page_title(p, cols["title"])] = p
+    if QUERY_PUSHDOWN and since < yesterday and latest:
+        # 补跑多天时，未完成任务可能在之后某天以顺延副本完成：只取已完成任务的标题与日期比对
+        done_payload = {"filter": {"and": date_range + [
+            {"or": [{"property": cols["status"], "select": {"equals": s}} for s in DONE_STATUSES]}]}}
+        for p in query_database_iter(TASK_DB_ID, done_payload, projection_qs(dbinfo, [cols["title"], cols["date"]])):
+            title = page_title(p, cols["title"])
+            if title in latest and page_date(p, cols["date"]) >= page_date(latest[title], cols["date"]):
+                del latest[title]
+    pending = {title: p for title, p in latest.items() if not is_done(p, cols["status"])}
+    log(f"检测到 {since} ~ {yesterday} 任务 {scanned} 条，未完成 {len(pending)} 个，开始顺延...")
+
+    # 今日已存在的同名任务视为已顺延（重复运行 / 上次部分失败时保持幂等）
+    if pending:
+        today_payload = {"filter": {"property": cols["date"], "date": {"equals": today}}}
+        for p in query_database_iter(TASK_DB_ID, today_payload, projection_qs(dbinfo, [cols["title"]])):
+            pending.pop(page_title(p, cols["title"]), None)
+
+    def create(item):
+        title, page = item
+        payload = {"parent":{"database_id": TASK_DB_ID}, "properties": build_props(page, today)}
+        r = notion_post(f"{NOTION_API_BASE}/pages", payload)
+        if r.status_code in (200,201):
+            return title, None
+        if is_deferred(r):
+            return title, "deferred"
+        return title, f"{r.status_code} {r.text}"
+
+    rolled, deferred, failed = [], [], []
+    for title, err in run_writes(create, pending.items(), "顺延"):
+        if err == "deferred":
+            deferred.append(title)
+        elif err:
+            failed.append(title)
+            log(f"⚠ 无法顺延任务 “{title}”：{err}")
+        else:
+            rolled.append(title)
     if rolled:
         log(f"↩️ 已顺延 {len(rolled)} 个任务到今日：{rolled}")
-    else:
+    elif not deferred:
         log("✅ 无需顺延或顺延无失败项。")
+    if deferred:
+        log(f"⏸ Notion 熔断，{len(deferred)} 个任务的顺延写入已延后")
+    # 查询失败时“没有未完成任务”并不可信，不记为已顺延
+    if not failed and run_status["read_failures"] == reads_before:
+        # 重新读取再写：顺延期间实时计数线程可能已通过 remember() 改写了状态文件
+        with _state_lock:
+            state = load_state()
+            state["last_rollover_date"] = today
+            save_state(state)
+    remember_write_concurrency()
 
 # ---------------- create / update daily review ----------------
 def find_review_entry_by_date(review_db_id, date_str):
     payload = {"filter": {"property":"📅 日期", "date":{"equals": date_str}}}
-    r = notion_post(f"https://api.notion.com/v1/databases/{review_db_id}/query", payload)
+    if QUERY_PUSHDOWN:
+        # 周/月复盘可能与每日复盘同库同日期，只取每日复盘
+        payload = {"filter": {"and": [payload["filter"], daily_type_filter()]}}
+    r = notion_post(f"{NOTION_API_BASE}/databases/{review_db_id}/query", payload)
     if r.status_code != 200:
         log(f"ERROR find_review_entry_by_date: {r.status_code} {r.text}")
         return None
-    results = r.json().get("results", [])
+    results = resp_json(r).get("results", [])
     return results[0] if results else None
 
-def create_daily_review_if_missing(review_db_id):
+# ---------------- daily review body (blocks) ----------------
+# 正文中由脚本维护的区域：以 BODY_MARKER 标题开始、到其后第一个分割线结束，区域外的手写内容不受影响
+BODY_MARKER = "📋 今日任务明细"
+BLOCK_APPEND_LIMIT = 100  # Notion 单次追加子块上限
+
+def _rich_text(content, link=None):
+    text = {"content": content[:2000]}
+    if link:
+        text["link"] = {"url": link}
+    return [{"type": "text", "text": text}]
+
+def render_daily_body(tasks, cols):
+    """在本地构造正文块：已完成 / 未完成两组 to_do，标题链接到资源（没有时链接到任务页）"""
+    done = [t for t in tasks if is_done(t, cols["status"])]
+    undone = [t for t in tasks if not is_done(t, cols["status"])]
+
+    def todo(t, checked):
+        link = t.get("properties", {}).get(cols["resource"], {}).get("url") if cols.get("resource") else None
+        title = page_title(t, cols["title"]) or "（无标题）"
+        return {"type": "to_do", "to_do": {"rich_text": _rich_text(title, link or t.get("url")), "checked": checked}}
+
+    blocks = [{"type": "heading_2", "heading_2": {"rich_text": _rich_text(BODY_MARKER)}},
+              {"type": "heading_3", "heading_3": {"rich_text": _rich_text(f"✅ 已完成（{len(done)}）")}}]
+    blocks += [todo(t, True) for t in done]
+    blocks.append({"type": "heading_3", "heading_3": {"rich_text": _rich_text(f"⏳ 未完成（{len(undone)}）")}})
+    blocks += [todo(t, False) for t in undone]
+    blocks.append({"type": "divider", "divider": {}})
+    return blocks
+
+def block_signature(block):
+    """读取格式与写入格式的块都能比较：(类型, ((文本, 链接), ...), checked)"""
+    btype = block.get("type")
+    content = block.get(btype) or {}
+    text = tuple(((rt.get("text") or {}).get("content", rt.get("plain_text", "")),
+                  ((rt.get("text") or {}).get("link") or {}).get("url"))
+                 for rt in content.get("rich_text", []))
+    return btype, text, content.get("checked")
+
+def list_block_children(block_id):
+    """分页读取全部子块；失败返回 None"""
+    out, cursor = [], None
+    while True:
+        qs = f"?page_size=100&start_cursor={cursor}" if cursor else "?page_size=100"
+        r = notion_get(f"{NOTION_API_BASE}/blocks/{block_id}/children{qs}")
+        if r.status_code != 200:
+            log(f"ERROR list_block_children {block_id}: {r.status_code} {r.text}")
+            return None
+        data = resp_json(r)
+        out.extend(data.get("results", []))
+        if not data.get("has_more") or not data.get("next_cursor"):
+            return out
+        cursor = data["next_cursor"]
+
+def append_blocks(parent_id, blocks, after=None):
+    """按每次最多 BLOCK_APPEND_LIMIT 个追加；after 为插入位置（None 表示追加到末尾）"""
+    for i in range(0, len(blocks), BLOCK_APPEND_LIMIT):
+        payload = {"children": blocks[i:i + BLOCK_APPEND_LIMIT]}
+        if after:
+            payload["after"] = after
+        r = notion_patch(f"{NOTION_API_BASE}/blocks/{parent_id}/children", payload)
+        if r.status_code != 200:
+            log(f"⚠ 追加正文块失败：{r.status_code} {r.text}")
+            return False
+        if after:
+            after = resp_json(r)["results"][-1]["id"]
+    return True
+
+def sync_page_body(page_id, blocks):
+    """
+    把正文中的脚本维护区域更新为 blocks：与现有子块逐块比较（difflib），
+    相同的不动，同类型的改动原地更新，其余删除旧块、在原位置批量插入新块；没有该区域时追加到末尾
+    """
+    existing = list_block_children(page_id)
+    if existing is None:
+        return False
+    marker = block_signature(blocks[0])
+    start = next((i for i, b in enumerate(existing) if block_signature(b)[:2] == marker[:2]), None)
+    if start is None:
+        return append_blocks(page_id, blocks)
+    end = next((i for i in range(start + 1, len(existing)) if existing[i].get("type") == "divider"), len(existing) - 1)
+    region = existing[start:end + 1]
+    old = [block_signature(b) for b in region]
+    new = [block_signature(b) for b in blocks]
+    ok, changed, edits, inserts = True, 0, [], []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        changed += max(i2 - i1, j2 - j1)
+        if tag == "replace" and i2 - i1 == j2 - j1 and all(old[i1 + k][0] == new[j1 + k][0] for k in range(i2 - i1)):
+            for k in range(i2 - i1):
+                b = blocks[j1 + k]
+                edits.append(("PATCH", f"{NOTION_API_BASE}/blocks/{region[i1 + k]['id']}", {b["type"]: b[b["type"]]}))
+            continue
+        edits.extend(("DELETE", f"{NOTION_API_BASE}/blocks/{b['id']}", None) for b in region[i1:i2])
+        if j2 > j1:
+            # 第一个块是 BODY_MARKER，总是相同，所以插入位置前一定有未改动的块
+            inserts.append((blocks[j1:j2], region[i1 - 1]["id"]))
+    # 原地更新与删除互不依赖，并发执行；插入依赖锚点与顺序，逐段执行
+    if edits:
+        ok = all(r.status_code == 200 for r in run_writes(lambda e: notion_request(*e), edits, "复盘正文"))
+    for new_blocks, after in inserts:
+        ok = append_blocks(page_id, new_blocks, after=after) and ok
+    if changed:
+        log(f"📝 今日复盘正文更新 {changed} 个块")
+    return ok
+
+@with_priority("critical", DAILY_REVIEW_WINDOW_MIN)
+def create_daily_review_if_missing(review_db_id, day=None):
+    """day 默认为 TODAY；实时计数跨过午夜后传入新的日期"""
+    day = day or TODAY
     # compute today's task stats
     dbinfo = get_database_info(TASK_DB_ID)
+    if not dbinfo:
+        log("ERROR: 无法读取任务数据库信息，跳过每日复盘")
+        return False
     cols = match_task_columns(dbinfo)
     if not cols.get("date") or not cols.get("status"):
         log("ERROR: 任务数据库缺失 date 或 status 列，无法统计今日任务")
         return False
     total, done = 0, 0
-    tasks = query_database_by_date(TASK_DB_ID, cols["date"], TODAY)
+    body_cols = [cols["status"]] + ([cols["title"]] + ([cols["resource"]] if cols.get("resource") else [])
+                                    if DAILY_REVIEW_BODY and cols.get("title") else [])
+    tasks = list(query_database_iter(TASK_DB_ID, {"filter": {"property": cols["date"], "date": {"equals": day}}},
+                                     projection_qs(dbinfo, body_cols)))
     total = len(tasks)
     for t in tasks:
         sel = t["properties"].get(cols["status"], {}).get("select")
         if sel and sel.get("name") in ("已完成","完成","Done","done"):
             done += 1
     undone = total - done
+    remember("rollups", day, {"total": total, "done": done}, day)
+    blocks = render_daily_body(tasks, cols) if DAILY_REVIEW_BODY and cols.get("title") else None
 
-    existing = find_review_entry_by_date(review_db_id, TODAY)
+    existing = find_review_entry_by_date(review_db_id, day)
+    record_stats(day, "每日", total, done, summarize_keywords([existing], top_n=20) if existing else [])
     if existing:
         # update counts but preserve rich_text fields (do not overwrite)
         page_id = existing["id"]
@@ -240,43 +944,43 @@ def create_daily_review_if_missing(review_db_id):
         # if properties contain these names, update them
         update_payload["✅ 完成任务数"] = {"number": done}
         update_payload["❌ 未完成任务数"] = {"number": undone}
-        r = notion_patch(f"https://api.notion.com/v1/pages/{page_id}", {"properties": update_payload})
+        r = write_once(notion_patch, f"{NOTION_API_BASE}/pages/{page_id}", {"properties": update_payload})
         if r.status_code in (200,201):
             log(f"✅ 更新今日复盘数据：完成 {done} / 总 {total}")
+            if blocks:
+                sync_page_body(page_id, blocks)
             return True
+        elif is_deferred(r):
+            log("⏸ Notion 熔断，今日复盘数据更新已延后")
+            return False
         else:
             log(f"⚠ 更新今日复盘失败：{r.status_code} {r.text}")
             return False
     else:
-        # create new daily review page
+        # create new daily review page（字段名与 main_flow 中 daily_required 保持一致）
         props = {
-            "名称": { "title": [ { "text": {"content": title_text} } ] },
-            "日期": { "date": {"start": today} },
+            "📝 标题": {"title": [{"text": {"content": f"每日复盘 {day}"}}]},
+            "📅 日期": {"date": {"start": day}},
             "✅ 完成任务数": {"number": done},
             "❌ 未完成任务数": {"number": undone},
-    "🪞 总结": {
-        "rich_text": [
-            {"text": {"content": "（请补充每日复盘）"}}
-        ]
-    },
-    "⚠ 难点": {
-        "rich_text": [
-            {"text": {"content": "（请记录今日难点）"}}
-        ]
-    },
-    "💡 解决方案": {
-        "rich_text": [
-            {"text": {"content": "（请填写解决方案）"}}
-        ]
-    },
-    "🧩 类型": {
-        "select": {"name": "每日复盘"}
-    }
-}
-        r = notion_post("https://api.notion.com/v1/pages", {"parent":{"database_id": review_db_id}, "properties": props})
+            "总结": {"rich_text": [{"text": {"content": "（请补充每日复盘）"}}]},
+            "⚠ 难点": {"rich_text": [{"text": {"content": "（请记录今日难点）"}}]},
+            "💡 解决方案": {"rich_text": [{"text": {"content": "（请填写解决方案）"}}]},
+            "类型": {"select": {"name": "每日"}}
+        }
+        payload = {"parent":{"database_id": review_db_id}, "properties": props}
+        if blocks:
+            # 前 100 个块随页面一起创建，其余追加到末尾
+            payload["children"] = blocks[:BLOCK_APPEND_LIMIT]
+        r = write_once(notion_post, f"{NOTION_API_BASE}/pages", payload)
         if r.status_code in (200,201):
-            log(f"🆕 创建今日复盘页面：{TODAY}（完成 {done} / {total}）")
+            log(f"🆕 创建今日复盘页面：{day}（完成 {done} / {total}）")
+            if blocks and len(blocks) > BLOCK_APPEND_LIMIT:
+                append_blocks(resp_json(r)["id"], blocks[BLOCK_APPEND_LIMIT:])
             return True
+        elif is_deferred(r):
+            log(f"⏸ Notion 熔断，今日复盘页面创建已延后：{day}")
+            return False
         else:
             log(f"❌ 创建今日复盘失败：{r.status_code} {r.text}")
             return False
@@ -288,15 +992,11 @@ def collect_daily_reviews(review_db_id, start_date, end_date):
             "and": [
                 {"property":"📅 日期", "date":{"on_or_after": start_date}},
                 {"property":"📅 日期", "date":{"on_or_before": end_date}}
-            ]
-        },
-        "page_size": 100
+            ] + ([daily_type_filter()] if QUERY_PUSHDOWN else [])
+        }
     }
-    r = notion_post(f"https://api.notion.com/v1/databases/{review_db_id}/query", payload)
-    if r.status_code != 200:
-        log(f"ERROR collect_daily_reviews: {r.status_code} {r.text}")
-        return []
-    items = r.json().get("results", [])
+    # 月报 / 长区间可能超过一页（100 条），按游标读完
+    items = query_database_iter(review_db_id, payload)
     # ensure they are of 类型 "每日" or empty
     filtered = []
     for it in items:
@@ -318,10 +1018,14 @@ def summarize_keywords(items, field_name="⚠ 难点", top_n=5):
     return cnt.most_common(top_n)
 
 # ---------------- AI summary (optional) ----------------
-def generate_ai_summary(prompt, model=OPENAI_MODEL):
+def generate_ai_summary(prompt, model=OPENAI_MODEL, fallback=None):
+    """fallback：AI 接口熔断、超时或 5xx 时返回的本地汇总"""
     if not OPENAI_API_KEY:
         log("WARN: OPENAI_API_KEY 未设置，跳过 AI 总结")
         return "（AI 未启用）"
+    if not ai_breaker.allow():
+        run_status["ai_fallback"] += 1
+        return fallback or "（AI 熔断中）"
     url = "https://api.openai.com/v1/chat/completions"
     headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type":"application/json"}
     payload = {
@@ -331,10 +1035,27 @@ def generate_ai_summary(prompt, model=OPENAI_MODEL):
         "temperature": 0.2,
         "max_tokens": 600
     }
-    r = requests.post(url, headers=headers, json=payload)
+
+    def send():
+        try:
+            r = requests.post(url, headers=headers, data=jsoncodec.dumps_bytes(payload), timeout=AI_TIMEOUT)
+        except requests.RequestException as e:
+            r = error_response(url, 503, "network_error", str(e))
+        if r.status_code == 429 or r.status_code >= 500:
+            ai_breaker.failure()
+        else:
+            ai_breaker.success()
+        return r
+
+    # 相同提示词的并发请求只发一次
+    r = ai_flight.do(singleflight.request_key("POST", url, payload), send)[0] if SINGLE_FLIGHT else send()
+    if r.status_code == 429 or r.status_code >= 500:
+        run_status["ai_fallback"] += 1
+        log(f"AI 请求失败：{r.status_code} {r.text[:200]}，改用本地汇总")
+        return fallback or "（AI 请求失败）"
     if r.status_code == 200:
         try:
-            txt = r.json()["choices"][0]["message"]["content"].strip()
+            txt = resp_json(r)["choices"][0]["message"]["content"].strip()
             return txt
         except Exception as e:
             log("AI parse error: " + str(e))
@@ -345,21 +1066,38 @@ def generate_ai_summary(prompt, model=OPENAI_MODEL):
 
 # ---------------- create periodic review (weekly/monthly) ----------------
 def create_periodic_review(review_db_id, start_date, end_date, kind="每周"):
+    # 幂等键：同一周期已创建（或已进入延后队列）时，重复运行不再生成第二份
+    written_key = f"{kind}:{end_date}:{review_db_id}"
+    if written_key in load_state().get("written", {}):
+        log(f"✅ {kind} 复盘 {end_date} 已创建，跳过")
+        return
     items = collect_daily_reviews(review_db_id, start_date, end_date)
     total_tasks = sum(int(it["properties"].get("✅ 完成任务数", {}).get("number") or 0) +
                       int(it["properties"].get("❌ 未完成任务数", {}).get("number") or 0)
                       for it in items)
     total_done = sum(int(it["properties"].get("✅ 完成任务数", {}).get("number") or 0) for it in items)
-    avg_done = round((total_done / len(items)) if items else 0, 2)
+    # 每日复盘页面缺失（创建失败 / 被删除）的日期用状态文件中的每日计数补上
+    covered = {(it["properties"].get("📅 日期", {}).get("date") or {}).get("start", "")[:10] for it in items}
+    gaps = {d: v for d, v in load_state().get("rollups", {}).items()
+            if start_date <= d <= end_date and d not in covered}
+    if gaps:
+        log(f"{kind} 复盘：{len(gaps)} 天缺少每日复盘页面，使用本地计数：{sorted(gaps)}")
+        total_tasks += sum(v["total"] for v in gaps.values())
+        total_done += sum(v["done"] for v in gaps.values())
+    days = len(items) + len(gaps)
+    avg_done = round((total_done / days) if days else 0, 2)
     top = summarize_keywords(items)
     top_str = "; ".join([f"{k}({v}次)" for k,v in top]) if top else "无明显高频难点"
+    record_stats(end_date, kind, total_tasks, total_done, top)
 
     prompt = f"""请为用户生成一份{kind}总结：
 时间范围：{start_date} 到 {end_date}
-共计天数：{len(items)}，完成任务总数：{total_done}，总任务数：{total_tasks}，平均每日完成：{avg_done}
+共计天数：{days}，完成任务总数：{total_done}，总任务数：{total_tasks}，平均每日完成：{avg_done}
 高频难点：{top_str}
 请输出：1) 关键结论 2) 改进建议 3) 一段 1-2 段落的总结语。"""
-    ai_text = generate_ai_summary(prompt)
+    local_text = (f"（本地汇总）{start_date} ~ {end_date} 共 {days} 天，完成 {total_done} / {total_tasks} 个任务，"
+                  f"平均每日完成 {avg_done}；高频难点：{top_str}")
+    ai_text = generate_ai_summary(prompt, fallback=local_text)
 
     props = {
         "📝 标题": {"title":[{"text":{"content": f"{kind} 复盘 {end_date}"}}]},
@@ -371,13 +1109,95 @@ def create_periodic_review(review_db_id, start_date, end_date, kind="每周"):
         "总结": {"rich_text":[{"text":{"content": ai_text}}]},
         "类型": {"select":{"name": "每周" if kind=="每周" else "每月"}}
     }
-    r = notion_post("https://api.notion.com/v1/pages", {"parent": {"database_id": review_db_id}, "properties": props})
+    r = write_once(notion_post, f"{NOTION_API_BASE}/pages", {"parent": {"database_id": review_db_id}, "properties": props})
     if r.status_code in (200,201):
+        remember("written", written_key, {"id": resp_json(r).get("id")}, end_date)
         log(f"✅ 已创建 {kind} 复盘：{end_date}")
+    elif is_deferred(r):
+        remember("written", written_key, {"id": None}, end_date)
+        log(f"⏸ Notion 熔断，{kind} 复盘创建已延后：{end_date}")
     else:
         log(f"❌ 创建 {kind} 复盘失败：{r.status_code} {r.text}")
 
+# ---------------- stats export (columnar, append-only) ----------------
+# 每次 main_flow 结束时把当天/周期统计追加到本地列式文件，长期趋势分析无需再扫 Notion。
+# 有 pyarrow 时每次追加写一个 parquet 分片（stats/part-*.parquet），否则追加到 stats/stats.csv。
+# 同一日期同一类型重复运行会追加多行，读取时以最后一行为准。
+STATS_COLUMNS = ("date", "review_type", "total", "done", "undone", "keyword_total", "keywords")
+_stats_rows = []
+
+def record_stats(date_str, review_type, total, done, keywords):
+    """keywords: [(词, 次数), ...]"""
+    _stats_rows.append({
+        "date": date_str,
+        "review_type": review_type,
+        "total": int(total),
+        "done": int(done),
+        "undone": int(total) - int(done),
+        "keyword_total": sum(v for _, v in keywords),
+        "keywords": ";".join(f"{k}:{v}" for k, v in keywords),
+    })
+
+def stats_export_format():
+    if STATS_EXPORT_FORMAT == "auto":
+        return "parquet" if pq is not None else "csv"
+    if STATS_EXPORT_FORMAT == "parquet" and pq is None:
+        log("WARN: 未安装 pyarrow，统计导出改用 csv")
+        return "csv"
+    return STATS_EXPORT_FORMAT
+
+def export_stats():
+    rows = _stats_rows[:]
+    _stats_rows.clear()
+    if not STATS_EXPORT_DIR or not rows:
+        return
+    try:
+        os.makedirs(STATS_EXPORT_DIR, exist_ok=True)
+        if stats_export_format() == "parquet":
+            table = pa.Table.from_pylist(rows, schema=STATS_SCHEMA)
+            stamp = datetime.now(tz).strftime("%Y%m%dT%H%M%S%f")
+            pq.write_table(table, os.path.join(STATS_EXPORT_DIR, f"part-{stamp}.parquet"))
+        else:
+            path = os.path.join(STATS_EXPORT_DIR, "stats.csv")
+            new_file = not os.path.exists(path)
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=STATS_COLUMNS)
+                if new_file:
+                    w.writeheader()
+                w.writerows(rows)
+        log(f"📊 已追加 {len(rows)} 行统计到 {STATS_EXPORT_DIR}")
+    except Exception as e:
+        log(f"⚠ 统计导出失败：{e}")
+
+def read_stats(start_date=None, end_date=None, review_type=None):
+    """读取导出的统计，同一 (date, review_type) 只保留最后追加的一行，按日期排序"""
+    if not STATS_EXPORT_DIR or not os.path.isdir(STATS_EXPORT_DIR):
+        return []
+    rows = []
+    parts = sorted(n for n in os.listdir(STATS_EXPORT_DIR) if n.endswith(".parquet"))
+    if parts and pq is not None:
+        for name in parts:
+            rows.extend(pq.read_table(os.path.join(STATS_EXPORT_DIR, name)).to_pylist())
+    csv_path = os.path.join(STATS_EXPORT_DIR, "stats.csv")
+    if os.path.exists(csv_path):
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for r in csv.DictReader(f):
+                for k in ("total", "done", "undone", "keyword_total"):
+                    r[k] = int(r[k] or 0)
+                rows.append(r)
+    latest = {}
+    for r in rows:
+        if start_date and r["date"] < start_date:
+            continue
+        if end_date and r["date"] > end_date:
+            continue
+        if review_type and r["review_type"] != review_type:
+            continue
+        latest[(r["date"], r["review_type"])] = r
+    return [latest[k] for k in sorted(latest)]
+
 # ---------------- system_check ----------------
+@with_priority("diagnostic")
 def system_check():
     try:
         log("🧠 系统自检开始...")
@@ -391,7 +1211,10 @@ def system_check():
         if not cols.get("date") or not cols.get("status") or not cols.get("title"):
             log("❌ Task DB 列匹配失败（需要 date/title/status）")
             return
-        y_tasks = query_database_by_date(TASK_DB_ID, cols["date"], yesterday)
+        y_tasks = query_database_by_date(
+            TASK_DB_ID, cols["date"], yesterday,
+            conditions=not_done_conditions(cols["status"]) if QUERY_PUSHDOWN else None,
+            qs=projection_qs(dbinfo, [cols["title"], cols["status"]]))
         unfinished = []
         for t in y_tasks:
             sel = t["properties"].get(cols["status"], {}).get("select")
@@ -401,7 +1224,7 @@ def system_check():
         if unfinished:
             log(f"⚠ 昨日未完成任务（{len(unfinished)}）：{unfinished}")
             # check if present today
-            today_tasks = query_database_by_date(TASK_DB_ID, cols["date"], TODAY)
+            today_tasks = query_database_by_date(TASK_DB_ID, cols["date"], TODAY, qs=projection_qs(dbinfo, [cols["title"]]))
             today_titles = [tt["properties"].get(cols["title"], {}).get("title",[{}])[0].get("plain_text","") for tt in today_tasks]
             not_roll = [x for x in unfinished if x not in today_titles]
             if not_roll:
@@ -431,8 +1254,8 @@ def system_check():
                 log("⚠ 未设置 CYCLE_REVIEW_DB_ID（周/月复盘数据库）")
             else:
                 payload = {"filter":{"and":[{"property":"类型","select":{"equals":"每周"}},{"property":"📅 日期","date":{"equals":TODAY}}]}}
-                r = notion_post(f"https://api.notion.com/v1/databases/{CYCLE_REVIEW_DB_ID}/query", payload)
-                if r.status_code == 200 and r.json().get("results"):
+                r = notion_post(f"{NOTION_API_BASE}/databases/{CYCLE_REVIEW_DB_ID}/query", payload)
+                if r.status_code == 200 and resp_json(r).get("results"):
                     log("✅ 本周复盘已存在")
                 else:
                     log("⚠ 本周复盘尚未生成")
@@ -444,8 +1267,8 @@ def system_check():
                 log("⚠ 未设置 CYCLE_REVIEW_DB_ID（周/月复盘数据库）")
             else:
                 payload = {"filter":{"and":[{"property":"类型","select":{"equals":"每月"}},{"property":"📅 日期","date":{"equals":TODAY}}]}}
-                r = notion_post(f"https://api.notion.com/v1/databases/{CYCLE_REVIEW_DB_ID}/query", payload)
-                if r.status_code == 200 and r.json().get("results"):
+                r = notion_post(f"{NOTION_API_BASE}/databases/{CYCLE_REVIEW_DB_ID}/query", payload)
+                if r.status_code == 200 and resp_json(r).get("results"):
                     log("✅ 本月复盘已存在")
                 else:
                     log("⚠ 本月复盘尚未生成")
@@ -457,6 +1280,12 @@ def system_check():
 # ---------------- main flow ----------------
 def main_flow():
     log("开始 v8 自动复盘主流程")
+    run_status.clear()
+    notion_breaker.reset_counts()
+    ai_breaker.reset_counts()
+    notion_flight.reset_counts()
+    ai_flight.reset_counts()
+    flush_deferred()
     # ensure review DB fields exist (if configured)
     daily_required = {
         "📝 标题":{"title":{}},
@@ -484,20 +1313,192 @@ def main_flow():
 
     # 3. weekly/monthly periodic creation
     dnow = datetime.now(tz)
+    periodic = []
     if dnow.weekday() == 6 and CYCLE_REVIEW_DB_ID:
         # weekly: last 7 days
         start = (dnow - timedelta(days=6)).strftime("%Y-%m-%d")
         end = dnow.strftime("%Y-%m-%d")
-        create_periodic_review(CYCLE_REVIEW_DB_ID, start, end, kind="每周")
+        periodic.append((start, end, "每周"))
     # if month end
     tomorrow = (dnow + timedelta(days=1)).strftime("%Y-%m-%d")
     if datetime.strptime(tomorrow, "%Y-%m-%d").month != dnow.month and CYCLE_REVIEW_DB_ID:
         start = dnow.replace(day=1).strftime("%Y-%m-%d")
         end = dnow.strftime("%Y-%m-%d")
-        create_periodic_review(CYCLE_REVIEW_DB_ID, start, end, kind="每月")
+        periodic.append((start, end, "每月"))
+    # 月末恰逢周日时周报与月报并发生成，两者相同的读取由 single-flight 合并
+    if periodic:
+        with ThreadPoolExecutor(max_workers=len(periodic)) as ex:
+            def periodic_job(start, end, kind):
+                with cassette_stage("周期复盘"):
+                    return create_periodic_review(CYCLE_REVIEW_DB_ID, start, end, kind=kind)
+            jobs = [ex.submit(periodic_job, start, end, kind) for start, end, kind in periodic]
+            for job in jobs:
+                job.result()
+
+    # 4. append today's stats to the columnar export
+    export_stats()
 
+    quota_report()
+    remember_write_concurrency()
+    run_status_report()
     log("主流程完成。")
 
+# ---------------- live counters (LIVE_MODE) ----------------
+# 每天第一次（及日期变化时）全量查询一次今日任务作为基线；之后每个变更只读取变更的那个页面
+# （轮询模式只查询 last_edited_time 之后变更的页面），O(1) 更新计数并防抖推送到今日复盘页面
+live = livecount.DayCounters()
+_live_queue = queue.Queue()   # 待读取的页面 id（webhook 模式）
+_live_pending = set()         # 已在队列中的页面 id，同一页面的连续事件只读取一次
+_live_pending_lock = threading.Lock()
+_live_state = {"cols": None, "qs": "", "review_page": None, "pushed": None, "watermark": None}
+_live_push = None
+
+def live_seed(day):
+    """全量查询 day 的任务作为计数基线"""
+    dbinfo = get_database_info(TASK_DB_ID)
+    if not dbinfo:
+        return False
+    cols = match_task_columns(dbinfo)
+    if not cols.get("date") or not cols.get("status"):
+        log("ERROR: 任务数据库缺失 date 或 status 列，无法实时计数")
+        return False
+    reads_before = run_status["read_failures"]
+    qs = projection_qs(dbinfo, [cols["date"], cols["status"]])
+    watermark = datetime.now(pytz.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+    tasks = query_database_iter(TASK_DB_ID, {"filter": {"property": cols["date"], "date": {"equals": day}}}, qs)
+    pages = {t["id"]: is_done(t, cols["status"]) for t in tasks}
+    if run_status["read_failures"] != reads_before:
+        return False
+    live.seed(pages, day)
+    _live_state.update(cols=cols, qs=qs, review_page=None, pushed=None, watermark=watermark)
+    snap = live.snapshot()
+    log(f"📡 实时计数基线 {day}：完成 {snap['done']} / 总 {snap['total']}")
+    return True
+
+def live_check_day():
+    """日期变化或尚无基线时重新全量查询一次"""
+    day = datetime.now(tz).strftime("%Y-%m-%d")
+    if (live.day != day or _live_state["cols"] is None) and live_seed(day) and _live_push:
+        _live_push.touch()
+
+def live_apply(page):
+    cols = _live_state["cols"]
+    removed = page.get("archived") or page.get("in_trash")
+    return live.apply(page["id"], page_date(page, cols["date"]), is_done(page, cols["status"]), removed=removed)
+
+def live_on_event(event):
+    """webhook 线程：只过滤与入队，页面由 live_worker 按顺序读取"""
+    if event.get("type") not in livecount.PAGE_EVENTS:
+        return
+    parent = (event.get("data") or {}).get("parent") or {}
+    if parent.get("id") and parent["id"].replace("-", "") != TASK_DB_ID.replace("-", ""):
+        return
+    page_id = (event.get("entity") or {}).get("id")
+    with _live_pending_lock:
+        if not page_id or page_id in _live_pending:
+            return
+        _live_pending.add(page_id)
+    _live_queue.put(page_id)
+
+def live_worker():
+    while True:
+        try:
+            page_id = _live_queue.get(timeout=60)
+        except queue.Empty:
+            page_id = None
+        try:
+            if page_id is not None:
+                with _live_pending_lock:
+                    _live_pending.discard(page_id)  # 读取期间的新事件重新入队
+            live_check_day()
+            if page_id is None or _live_state["cols"] is None:
+                continue
+            r = notion_get(f"{NOTION_API_BASE}/pages/{page_id}")
+            if r.status_code == 404:
+                changed = live.apply(page_id, None, False, removed=True)
+            elif r.status_code == 200:
+                changed = live_apply(resp_json(r))
+            else:
+                log(f"WARN: 实时计数读取页面 {page_id} 失败：{r.status_code}")
+                continue
+            if changed:
+                _live_push.touch()
+        except Exception as e:
+            log(f"WARN: 实时计数处理失败：{e}")
+        finally:
+            if page_id is not None:
+                _live_queue.task_done()
+
+def live_poll():
+    """查询 last_edited_time 不早于水位的页面（轮询模式看不到移入回收站的页面，由夜间全量统计校正）"""
+    payload = {"filter": {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": _live_state["watermark"]}},
+               "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+    changed = False
+    for p in query_database_iter(TASK_DB_ID, payload, _live_state["qs"]):
+        changed = live_apply(p) or changed
+        _live_state["watermark"] = max(_live_state["watermark"], p.get("last_edited_time") or "")
+    if changed:
+        _live_push.touch()
+
+def live_poller():
+    while True:
+        time.sleep(LIVE_POLL_SECONDS)
+        try:
+            live_check_day()
+            if _live_state["cols"] is not None:
+                live_poll()
+        except Exception as e:
+            log(f"WARN: 实时计数轮询失败：{e}")
+
+def live_push():
+    """把当前计数写到今日复盘页面；与上次推送相同则跳过"""
+    snap = live.snapshot()
+    day, total, done = snap["day"], snap["total"], snap["done"]
+    if _live_state["cols"] is None or (day, total, done) == _live_state["pushed"]:
+        return
+    if not _live_state["review_page"]:
+        existing = find_review_entry_by_date(DAILY_REVIEW_DB_ID, day)
+        # 按当前时刻判断（TODAY 是启动时的日期，常驻进程跨过午夜后不再是今天）
+        if not existing and day == datetime.now(tz).strftime("%Y-%m-%d") \
+                and create_daily_review_if_missing(DAILY_REVIEW_DB_ID, day):
+            existing = find_review_entry_by_date(DAILY_REVIEW_DB_ID, day)
+        if not existing:
+            log(f"⚠ 未找到 {day} 的复盘页面，实时计数暂不推送")
+            return
+        _live_state["review_page"] = existing["id"]
+    r = notion_patch(f"{NOTION_API_BASE}/pages/{_live_state['review_page']}",
+                     {"properties": {"✅ 完成任务数": {"number": done}, "❌ 未完成任务数": {"number": total - done}}})
+    if r.status_code in (200, 201) or is_deferred(r):
+        _live_state["pushed"] = (day, total, done)
+        remember("rollups", day, {"total": total, "done": done}, day)
+        log(f"📡 今日复盘实时更新：完成 {done} / 总 {total}" + ("（已延后）" if is_deferred(r) else ""))
+    else:
+        if r.status_code == 404:
+            _live_state["review_page"] = None
+        log(f"⚠ 实时计数推送失败：{r.status_code} {r.text}")
+
+def start_live():
+    """按 LIVE_MODE 启动后台线程，返回防抖推送器（测试 / 退出时可调用 flush）；未配置时返回 None"""
+    global _live_push
+    if LIVE_MODE not in ("webhook", "poll") or not DAILY_REVIEW_DB_ID:
+        log(f"⚠ 实时计数未启动：LIVE_MODE={LIVE_MODE!r}，需要 webhook / poll 与 DAILY_REVIEW_DB_ID")
+        return None
+    _live_push = livecount.Debouncer(live_push, LIVE_DEBOUNCE_SECONDS, LIVE_MAX_DELAY_SECONDS, name="live-push", log=log)
+    live_check_day()
+    _live_push.touch()
+    if LIVE_MODE == "webhook":
+        receiver = livecount.WebhookReceiver(
+            live_on_event, LIVE_WEBHOOK_HOST, LIVE_WEBHOOK_PORT, LIVE_WEBHOOK_SECRET or None,
+            on_verify=lambda token: log(f"🔑 收到 Notion webhook 验证码：{token}（填入集成设置，并设为 LIVE_WEBHOOK_SECRET）"))
+        receiver.start()
+        threading.Thread(target=live_worker, name="live-worker", daemon=True).start()
+        host, port = receiver.address[:2]
+        log(f"📡 实时计数已启动：webhook http://{host}:{port}{receiver.path}")
+    else:
+        threading.Thread(target=live_poller, name="live-poller", daemon=True).start()
+        log(f"📡 实时计数已启动：每 {LIVE_POLL_SECONDS:g} 秒轮询变更")
+    return _live_push
+
 # ---------------- schedule ----------------
 def run_scheduler():
     # schedule main_flow at 00:00 (rollover) and 23:55 (daily review + periodic)
@@ -508,7 +1509,6 @@ def run_scheduler():
     # run loop
     while True:
         schedule.run_pending()
-        import time
         time.sleep(10)
 
 # ---------------- CLI util for manual run ----------------
@@ -520,15 +1520,24 @@ def run_now():
 if __name__ == "__main__":
     log("启动 Notion 智能复盘系统 v8")
     # quick checks
+    if STATE_BUNDLE:
+        import_state_bundle(STATE_BUNDLE)
     try:
         run_now()
     except Exception as e:
         log("主流程异常: " + str(e))
         traceback.print_exc()
+    if STATE_BUNDLE:
+        export_state_bundle(STATE_BUNDLE)
+    if LIVE_MODE:
+        start_live()
     # if user wants continuous scheduler, uncomment below:
     if cfg.get("ENABLE_SCHEDULER", False):
         run_scheduler()
         import schedule, time
+    elif LIVE_MODE:
+        while True:
+            time.sleep(3600)
 
 def job():
     print("⏰ 每日自动复盘开始...")
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+同一台机器上共享一个 Notion integration token 的请求配额（多进程 / 多线程）
+ - 每个 token 一个状态文件（<NOTION_QUOTA_DIR>/<sha256(token)[:16]>.quota），读写时持有 flock
+ - 算法为 GCRA（虚拟排程）：每次预订在锁内取得下一个发送时刻并推进“理论到达时间”，之后睡到该时刻，不轮询、不重试
+ - 收到 429 时 pause(Retry-After) 把所有进程的下一个可用时刻整体后移，避免各自重试形成风暴
+ - 请求分优先级（PRIORITIES）：critical（顺延 / 每日复盘写入）> write > read > diagnostic（自检、补录等）
+   * 进程内：等待中的请求按加权公平排队（WFQ，权重越大份额越多）依次预订，临近截止时间的请求优先（EDF）；
+     每个进程同时只持有一个未使用的预订，所以共享排程里的积压大致等于正在发请求的进程数
+   * 进程间：低优先级只在共享排程的积压不超过本级上限时才预订，否则让出；等待越久上限越宽（老化），不会饿死
+ - stats() 返回本进程的授权次数与排队等待时间（平均 / 最长，p95 取最近 1000 次），按优先级分列，含错过截止时间的次数
+ - 没有 fcntl（Windows）时退化为进程内共享
+
+main.py 的 Notion 请求与 api/_notion.py 的新闻同步都经过它。
+用法（演示多个进程共享配额 / 低优先级进程不影响高优先级进程）:
+  python quota.py demo --procs 3 --rate 5 --seconds 6
+  python quota.py demo --procs 2 --rate 5 --seconds 6 --priorities diagnostic,critical
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import itertools
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+QUOTA_DIR = os.environ.get("NOTION_QUOTA_DIR") or os.path.join(tempfile.gettempdir(), "notion-quota")
+_STATE_SIZE = 128
+
+# 优先级 -> (WFQ 权重, 允许预订时共享排程的最大积压（以发送间隔计，None 不限）)
+PRIORITIES = {
+    "critical": (8, None),
+    "write": (4, 2),
+    "read": (2, 1),
+    "diagnostic": (1, 0),
+}
+AGING = 0.5  # 低优先级每等待 1 秒，允许的积压增加 0.5 秒
+
+
+class _Ticket:
+    __slots__ = ("finish", "deadline", "seq", "ready_at")
+
+    def __init__(self, finish, deadline, seq):
+        self.finish = finish
+        self.deadline = deadline
+        self.seq = seq
+        self.ready_at = 0.0  # 被共享排程拒绝后，到这个时刻再尝试
+
+
+class SharedQuota:
+    def __init__(self, token, rate=3.0, burst=1, directory=QUOTA_DIR):
+        self.interval = 1.0 / rate
+        self.tolerance = max(0, burst - 1) * self.interval
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(directory, digest + ".quota")
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # 进程内调度：gate 同一时刻只允许一个线程持有预订
+        self.gate = threading.Condition()
+        self.busy = False
+        self.waiting = []
+        self.vtime = 0.0
+        self.finish = {p: 0.0 for p in PRIORITIES}
+        self.seq = itertools.count()
+        self.recent = deque(maxlen=1000)
+        self.granted = 0
+        self.wait_total = self.wait_max = 0.0
+        self.penalties = 0
+        self.by_priority = {p: {"granted": 0, "wait_total": 0.0, "wait_max": 0.0, "deadline_missed": 0}
+                            for p in PRIORITIES}
+
+    def _locked(self, fn):
+        with self.lock:
+            if self.pid != os.getpid():
+                # fork 之后继承的描述符与父进程共享打开文件描述，flock 无法互斥：关闭后本进程重新打开
+                # （只关闭本进程的副本，父进程持有的锁不受影响）
+                os.close(self.fd)
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                self.pid = os.getpid()
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(self.fd, _STATE_SIZE, 0).strip(b"\0 \n")
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                result = fn(state, time.time())  # 墙钟时间：各进程共享同一时间轴
+                os.pwrite(self.fd, json.dumps(state).encode("ascii").ljust(_STATE_SIZE), 0)
+                return result
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    # ---- 进程内调度（WFQ + EDF） ----
+    def _next(self, now):
+        ready = [t for t in self.waiting if t.ready_at <= now]
+        if not ready:
+            return None
+        # 截止时间在排队中所有请求发完之前就会到的，按截止时间先后处理
+        horizon = now + len(ready) * self.interval
+        urgent = [t for t in ready if t.deadline is not None and t.deadline <= horizon]
+        if urgent:
+            return min(urgent, key=lambda t: (t.deadline, t.seq))
+        return min(ready, key=lambda t: (t.finish, t.seq))
+
+    def _enter(self, ticket):
+        with self.gate:
+            while True:
+                now = time.time()
+                if not self.busy and self._next(now) is ticket:
+                    self.busy = True
+                    self.vtime = max(self.vtime, ticket.finish)
+                    return
+                pending = [t.ready_at - now for t in self.waiting if t.ready_at > now]
+                self.gate.wait(min(pending) if pending else None)
+
+    def _leave(self):
+        with self.gate:
+            self.busy = False
+            self.gate.notify_all()
+
+    def acquire(self, priority="write", deadline=None):
+        """按优先级排队、预订一个发送时刻并等到该时刻，返回等待秒数；deadline 为墙钟时间戳"""
+        priority = priority if priority in PRIORITIES else "write"
+        weight, backlog = PRIORITIES[priority]
+        start = time.time()
+        with self.gate:
+            finish = max(self.vtime, self.finish[priority]) + 1.0 / weight
+            self.finish[priority] = finish
+            ticket = _Ticket(finish, deadline, next(self.seq))
+            self.waiting.append(ticket)
+
+        def reserve(state, now):
+            tat = max(state.get("tat", now), now)
+            # 临近截止时间时不再让出
+            if backlog is not None and (deadline is None or deadline > tat + self.interval):
+                excess = (tat - now) - (backlog * self.interval + AGING * (now - start))
+                if excess > 0:
+                    return None, excess
+            slot = max(now, tat - self.tolerance)
+            state["tat"] = tat + self.interval
+            state["granted"] = state.get("granted", 0) + 1
+            return slot, 0.0
+
+        try:
+            while True:
+                self._enter(ticket)
+                try:
+                    slot, excess = self._locked(reserve)
+                    if slot is not None:
+                        delay = slot - time.time()
+                        if delay > 0:
+                            time.sleep(delay)  # 持有 gate 睡到预订时刻：进程内只有一个未使用的预订
+                        break
+                finally:
+                    self._leave()
+                # 共享排程积压过多：让给其他进程的高优先级请求，稍后再试
+                ticket.ready_at = time.time() + min(max(excess, self.interval / 4), 1.0)
+        finally:
+            with self.gate:
+                self.waiting.remove(ticket)
+                self.gate.notify_all()
+
+        done = time.time()
+        wait = done - start
+        with self.lock:
+            self.granted += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.recent.append(wait)
+            st = self.by_priority[priority]
+            st["granted"] += 1
+            st["wait_total"] += wait
+            st["wait_max"] = max(st["wait_max"], wait)
+            if deadline is not None and done > deadline:
+                st["deadline_missed"] += 1
+        return wait
+
+    def pause(self, seconds):
+        """所有共享该 token 的进程在 seconds 秒内都不再发出请求（收到 429 时调用）"""
+        def push(state, now):
+            state["tat"] = max(state.get("tat", now), now + seconds)
+            state["paused"] = state.get("paused", 0) + 1
+
+        self._locked(push)
+        self.penalties += 1
+
+    def stats(self):
+        with self.lock:
+            recent = sorted(self.recent)
+            granted, total, worst = self.granted, self.wait_total, self.wait_max
+            classes = {p: dict(v) for p, v in self.by_priority.items() if v["granted"]}
+        ms = lambda v: round(v * 1000, 1)
+        return {
+            "granted": granted,
+            "penalties": self.penalties,
+            "wait_total_s": round(total, 3),
+            "wait_avg_ms": ms(total / granted) if granted else 0.0,
+            "wait_p95_ms": ms(recent[int(len(recent) * 0.95)]) if recent else 0.0,
+            "wait_max_ms": ms(worst),
+            "by_priority": {p: {"granted": v["granted"], "wait_avg_ms": ms(v["wait_total"] / v["granted"]),
+                                "wait_max_ms": ms(v["wait_max"]), "deadline_missed": v["deadline_missed"]}
+                            for p, v in classes.items()},
+        }
+
+
+# ---------------- demo ----------------
+def _demo_worker(token, rate, burst, seconds, directory, priority):
+    quota = SharedQuota(token, rate, burst, directory)
+    stop = time.time() + seconds
+    while time.time() < stop:
+        quota.acquire(priority)
+    print(json.dumps(dict(quota.stats(), pid=os.getpid(), priority=priority), ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="共享请求配额")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("demo", help="多个进程同时请求，验证总速率不超过上限")
+    d.add_argument("--procs", type=int, default=3)
+    d.add_argument("--rate", type=float, default=5.0)
+    d.add_argument("--burst", type=int, default=1)
+    d.add_argument("--seconds", type=float, default=5.0)
+    d.add_argument("--priorities", default="write", help="各进程的优先级，逗号分隔，不足时循环使用")
+    args = ap.parse_args(argv)
+
+    import multiprocessing
+    priorities = [p for p in args.priorities.split(",") if p] or ["write"]
+    with tempfile.TemporaryDirectory() as directory:
+        t0 = time.time()
+        procs = [multiprocessing.Process(target=_demo_worker,
+                                         args=("demo-token", args.rate, args.burst, args.seconds, directory,
+                                               priorities[n % len(priorities)]))
+                 for n in range(args.procs)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.time() - t0
+        with open(os.path.join(directory, hashlib.sha256(b"demo-token").hexdigest()[:16] + ".quota"), "rb") as f:
+            granted = json.loads(f.read().strip(b"\0 \n"))["granted"]
+    print(f"{args.procs} 个进程共 {granted} 次，{granted / elapsed:.2f} 次/秒（上限 {args.rate}）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+deepseek-processor 独立部署入口（自有服务器上运行，不经过 Vercel）
+ - single  模式：单进程单线程、HTTP/1.0（等同 BaseHTTPRequestHandler 的默认用法，作为压测对照）
+ - thread  模式：单进程 ThreadingHTTPServer，每个连接一个线程
+ - prefork 模式：启动 N 个 worker 进程，各自以 SO_REUSEPORT 绑定同一端口，由内核分发连接；
+   每个 worker 内部仍是多线程，不会被单个长连接阻塞；处理器模块在 fork 之后由各 worker 自己加载，
+   新闻存储的锁、重放缓存的 sqlite 连接、Notion 共享配额的文件等都按进程打开，不与其他 worker 共享描述符
+ - HTTP/1.1 keep-alive，空闲连接超过 --keepalive-timeout 秒后关闭
+ - SIGTERM / SIGINT 优雅退出：停止接收新连接，等待进行中的请求完成
+
+用法:
+  python serve_webhook.py --port 8000                        # thread 模式
+  python serve_webhook.py --port 8000 --mode prefork --workers 4
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+import importlib.util
+from http.server import ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSOR_PATH = os.path.join(BASE_DIR, "api", "deepseek-processor.py")
+
+
+def load_processor():
+    """按文件路径加载 api/deepseek-processor.py（文件名含连字符，无法直接 import）"""
+    spec = importlib.util.spec_from_file_location("deepseek_processor", PROCESSOR_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def make_handler(mod, keepalive_timeout):
+    class KeepAliveHandler(mod.handler):
+        protocol_version = "HTTP/1.1"
+        timeout = keepalive_timeout  # 空闲 keep-alive 连接的读超时
+        # 响应头与响应体分两次写入；keep-alive 下 Nagle 与对端延迟 ACK 叠加会让每个请求多等约 40ms
+        disable_nagle_algorithm = True
+
+    return KeepAliveHandler
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = False   # 退出时等待进行中的请求
+    block_on_close = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler_cls, reuse_port=False, sock=None):
+        self.reuse_port = reuse_port
+        if sock is None:
+            super().__init__(address, handler_cls)
+            return
+        # prefork 不支持 SO_REUSEPORT 时：复用父进程已监听的 socket
+        super().__init__(address, handler_cls, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_address = sock.getsockname()
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class SingleThreadServer(WebhookServer):
+    """在 accept 线程里直接处理请求，一次只服务一个连接"""
+
+    def process_request(self, request, client_address):
+        socketserver.BaseServer.process_request(self, request, client_address)
+
+
+def serve(server, label, on_start=None):
+    """运行 server 直到收到 SIGTERM / SIGINT；on_start 在本进程开始服务前调用（prefork 时在 fork 之后）"""
+    stopping = threading.Event()
+
+    def on_signal(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown() 会等待 serve_forever 退出，不能在同一线程里调用
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    host, port = server.server_address[:2]
+    if on_start is not None:
+        on_start()
+    print(f"[{label}] 监听 http://{host}:{port}", file=sys.stderr, flush=True)
+    server.serve_forever(poll_interval=0.5)
+    server.server_close()  # block_on_close：等待处理中的请求线程结束
+    print(f"[{label}] 已退出", file=sys.stderr, flush=True)
+
+
+def run_single(args, handler_cls, on_start=None):
+    server = SingleThreadServer((args.host, args.port), handler_cls)
+    serve(server, f"single pid={os.getpid()}", on_start)
+
+
+def run_thread(args, handler_cls, on_start=None):
+    server = WebhookServer((args.host, args.port), handler_cls)
+    serve(server, f"thread pid={os.getpid()}", on_start)
+
+
+def run_prefork(args, setup):
+    """setup() 在每个 worker fork 之后调用，返回 (handler_cls, on_start)"""
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    shared = None
+    if not reuse_port:
+        shared = socket.create_server((args.host, args.port), backlog=128)
+    elif args.port == 0:
+        # 端口 0 时先占一个端口号，所有 worker 用同一个端口
+        probe = socket.socket()
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        probe.bind((args.host, 0))
+        args.port = probe.getsockname()[1]
+        probe.close()
+
+    children = {}
+    started = {}
+    stopping = False
+
+    def spawn(n):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                handler_cls, on_start = setup()
+                server = WebhookServer((args.host, args.port), handler_cls, reuse_port=reuse_port, sock=shared)
+                serve(server, f"worker {n} pid={os.getpid()}", on_start)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = n
+        started[n] = time.monotonic()
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    for n in range(args.workers):
+        spawn(n)
+    print(f"[master pid={os.getpid()}] {args.workers} 个 worker，端口 {args.port}，"
+          f"{'SO_REUSEPORT' if reuse_port else '共享监听 socket'}", file=sys.stderr, flush=True)
+
+    deadline = None
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if stopping and deadline is None:
+                deadline = time.monotonic() + args.grace
+            if deadline and time.monotonic() > deadline:
+                for p in children:
+                    os.kill(p, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+        n = children.pop(pid, None)
+        if not stopping and n is not None:
+            if status and time.monotonic() - started[n] < 2:
+                # 启动即失败（如处理器模块加载出错）：重启也一样，不再重试
+                print(f"[master] worker {n} 启动失败（status={status}），不再重启", file=sys.stderr, flush=True)
+                continue
+            print(f"[master] worker {n} 异常退出（status={status}），重启", file=sys.stderr, flush=True)
+            spawn(n)
+    if shared is not None:
+        shared.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="deepseek-processor 独立服务器")
+    ap.add_argument("--host", default=os.environ.get("DEEPSEEK_HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.environ.get("DEEPSEEK_PORT", 8000)))
+    ap.add_argument("--mode", choices=("single", "thread", "prefork"), default=os.environ.get("DEEPSEEK_MODE", "thread"))
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("DEEPSEEK_WORKERS", os.cpu_count() or 1)))
+    ap.add_argument("--keepalive-timeout", type=float, default=5.0, help="空闲 keep-alive 连接超时秒数")
+    ap.add_argument("--grace", type=float, default=30.0, help="优雅退出等待秒数，超时后强制结束 worker")
+    args = ap.parse_args(argv)
+
+    def setup():
+        mod = load_processor()
+        # 启动时就恢复上次未处理完的 /ingest 任务，而不是等第一个请求
+        return make_handler(mod, args.keepalive_timeout), mod.ingest_queue.start
+
+    if args.mode == "prefork" and args.workers > 1 and hasattr(os, "fork"):
+        # master 不加载处理器：模块导入时打开的文件与连接若在 fork 前创建，会被所有 worker 共享
+        run_prefork(args, setup)
+    elif args.mode == "single":
+        mod = load_processor()
+        run_single(args, mod.handler, mod.ingest_queue.start)
+    else:
+        run_thread(args, *setup())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+并发重复请求合并（single-flight）
+ - 同一个 key 同时只有一次真实调用在途；期间到达的相同请求不再发出，等待并共享这一次的结果（或异常）
+ - 调用结束即从在途表中移除，之后的相同请求会重新发出：只合并并发的重复，不是缓存
+ - key 由 方法 + URL + 规范化请求体（键排序的紧凑 JSON）组成，字典键顺序不同的请求体视为同一请求
+ - collapsed 统计被合并（未实际发出）的调用次数，reset_counts() 清零
+
+main.py 用它合并 Notion 读取（数据库 schema、query）与相同提示词的 AI 总结请求。
+用法:
+  flight = SingleFlight()
+  result, shared = flight.do(request_key("POST", url, payload), lambda: send(url, payload))
+"""
+
+import json
+import threading
+
+
+def request_key(method, url, body=None):
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False) if body is not None else ""
+    return f"{method.upper()} {url}\n{canonical}"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.calls = self.collapsed = 0
+
+    def do(self, key, fn):
+        """执行 fn() 或等待同 key 的在途调用，返回 (结果, 是否为共享结果)；fn 抛出的异常同样传给所有等待者"""
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            call.done.set()
+        return call.result, False
+
+    def reset_counts(self):
+        with self.lock:
+            self.calls = self.collapsed = 0
+
+    def stats(self):
+        with self.lock:
+            return {"calls": self.calls, "collapsed": self.collapsed, "inflight": len(self.inflight)}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+热启动状态包：把 main.py 跨次运行需要保留的状态打成一个带版本与校验和的文件
+ - 用于 GitHub Actions 等每次都是全新环境的运行：开始时导入、结束时导出，中间用 actions/cache 或 artifact 传递
+ - 文件为 gzip：第一行是头部 JSON（format / version / saved_at / sha256 / 各段大小），之后是各段的紧凑 JSON
+ - sha256 针对头部之后的原始字节计算；格式、版本不符或校验失败时拒绝导入（BundleError），调用方按冷启动处理
+ - 内容由调用方决定，main.py 目前写入：
+   * state:    状态文件（上次顺延日期 = 同步水位、写入并发、last_run、幂等键 written、每日计数汇总 rollups）
+   * schemas:  数据库 schema 缓存（含读取时间与匹配到的列）
+   * deferred: 尚未重放的延后写入
+
+用法:
+  python statebundle.py inspect notion-state.bundle.gz   # 输出头部与各段条目数
+  python statebundle.py verify notion-state.bundle.gz    # 只校验，失败时退出码 1
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+
+FORMAT = "notion-review-state"
+VERSION = 1
+
+
+class BundleError(ValueError):
+    """状态包不存在、格式 / 版本不符或校验和不匹配"""
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def write_bundle(path, sections):
+    """sections: {段名: 可 JSON 序列化的对象}；先写临时文件再替换，返回写入的字节数"""
+    body = _dumps(sections)
+    header = {
+        "format": FORMAT,
+        "version": VERSION,
+        "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "sha256": hashlib.sha256(body).hexdigest(),
+        "sections": {k: len(v) if isinstance(v, (dict, list)) else 1 for k, v in sections.items()},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wb", compresslevel=6) as f:
+        f.write(_dumps(header) + b"\n" + body)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def read_bundle(path):
+    """返回 (header, sections)；任何问题都抛出 BundleError"""
+    try:
+        with gzip.open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        raise BundleError("状态包不存在")
+    except (OSError, EOFError) as e:
+        raise BundleError(f"无法读取状态包：{e}")
+    head, sep, body = raw.partition(b"\n")
+    try:
+        header = json.loads(head)
+    except ValueError:
+        raise BundleError("状态包头部损坏")
+    if not sep or not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise BundleError("不是状态包文件")
+    if header.get("version") != VERSION:
+        raise BundleError(f"状态包版本 {header.get('version')} 与当前版本 {VERSION} 不符")
+    if hashlib.sha256(body).hexdigest() != header.get("sha256"):
+        raise BundleError("状态包校验和不匹配")
+    return header, json.loads(body)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="热启动状态包")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, text in (("inspect", "输出头部与各段条目数"), ("verify", "校验格式、版本与校验和")):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("path")
+    args = ap.parse_args(argv)
+
+    try:
+        header, sections = read_bundle(args.path)
+    except BundleError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if args.cmd == "inspect":
+        print(json.dumps(dict(header, bytes=os.path.getsize(args.path)), ensure_ascii=False, indent=2))
+    else:
+        print(f"✅ 状态包有效（{header['saved_at']}，{', '.join(sections)}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
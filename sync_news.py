@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+把新闻存储（data/ai_news.jsonl）中的新闻批量同步到 Notion 新闻库，输出 items/s
+ - 与 webhook 的后台同步使用同一套逻辑（api/_notion.py）：按 URL 去重、令牌桶限速、并发写入、429/5xx 重试
+ - 配置来自环境变量 NOTION_TOKEN / DEEPSEEK_NOTION_DB_ID / NOTION_API_BASE / DEEPSEEK_NOTION_*
+ - --fake：在本进程启动 fake_notion（带延迟），预置一半已存在的新闻，用于评估吞吐
+
+用法:
+  python sync_news.py                      # 同步全部历史新闻（补录 / 定时任务）
+  python sync_news.py --fake --items 300 --latency-ms 150
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "api"))
+
+from _store import NEWS_PATH, NewsStore
+from _notion import CONCURRENCY, RATE, NotionClient, NewsSync
+from _log import get_logger
+
+
+def iter_store(path, limit=None):
+    store = NewsStore(path)
+    cursor, n = None, 0
+    while True:
+        page = store.page(cursor, 100)
+        for rec in page["results"]:
+            yield rec["item"]
+            n += 1
+            if limit and n >= limit:
+                return
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def fake_items(n, seed=0):
+    from bench_webhook import make_news
+    return make_news(n, random.Random(seed))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="新闻批量同步到 Notion")
+    ap.add_argument("--store", default=NEWS_PATH)
+    ap.add_argument("--limit", type=int, default=None, help="最多同步最近的多少条")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    ap.add_argument("--rate", type=float, default=RATE, help="每秒请求数上限")
+    ap.add_argument("--fake", action="store_true", help="同步到进程内的 fake_notion")
+    ap.add_argument("--items", type=int, default=200, help="--fake 时的新闻条数")
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    log = get_logger()
+    if args.fake:
+        from fake_notion import FakeNotion, NEWS_SCHEMA, start_server
+        fake = FakeNotion(latency_ms=args.latency_ms, rate_429=args.rate_429)
+        dbid = fake.add_database(NEWS_SCHEMA, "AI 新闻")
+        items = fake_items(args.items)
+        for item in items[::2]:  # 一半已经在库中
+            fake.add_page(dbid, {"标题": {"title": [{"text": {"content": item["title"]}}]},
+                                 "链接": {"url": item["url"]}})
+        server, base = start_server(fake)
+        client = NotionClient("fake-token", base, args.rate)
+    else:
+        token, dbid = os.environ.get("NOTION_TOKEN"), os.environ.get("DEEPSEEK_NOTION_DB_ID")
+        if not token or not dbid:
+            print("请设置 NOTION_TOKEN 与 DEEPSEEK_NOTION_DB_ID", file=sys.stderr)
+            return 2
+        items = list(iter_store(args.store, args.limit))
+        client = NotionClient(token, os.environ.get("NOTION_API_BASE", "https://api.notion.com/v1"), args.rate,
+                              priority="diagnostic")
+
+    sync = NewsSync(client, dbid, concurrency=args.concurrency, log=log)
+    t0 = time.monotonic()
+    result = sync.sync(items)
+    result.update(total_seconds=round(time.monotonic() - t0, 3), requests=client.requests, retries=client.retries)
+    print(json.dumps(result, ensure_ascii=False))
+    if args.fake:
+        server.shutdown()
+    return 1 if result["failed"] or result["requeued"] else 0  # 暂时失败的新闻重新运行即可补上（按 URL 去重）
+
+
+if __name__ == "__main__":
+    sys.exit(main())